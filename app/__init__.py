@@ -45,6 +45,18 @@ def create_app(config_name='default'):
     bcrypt.init_app(app)
     login_manager.init_app(app)
     
+    # 注册请求统计钩子（需在其他请求钩子之前注册，才能统计完整的处理耗时）
+    from app.metrics.utils import init_metrics
+    init_metrics(app)
+    
+    # 注册SQL查询统计钩子（语句数和耗时写入响应头和运行指标）
+    from app.metrics.queries import init_query_accounting
+    init_query_accounting(app)
+    
+    # 注册性能分析钩子（只分析附加了分析标记的管理员请求）
+    from app.profiling.utils import init_profiling
+    init_profiling(app)
+    
     # 注册蓝图
     print("[DEBUG] Registering blueprints...")
     from app.users.routes import users
@@ -55,6 +67,9 @@ def create_app(config_name='default'):
     from app.software.routes import software
     from app.security.routes import security
     from app.monitoring.routes import monitoring_bp as monitoring
+    from app.fleet.routes import fleet
+    from app.metrics.routes import metrics
+    from app.profiling.routes import profiling
     
     app.register_blueprint(users)
     app.register_blueprint(dashboard)
@@ -64,6 +79,13 @@ def create_app(config_name='default'):
     app.register_blueprint(software)
     app.register_blueprint(security)
     app.register_blueprint(monitoring)
+    app.register_blueprint(fleet)
+    app.register_blueprint(metrics)
+    app.register_blueprint(profiling)
+    
+    # 启动监控数据后台采集器
+    from app.monitoring.collector import init_collector
+    init_collector(app)
     
     print("[DEBUG] App creation completed successfully!")
     return app
\ No newline at end of file
@@ -7,6 +7,7 @@ Tiny Panel - Linux服务器管理面板
 """
 
 import os
+import tempfile
 
 class Config:
     """基础配置类"""
@@ -23,7 +24,107 @@ class Config:
     
     # 日志设置
     LOG_TO_STDOUT = os.environ.get('LOG_TO_STDOUT')
+
+    # 运行指标设置：各工作进程的请求统计定期写入指标目录，由 /metrics 合并输出
+    METRICS_ENABLED = os.environ.get('METRICS_ENABLED', '1') == '1'
+    METRICS_DIR = os.environ.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'tiny_panel_metrics')
+    METRICS_FLUSH_INTERVAL = 2  # 写入指标文件的周期（秒）
+    METRICS_TOKEN = os.environ.get('METRICS_TOKEN')  # Prometheus抓取时使用的Bearer令牌
+
+    # SQL查询统计：按请求统计语句数和耗时，同一语句重复执行达到阈值时视为N+1查询
+    SQL_QUERY_ACCOUNTING = os.environ.get('SQL_QUERY_ACCOUNTING', '1') == '1'
+    SQL_QUERY_REPEAT_THRESHOLD = 5
+    SQL_QUERY_BUDGET = None  # 每个请求的语句数上限，超出时输出警告（测试模式下抛出异常）
+    SQL_QUERY_BUDGETS = {}  # 按端点覆盖的语句数上限，如 {'monitoring.index': 5}
+
+    # 性能分析设置：管理员请求附加 X-Profile: 1 或 _profile=1 时分析该请求
+    PROFILING_ENABLED = os.environ.get('PROFILING_ENABLED', '1') == '1'
+    PROFILES_DIR = os.environ.get('PROFILES_DIR') or os.path.join(tempfile.gettempdir(), 'tiny_panel_profiles')
+    PROFILES_MAX_COUNT = 50  # 保留的分析记录数
+
+    # 仪表盘本机信息设置
+    DASHBOARD_SAMPLE_INTERVAL = 5  # 动态指标的采样周期（秒）
+    DASHBOARD_FACTS_TTL = 3600  # 静态信息的刷新周期（秒）
+
+    # 监控采集设置
+    MONITORING_COLLECTOR_ENABLED = os.environ.get('MONITORING_COLLECTOR_ENABLED', '1') == '1'
+    MONITORING_INTERVAL = int(os.environ.get('MONITORING_INTERVAL') or 10)  # 秒
+    MONITORING_CONCURRENCY = int(os.environ.get('MONITORING_CONCURRENCY') or 32)
+    MONITORING_HOST_TIMEOUT = float(os.environ.get('MONITORING_HOST_TIMEOUT') or 8)  # 秒
+    MONITORING_LOCK_FILE = os.environ.get('MONITORING_LOCK_FILE') or \
+        os.path.join(tempfile.gettempdir(), 'tiny_panel_collector.lock')
+    
+    # 服务器可达性探测：并发探测SSH端口（无响应时再ping），页面只读取探测缓存
+    MONITORING_PROBE_INTERVAL = 30  # 秒，0表示不探测
+    MONITORING_PROBE_TIMEOUT = 2  # 单项探测的超时（秒）
+    MONITORING_PROBE_CONCURRENCY = 256
+    MONITORING_PROBE_HISTORY = 60  # 每台服务器保留的探测历史条数
+    
+    # 监控数据保留时长（小时）：原始数据及1分钟/5分钟/1小时汇总
+    MONITORING_RETENTION = {
+        'raw': 48,
+        60: 24 * 7,
+        300: 24 * 30,
+        3600: 24 * 365
+    }
+    MONITORING_RETENTION_INTERVAL = 600  # 清理过期数据的周期（秒）
+    
+    # 进程快照：按周期记录CPU/内存/IO占用最高的进程，用于回溯监控曲线上的异常
+    MONITORING_PROCESS_SNAPSHOT_INTERVAL = 60  # 秒，0表示不记录
+    MONITORING_PROCESS_SNAPSHOT_TOP = 10  # 每项指标记录的进程数
+    MONITORING_PROCESS_RETENTION = 24 * 7  # 小时
     
+    # 监控数据批量写入：达到数量阈值或等待超过时间阈值时写入
+    MONITORING_WRITE_BATCH_SIZE = 500
+    MONITORING_WRITE_FLUSH_INTERVAL = 5  # 秒
+    MONITORING_WRITE_MAX_QUEUE = 50000
+    
+    # 采集器、探测器和写入器的状态由各工作进程写入该目录，状态API合并读取；采集器写入的本机进程列表也保存在此
+    MONITORING_STATUS_DIR = os.environ.get('MONITORING_STATUS_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'tiny_panel_monitoring_status')
+    
+    # 共享内存环形缓冲区：默认每台服务器保存8640个样本（10秒周期下约24小时）
+    MONITORING_RINGBUFFER_ENABLED = True
+    MONITORING_RINGBUFFER_PATH = os.environ.get('MONITORING_RINGBUFFER_PATH')
+    MONITORING_RINGBUFFER_SLOTS = 256
+    MONITORING_RINGBUFFER_CAPACITY = 8640
+    
+    # 实时推送（SSE）设置
+    MONITORING_STREAM_POLL_INTERVAL = 1  # 秒
+    MONITORING_STREAM_MAX_DURATION = 300  # 单个连接的最长时间（秒），到期后浏览器自动重连
+    MONITORING_STREAM_MAX_PER_WORKER = 8  # 每个工作进程同时保持的连接数（不超过gunicorn线程数的一半）
+
+    # 监控代理设置
+    MONITORING_INGEST_MAX_SAMPLES = 1000  # 单次推送的样本数上限
+    MONITORING_AGENT_STALE_AFTER = 180  # 代理心跳超过该时长（秒）未更新时恢复SSH采集
+    
+    # 命令执行器设置：全局和单台服务器同时执行的命令数上限
+    EXECUTOR_MAX_CONCURRENCY = 64
+    EXECUTOR_MAX_PER_SERVER = 4
+    EXECUTOR_MAX_LOCAL_COMMANDS = 16  # 面板主机命令（run_local_command）的短命令和耗时操作各自的上限
+    
+    # 批量执行设置
+    FLEET_MAX_FANOUT = 32  # 同时执行的服务器数量上限
+    FLEET_DEFAULT_TIMEOUT = 60  # 单台服务器的默认超时（秒）
+    FLEET_MAX_TIMEOUT = 600
+    FLEET_MAX_OUTPUT = 64 * 1024  # 每台服务器保留的输出字符数
+    
+    # 后台命令任务设置：输出按行保存在有界缓冲区中，只保留最近的行
+    JOBS_DIR = os.environ.get('JOBS_DIR') or os.path.join(tempfile.gettempdir(), 'tiny_panel_jobs')
+    JOBS_MAX_LINES = 1000  # 每个任务保留的输出行数
+    JOBS_MAX_LINE_LENGTH = 1024  # 单行的最大字符数
+    JOBS_TTL = 3600  # 已结束的任务保留时长（秒）
+    SOFTWARE_INSTALL_TIMEOUT = 1800  # 软件安装的超时时间（秒）
+    
+    # SSH连接池设置
+    SSH_CONNECT_TIMEOUT = 10  # 建立连接和认证的超时（秒）
+    SSH_KEEPALIVE_INTERVAL = 30  # 空闲连接发送keepalive的间隔（秒）
+    SSH_IDLE_TIMEOUT = 300  # 连接空闲超过该时长后关闭（秒）
+    SSH_MAX_CHANNELS = 8  # 每个连接同时打开的命令通道数（sshd默认MaxSessions为10）
+    # 已记录的主机密钥（OpenSSH known_hosts格式），首次连接时记录，之后密钥变化则拒绝连接
+    SSH_KNOWN_HOSTS_FILE = os.environ.get('SSH_KNOWN_HOSTS_FILE') or \
+        os.path.join(os.getcwd(), 'instance', 'ssh_known_hosts')
+
     # 安全设置
     PASSWORD_COMPLEXITY = {
         'min_length': 8,
@@ -8,12 +8,12 @@ Tiny Panel - Linux服务器管理面板
 
 from flask import Blueprint, render_template
 from flask_login import login_required, current_user
-import psutil
-import platform
-import socket
 import os
 from datetime import datetime, timedelta
-from app.models import Server, Website, Database, MonitoringData
+from sqlalchemy import func, select
+from app.models import Server, Website, Database
+from app.monitoring.rollup import query_rollup_summary
+from app.dashboard.utils import get_host_sampler
 from app import db
 
 # 创建蓝图
@@ -42,52 +42,49 @@ def home():
 
 
 def get_system_info():
-    """获取系统基本信息"""
-    return {
-        'os': platform.system(),
-        'os_version': platform.version(),
-        'architecture': platform.architecture()[0],
-        'hostname': socket.gethostname(),
-        'ip_address': socket.gethostbyname(socket.gethostname()),
-        'cpu_count': psutil.cpu_count(),
-        'cpu_usage': psutil.cpu_percent(interval=1),
-        'memory_total': round(psutil.virtual_memory().total / (1024**3), 2),
-        'memory_used': round(psutil.virtual_memory().used / (1024**3), 2),
-        'memory_percent': psutil.virtual_memory().percent,
-        'disk_total': round(psutil.disk_usage('/').total / (1024**3), 2),
-        'disk_used': round(psutil.disk_usage('/').used / (1024**3), 2),
-        'disk_percent': psutil.disk_usage('/').percent,
-        'uptime': str(timedelta(seconds=psutil.boot_time()))
-    }
+    """获取系统基本信息（静态信息已缓存，动态指标由后台线程采样）"""
+    return get_host_sampler().snapshot()
 
 
 def get_user_stats():
-    """获取用户相关统计信息"""
+    """获取用户相关统计信息（四项计数合并为一条查询）"""
+    def count(model, *criteria):
+        return select(func.count()).select_from(model)\
+            .where(model.user_id == current_user.id, *criteria).scalar_subquery()
+    
+    servers, websites, databases, active_websites = db.session.execute(select(
+        count(Server),
+        count(Website),
+        count(Database),
+        count(Website, Website.status == 'active')
+    )).one()
     return {
-        'servers': Server.query.filter_by(user_id=current_user.id).count(),
-        'websites': Website.query.filter_by(user_id=current_user.id).count(),
-        'databases': Database.query.filter_by(user_id=current_user.id).count(),
-        'active_websites': Website.query.filter_by(user_id=current_user.id, status='active').count()
+        'servers': servers,
+        'websites': websites,
+        'databases': databases,
+        'active_websites': active_websites
     }
 
 
 def get_recent_monitoring():
-    """获取最近的监控数据"""
-    # 获取最近24小时的监控数据
-    twenty_four_hours_ago = datetime.utcnow() - timedelta(hours=24)
+    """
+    获取最近24小时的监控数据（每台服务器每小时一个点）
+
+    直接读取1小时粒度的汇总数据，一次查询取出全部服务器的数据。
+
+    Returns:
+        dict: {服务器名称: [(时间, CPU平均, CPU最大, 内存平均, 内存最大, 磁盘平均, 磁盘最大,
+                              网络接收平均, 网络接收最大, 网络发送平均, 网络发送最大), ...]}
+    """
+    twenty_four_hours_ago = datetime.now() - timedelta(hours=24)
     
-    # 获取用户所有服务器的监控数据
-    servers = Server.query.filter_by(user_id=current_user.id).all()
-    server_monitoring = {}
+    # 获取用户所有服务器
+    servers = Server.query.with_entities(Server.id, Server.name)\
+        .filter_by(user_id=current_user.id).all()
+    server_monitoring = {name: [] for _, name in servers}
+    names = dict(servers)
     
-    for server in servers:
-        # 获取最近的监控数据点（每小时一个）
-        monitoring_data = MonitoringData.query\
-            .filter_by(server_id=server.id)\
-            .filter(MonitoringData.timestamp >= twenty_four_hours_ago)\
-            .order_by(MonitoringData.timestamp)\
-            .all()
-        
-        server_monitoring[server.name] = monitoring_data
+    for row in query_rollup_summary(list(names), twenty_four_hours_ago, resolution=3600):
+        server_monitoring[names[row[0]]].append(tuple(row[1:]))
     
-    return server_monitoring
\ No newline at end of file
+    return server_monitoring
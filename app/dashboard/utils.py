@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+仪表盘工具函数
+
+本模块为仪表盘提供本机信息。静态信息（操作系统、架构、主机名、IP地址、CPU核数、
+内存和磁盘总量）只在首次读取时获取，之后按较长的周期刷新；CPU、内存、磁盘使用情况
+等动态指标由后台线程定期采样，渲染页面时直接读取内存中的最新结果，不会阻塞请求。
+采样器在首次访问仪表盘时启动，不访问仪表盘的工作进程不会导入psutil。
+"""
+
+import os
+import platform
+import socket
+import threading
+import time
+from datetime import timedelta
+
+from app.monitoring.sampler import local_cpu_percent
+
+
+def get_primary_ip():
+    """
+    获取本机对外通信使用的IP地址
+
+    通过UDP套接字的connect选择出口地址，不发送任何数据，也不进行DNS解析。
+
+    Returns:
+        str: IP地址，无法确定时返回127.0.0.1
+    """
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        sock.connect(('10.255.255.255', 1))
+        return sock.getsockname()[0]
+    except OSError:
+        return '127.0.0.1'
+    finally:
+        sock.close()
+
+
+def read_host_facts(disk_path='/'):
+    """
+    读取本机的静态信息
+
+    Args:
+        disk_path: 统计磁盘容量的挂载点
+
+    Returns:
+        dict: 静态信息
+    """
+    import psutil
+
+    return {
+        'os': platform.system(),
+        'os_version': platform.version(),
+        'architecture': platform.architecture()[0],
+        'hostname': socket.gethostname(),
+        'ip_address': get_primary_ip(),
+        'cpu_count': psutil.cpu_count(),
+        'memory_total': round(psutil.virtual_memory().total / (1024**3), 2),
+        'disk_total': round(psutil.disk_usage(disk_path).total / (1024**3), 2)
+    }
+
+
+def read_host_metrics(disk_path='/'):
+    """
+    读取本机的动态指标（每项只调用一次psutil）
+
+    Args:
+        disk_path: 统计磁盘使用率的挂载点
+
+    Returns:
+        dict: 动态指标
+    """
+    import psutil
+
+    memory = psutil.virtual_memory()
+    disk = psutil.disk_usage(disk_path)
+    return {
+        'cpu_usage': local_cpu_percent(),
+        'memory_used': round(memory.used / (1024**3), 2),
+        'memory_percent': memory.percent,
+        'disk_used': round(disk.used / (1024**3), 2),
+        'disk_percent': disk.percent,
+        'uptime': str(timedelta(seconds=int(time.time() - psutil.boot_time())))
+    }
+
+
+class HostInfoSampler:
+    """
+    本机信息采样器
+
+    Args:
+        interval: 动态指标的采样周期（秒）
+        facts_ttl: 静态信息的刷新周期（秒）
+        disk_path: 统计磁盘的挂载点
+    """
+
+    def __init__(self, interval=5, facts_ttl=3600, disk_path='/'):
+        self.interval = interval
+        self.facts_ttl = facts_ttl
+        self.disk_path = disk_path
+        self._facts = None
+        self._facts_at = 0
+        self._metrics = None
+        self._thread = None
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        """启动后台采样线程（fork后的子进程中会重新启动）"""
+        with self._lock:
+            if self._pid == os.getpid() and self._thread is not None and self._thread.is_alive():
+                return
+            self._pid = os.getpid()
+            self._thread = threading.Thread(target=self._run, name='host-info-sampler', daemon=True)
+            self._thread.start()
+
+    def _run(self):
+        while True:
+            try:
+                self.refresh()
+            except Exception as e:
+                print(f'采集本机信息失败: {e}')
+            time.sleep(self.interval)
+
+    def refresh(self):
+        """采样动态指标，静态信息过期时一并刷新"""
+        if self._facts is None or time.monotonic() - self._facts_at >= self.facts_ttl:
+            self._facts = read_host_facts(self.disk_path)
+            self._facts_at = time.monotonic()
+        self._metrics = read_host_metrics(self.disk_path)
+
+    def snapshot(self):
+        """
+        获取本机信息
+
+        后台线程尚未完成第一次采样时同步采样一次。
+
+        Returns:
+            dict: 静态信息和最新的动态指标
+        """
+        self.start()
+        if self._facts is None or self._metrics is None:
+            self.refresh()
+        return {**self._facts, **self._metrics}
+
+
+_host_sampler = None
+_host_sampler_lock = threading.Lock()
+
+
+def get_host_sampler():
+    """
+    获取当前进程的本机信息采样器（首次调用时按应用配置创建并启动）
+
+    Returns:
+        HostInfoSampler: 采样器实例
+    """
+    global _host_sampler
+    if _host_sampler is not None:
+        return _host_sampler
+
+    from flask import current_app, has_app_context
+    config = current_app.config if has_app_context() else {}
+
+    with _host_sampler_lock:
+        if _host_sampler is None:
+            _host_sampler = HostInfoSampler(
+                interval=config.get('DASHBOARD_SAMPLE_INTERVAL', 5),
+                facts_ttl=config.get('DASHBOARD_FACTS_TTL', 3600)
+            )
+            _host_sampler.start()
+    return _host_sampler
@@ -11,16 +11,14 @@ Tiny Panel - Linux服务器管理面板
 from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
 from flask_login import login_required, current_user
 import os
-import subprocess
 import time
 import datetime
 import json
-import psycopg2
-import mysql.connector
 from werkzeug.utils import secure_filename
 
 from app import db, bcrypt
 from app.models import Database, User
+from app.executor import run_local_command
 from app.databases.forms import DatabaseForm, DatabaseBackupForm
 from app.databases.utils import (
     get_database_types, get_database_info, create_mysql_database, create_postgresql_database,
@@ -342,14 +340,14 @@ def check_database_name():
     # 检查实际数据库中是否存在同名数据库
     try:
         # 检查MySQL
-        mysql_check = subprocess.run([
+        mysql_check = run_local_command([
             'mysql', '-e', f'SHOW DATABASES LIKE "{db_name}";'
-        ], capture_output=True, text=True)
+        ])
         
         # 检查PostgreSQL
-        pg_check = subprocess.run([
+        pg_check = run_local_command([
             'psql', '-U', 'postgres', '-c', f'SELECT datname FROM pg_database WHERE datname = \"{db_name}\";'
-        ], capture_output=True, text=True)
+        ])
         
         if existing_db or mysql_check.stdout.strip() or pg_check.stdout.strip():
             return jsonify({'exists': True})
@@ -370,17 +368,17 @@ def check_database_user():
     try:
         if db_type == 'MySQL':
             # 检查MySQL用户
-            result = subprocess.run([
+            result = run_local_command([
                 'mysql', '-e', f'SELECT User FROM mysql.user WHERE User = "{db_user}";'
-            ], capture_output=True, text=True)
+            ])
             
             if result.stdout.strip():
                 return jsonify({'exists': True})
         elif db_type == 'PostgreSQL':
             # 检查PostgreSQL用户
-            result = subprocess.run([
+            result = run_local_command([
                 'psql', '-U', 'postgres', '-c', f'SELECT usename FROM pg_user WHERE usename = \"{db_user}\";'
-            ], capture_output=True, text=True)
+            ])
             
             if result.stdout.strip():
                 return jsonify({'exists': True})
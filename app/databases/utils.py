@@ -6,6 +6,7 @@ Tiny Panel - Linux服务器管理面板
 数据库管理模块工具函数
 
 本模块提供数据库管理相关的工具函数，包括数据库创建、备份、还原等操作。
+数据库驱动（mysql.connector、psycopg2）在读取数据库详细信息时才导入，不影响面板启动速度。
 """
 
 import os
@@ -14,10 +15,12 @@ import time
 import datetime
 import json
 import re
-import psycopg2
-import mysql.connector
-from mysql.connector import Error as MySQLError
-from psycopg2 import OperationalError as PostgreSQLError
+
+from app.executor import run_local_command
+
+
+# 备份和恢复命令的超时时间（秒）
+BACKUP_TIMEOUT = 3600
 
 
 def get_database_types():
@@ -31,18 +34,18 @@ def get_database_types():
     
     # 检查MySQL
     try:
-        result = subprocess.run(['mysql', '--version'], capture_output=True, text=True)
+        result = run_local_command(['mysql', '--version'])
         if result.returncode == 0 and 'mysql' in result.stdout.lower():
             db_types.append('MySQL')
-    except (FileNotFoundError, subprocess.SubprocessError):
+    except subprocess.SubprocessError:
         pass
     
     # 检查PostgreSQL
     try:
-        result = subprocess.run(['psql', '--version'], capture_output=True, text=True)
+        result = run_local_command(['psql', '--version'])
         if result.returncode == 0 and 'psql' in result.stdout.lower():
             db_types.append('PostgreSQL')
-    except (FileNotFoundError, subprocess.SubprocessError):
+    except subprocess.SubprocessError:
         pass
     
     return db_types
@@ -81,6 +84,9 @@ def _get_mysql_info(db_name, db_user, db_password):
     Returns:
         dict: MySQL数据库详细信息
     """
+    import mysql.connector
+    from mysql.connector import Error as MySQLError
+
     try:
         # 连接到MySQL
         connection = mysql.connector.connect(
@@ -151,6 +157,9 @@ def _get_postgresql_info(db_name, db_user, db_password):
     Returns:
         dict: PostgreSQL数据库详细信息
     """
+    import psycopg2
+    from psycopg2 import OperationalError as PostgreSQLError
+
     try:
         # 连接到PostgreSQL
         connection = psycopg2.connect(
@@ -222,40 +231,40 @@ def create_mysql_database(db_name, db_user, db_password):
     """
     try:
         # 检查MySQL是否安装
-        result = subprocess.run(['mysql', '--version'], capture_output=True, text=True)
+        result = run_local_command(['mysql', '--version'])
         if result.returncode != 0:
             return False, 'MySQL未安装或不可用'
         
         # 检查数据库是否已存在
         check_db_cmd = f"mysql -e \"SHOW DATABASES LIKE '{db_name}';\""
-        check_db = subprocess.run(check_db_cmd, shell=True, capture_output=True, text=True)
+        check_db = run_local_command(check_db_cmd)
         if check_db.stdout.strip():
             return False, f'数据库 {db_name} 已存在'
         
         # 检查用户是否已存在
         check_user_cmd = f"mysql -e \"SELECT User FROM mysql.user WHERE User='{db_user}';\""
-        check_user = subprocess.run(check_user_cmd, shell=True, capture_output=True, text=True)
+        check_user = run_local_command(check_user_cmd)
         
         # 创建数据库
         create_db_cmd = f"mysql -e \"CREATE DATABASE {db_name} CHARACTER SET utf8mb4 COLLATE utf8mb4_unicode_ci;\""
-        subprocess.run(create_db_cmd, shell=True, check=True)
+        run_local_command(create_db_cmd, check=True)
         
         if not check_user.stdout.strip():
             # 创建用户
             create_user_cmd = f"mysql -e \"CREATE USER '{db_user}'@'localhost' IDENTIFIED BY '{db_password}';\""
-            subprocess.run(create_user_cmd, shell=True, check=True)
+            run_local_command(create_user_cmd, check=True)
         else:
             # 更新用户密码
             update_user_cmd = f"mysql -e \"ALTER USER '{db_user}'@'localhost' IDENTIFIED BY '{db_password}';\""
-            subprocess.run(update_user_cmd, shell=True, check=True)
+            run_local_command(update_user_cmd, check=True)
         
         # 授予用户权限
         grant_cmd = f"mysql -e \"GRANT ALL PRIVILEGES ON {db_name}.* TO '{db_user}'@'localhost';\""
-        subprocess.run(grant_cmd, shell=True, check=True)
+        run_local_command(grant_cmd, check=True)
         
         # 刷新权限
         flush_cmd = "mysql -e \"FLUSH PRIVILEGES;\""
-        subprocess.run(flush_cmd, shell=True, check=True)
+        run_local_command(flush_cmd, check=True)
         
         return True, f'MySQL数据库 {db_name} 创建成功'
     
@@ -279,36 +288,36 @@ def create_postgresql_database(db_name, db_user, db_password):
     """
     try:
         # 检查PostgreSQL是否安装
-        result = subprocess.run(['psql', '--version'], capture_output=True, text=True)
+        result = run_local_command(['psql', '--version'])
         if result.returncode != 0:
             return False, 'PostgreSQL未安装或不可用'
         
         # 检查数据库是否已存在
         check_db_cmd = f"psql -U postgres -c \"SELECT datname FROM pg_database WHERE datname = '{db_name}';\""
-        check_db = subprocess.run(check_db_cmd, shell=True, capture_output=True, text=True)
+        check_db = run_local_command(check_db_cmd)
         if check_db.stdout.strip():
             return False, f'数据库 {db_name} 已存在'
         
         # 检查用户是否已存在
         check_user_cmd = f"psql -U postgres -c \"SELECT usename FROM pg_user WHERE usename = '{db_user}';\""
-        check_user = subprocess.run(check_user_cmd, shell=True, capture_output=True, text=True)
+        check_user = run_local_command(check_user_cmd)
         
         if not check_user.stdout.strip():
             # 创建用户
             create_user_cmd = f"psql -U postgres -c \"CREATE USER {db_user} WITH PASSWORD '{db_password}';\""
-            subprocess.run(create_user_cmd, shell=True, check=True)
+            run_local_command(create_user_cmd, check=True)
         else:
             # 更新用户密码
             update_user_cmd = f"psql -U postgres -c \"ALTER USER {db_user} WITH PASSWORD '{db_password}';\""
-            subprocess.run(update_user_cmd, shell=True, check=True)
+            run_local_command(update_user_cmd, check=True)
         
         # 创建数据库
         create_db_cmd = f"psql -U postgres -c \"CREATE DATABASE {db_name} OWNER {db_user} ENCODING 'UTF8';\""
-        subprocess.run(create_db_cmd, shell=True, check=True)
+        run_local_command(create_db_cmd, check=True)
         
         # 授予用户权限
         grant_cmd = f"psql -U postgres -c \"GRANT ALL PRIVILEGES ON DATABASE {db_name} TO {db_user};\""
-        subprocess.run(grant_cmd, shell=True, check=True)
+        run_local_command(grant_cmd, check=True)
         
         return True, f'PostgreSQL数据库 {db_name} 创建成功'
     
@@ -333,30 +342,30 @@ def delete_database(db_type, db_name):
         if db_type == 'MySQL':
             # 检查数据库是否存在
             check_cmd = f"mysql -e \"SHOW DATABASES LIKE '{db_name}';\""
-            check = subprocess.run(check_cmd, shell=True, capture_output=True, text=True)
+            check = run_local_command(check_cmd)
             if not check.stdout.strip():
                 return False, f'MySQL数据库 {db_name} 不存在'
             
             # 删除数据库
             delete_cmd = f"mysql -e \"DROP DATABASE {db_name};\""
-            subprocess.run(delete_cmd, shell=True, check=True)
+            run_local_command(delete_cmd, check=True)
             
             return True, f'MySQL数据库 {db_name} 删除成功'
             
         elif db_type == 'PostgreSQL':
             # 检查数据库是否存在
             check_cmd = f"psql -U postgres -c \"SELECT datname FROM pg_database WHERE datname = '{db_name}';\""
-            check = subprocess.run(check_cmd, shell=True, capture_output=True, text=True)
+            check = run_local_command(check_cmd)
             if not check.stdout.strip():
                 return False, f'PostgreSQL数据库 {db_name} 不存在'
             
             # 确保没有活动连接
             disconnect_cmd = f"psql -U postgres -c \"SELECT pg_terminate_backend(pid) FROM pg_stat_activity WHERE datname = '{db_name}';\""
-            subprocess.run(disconnect_cmd, shell=True, check=True)
+            run_local_command(disconnect_cmd, check=True)
             
             # 删除数据库
             delete_cmd = f"psql -U postgres -c \"DROP DATABASE {db_name};\""
-            subprocess.run(delete_cmd, shell=True, check=True)
+            run_local_command(delete_cmd, check=True)
             
             return True, f'PostgreSQL数据库 {db_name} 删除成功'
         
@@ -386,30 +395,30 @@ def change_database_password(db_type, db_name, db_user, new_password):
         if db_type == 'MySQL':
             # 检查用户是否存在
             check_cmd = f"mysql -e \"SELECT User FROM mysql.user WHERE User='{db_user}';\""
-            check = subprocess.run(check_cmd, shell=True, capture_output=True, text=True)
+            check = run_local_command(check_cmd)
             if not check.stdout.strip():
                 return False, f'MySQL用户 {db_user} 不存在'
             
             # 修改密码
             update_cmd = f"mysql -e \"ALTER USER '{db_user}'@'localhost' IDENTIFIED BY '{new_password}';\""
-            subprocess.run(update_cmd, shell=True, check=True)
+            run_local_command(update_cmd, check=True)
             
             # 刷新权限
             flush_cmd = "mysql -e \"FLUSH PRIVILEGES;\""
-            subprocess.run(flush_cmd, shell=True, check=True)
+            run_local_command(flush_cmd, check=True)
             
             return True, f'MySQL用户 {db_user} 密码修改成功'
             
         elif db_type == 'PostgreSQL':
             # 检查用户是否存在
             check_cmd = f"psql -U postgres -c \"SELECT usename FROM pg_user WHERE usename = '{db_user}';\""
-            check = subprocess.run(check_cmd, shell=True, capture_output=True, text=True)
+            check = run_local_command(check_cmd)
             if not check.stdout.strip():
                 return False, f'PostgreSQL用户 {db_user} 不存在'
             
             # 修改密码
             update_cmd = f"psql -U postgres -c \"ALTER USER {db_user} WITH PASSWORD '{new_password}';\""
-            subprocess.run(update_cmd, shell=True, check=True)
+            run_local_command(update_cmd, check=True)
             
             return True, f'PostgreSQL用户 {db_user} 密码修改成功'
         
@@ -452,11 +461,11 @@ def backup_database(db_type, db_name, db_user, db_password, backup_name=None):
             # MySQL备份
             backup_file = os.path.join(backup_dir, f'{filename}.sql')
             cmd = f"mysqldump -u {db_user} -p{db_password} --databases {db_name} > {backup_file}"
-            subprocess.run(cmd, shell=True, check=True)
+            run_local_command(cmd, check=True, timeout=BACKUP_TIMEOUT)
             
             # 压缩备份文件
             zip_cmd = f"zip -q {backup_file}.zip {backup_file}"
-            subprocess.run(zip_cmd, shell=True, check=True)
+            run_local_command(zip_cmd, check=True, timeout=BACKUP_TIMEOUT)
             
             # 删除未压缩的文件
             os.remove(backup_file)
@@ -467,11 +476,11 @@ def backup_database(db_type, db_name, db_user, db_password, backup_name=None):
             # PostgreSQL备份
             backup_file = os.path.join(backup_dir, f'{filename}.sql')
             cmd = f"PGPASSWORD={db_password} pg_dump -U {db_user} -d {db_name} > {backup_file}"
-            subprocess.run(cmd, shell=True, check=True)
+            run_local_command(cmd, check=True, timeout=BACKUP_TIMEOUT)
             
             # 压缩备份文件
             zip_cmd = f"zip -q {backup_file}.zip {backup_file}"
-            subprocess.run(zip_cmd, shell=True, check=True)
+            run_local_command(zip_cmd, check=True, timeout=BACKUP_TIMEOUT)
             
             # 删除未压缩的文件
             os.remove(backup_file)
@@ -516,7 +525,7 @@ def restore_database(db_type, db_name, db_user, db_password, backup_file):
             if backup_file.endswith('.zip'):
                 temp_file = backup_path[:-4]  # 去掉.zip扩展名
                 unzip_cmd = f"unzip -q {backup_path} -d {backup_dir}"
-                subprocess.run(unzip_cmd, shell=True, check=True)
+                run_local_command(unzip_cmd, check=True, timeout=BACKUP_TIMEOUT)
                 sql_file = temp_file
             else:
                 sql_file = backup_path
@@ -524,7 +533,7 @@ def restore_database(db_type, db_name, db_user, db_password, backup_file):
             if db_type == 'MySQL':
                 # MySQL还原
                 cmd = f"mysql -u {db_user} -p{db_password} {db_name} < {sql_file}"
-                subprocess.run(cmd, shell=True, check=True)
+                run_local_command(cmd, check=True, timeout=BACKUP_TIMEOUT)
                 
                 return True, f'MySQL数据库还原成功: {db_name}'
                 
@@ -532,11 +541,11 @@ def restore_database(db_type, db_name, db_user, db_password, backup_file):
                 # PostgreSQL还原
                 # 先清空数据库
                 truncate_cmd = f"PGPASSWORD={db_password} psql -U {db_user} -d {db_name} -c \"DO $$ DECLARE r record; BEGIN FOR r IN (SELECT tablename FROM pg_tables WHERE schemaname = current_schema()) LOOP EXECUTE 'DROP TABLE IF EXISTS ' || quote_ident(r.tablename) || ' CASCADE'; END LOOP; END $$;\""
-                subprocess.run(truncate_cmd, shell=True, check=True)
+                run_local_command(truncate_cmd, check=True)
                 
                 # 执行还原
                 cmd = f"PGPASSWORD={db_password} psql -U {db_user} -d {db_name} < {sql_file}"
-                subprocess.run(cmd, shell=True, check=True)
+                run_local_command(cmd, check=True, timeout=BACKUP_TIMEOUT)
                 
                 return True, f'PostgreSQL数据库还原成功: {db_name}'
             
@@ -0,0 +1,428 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+命令执行器
+
+本模块是各功能模块执行本地和远程命令的统一入口：
+本机命令通过子进程执行，远程命令通过SSH连接池执行。执行器限制全局和单台服务器的
+并发命令数，支持截止时间和取消，并按执行方式和结果统计命令数量和耗时分布。
+管理面板所在主机的命令（网站、数据库、软件管理等）使用run_local_command，
+其接口与subprocess.run相近，便于替换原有的直接调用。这些命令使用独立的并发槽位，
+其中超时较长的操作（如备份、安装软件）另有一组槽位，不会占满请求中短命令的槽位。
+"""
+
+import codecs
+import os
+import selectors
+import shlex
+import signal
+import subprocess
+import threading
+import time
+from bisect import bisect_left
+from contextlib import contextmanager
+from types import SimpleNamespace
+
+from app.ssh_pool import get_ssh_pool
+
+
+# 本机服务器的主机名
+LOCAL_HOSTNAMES = ('localhost', '127.0.0.1')
+
+# 面板所在主机，run_local_command使用
+LOCAL_SERVER = SimpleNamespace(id=None, name='localhost', hostname='localhost')
+
+# run_local_command的超时超过该值（秒）时视为耗时操作，使用单独的并发槽位
+LOCAL_LONG_COMMAND_TIMEOUT = 300
+
+# 命令耗时直方图的桶上限（秒），最后一个桶为+Inf
+LATENCY_BUCKETS = (0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 300)
+
+# 命令结果分类
+OUTCOMES = ('ok', 'failed', 'error', 'timeout', 'cancelled', 'rejected')
+
+# 当前线程的命令截止时间（单调时钟秒）
+_deadline = threading.local()
+
+
+@contextmanager
+def command_deadline(seconds):
+    """
+    为当前线程内执行的所有命令设置截止时间
+
+    在上下文中调用execute_remote_command时，超时时间不会超过剩余时间，
+    用于保证单台服务器的一轮采集不会超过规定时长。
+
+    Args:
+        seconds: 距离截止的秒数
+    """
+    previous = getattr(_deadline, 'value', None)
+    _deadline.value = time.monotonic() + seconds
+    try:
+        yield
+    finally:
+        _deadline.value = previous
+
+
+def _remaining_timeout(timeout):
+    """
+    根据当前线程的截止时间收紧超时时间
+
+    Args:
+        timeout: 原始超时时间（秒）
+
+    Returns:
+        float: 实际使用的超时时间（秒）
+    """
+    deadline = getattr(_deadline, 'value', None)
+    if deadline is None:
+        return timeout
+    remaining = deadline - time.monotonic()
+    if remaining <= 0:
+        raise TimeoutError('命令执行已超过截止时间')
+    return min(timeout, remaining)
+
+
+def is_local(server):
+    """
+    判断服务器是否为本机
+
+    Args:
+        server: 服务器对象
+
+    Returns:
+        bool: 是否为本机
+    """
+    return server.hostname in LOCAL_HOSTNAMES
+
+
+class LatencyHistogram:
+    """累计分布的耗时直方图（与Prometheus histogram的桶语义一致）"""
+
+    def __init__(self, buckets=LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        self.counts[bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            dict: 各桶上限对应的累计数量、总耗时和总数
+        """
+        cumulative = []
+        total = 0
+        for bound, count in zip(self.buckets + ('+Inf',), self.counts):
+            total += count
+            cumulative.append((bound, total))
+        return {'buckets': cumulative, 'sum': round(self.sum, 6), 'count': self.count}
+
+
+class CommandExecutor:
+    """
+    带并发限制和统计的命令执行器
+
+    Args:
+        max_concurrency: 全局同时执行的命令数上限
+        max_per_server: 单台服务器同时执行的命令数上限
+        max_per_pool: 命名槽位（如run_local_command使用的槽位）同时执行的命令数上限
+        ssh_pool: SSH连接池，默认使用进程共享的连接池
+    """
+
+    def __init__(self, max_concurrency=64, max_per_server=4, max_per_pool=16, ssh_pool=None):
+        self.max_concurrency = max_concurrency
+        self.max_per_server = max_per_server
+        self.max_per_pool = max_per_pool
+        self._ssh_pool = ssh_pool
+
+        self._global = threading.BoundedSemaphore(max_concurrency)
+        self._per_server = {}
+        self._lock = threading.Lock()
+
+        # 统计信息
+        self.inflight = 0
+        self.waiting = 0
+        self.counts = {}
+        self.histograms = {}
+
+    def _server_semaphore(self, server, pool=None):
+        if pool is not None:
+            key, size = ('pool', pool), self.max_per_pool
+        else:
+            key, size = 'localhost' if is_local(server) else (server.id, server.hostname), self.max_per_server
+        with self._lock:
+            semaphore = self._per_server.get(key)
+            if semaphore is None:
+                semaphore = self._per_server[key] = threading.BoundedSemaphore(size)
+            return semaphore
+
+    def _record(self, mode, outcome, elapsed):
+        with self._lock:
+            self.counts[(mode, outcome)] = self.counts.get((mode, outcome), 0) + 1
+            histogram = self.histograms.get(mode)
+            if histogram is None:
+                histogram = self.histograms[mode] = LatencyHistogram()
+            histogram.observe(elapsed)
+
+    def execute(self, server, command, timeout=300, cancel=None, on_output=None, pool=None):
+        """
+        在服务器上执行命令
+
+        超时时间受当前线程的command_deadline约束；等待并发槽位的时间也计入超时。
+
+        Args:
+            server: 服务器对象
+            command: 要执行的命令
+            timeout: 超时时间（秒）
+            cancel: 取消事件（threading.Event），被设置时终止命令
+            on_output: 输出回调 on_output(流名称, 文本)，流名称为stdout或stderr。
+                       指定时输出随读随交给回调而不在内存中累积，返回结果中的stdout/stderr为空
+            pool: 并发槽位名称，指定时使用该名称的槽位（max_per_pool）代替服务器的槽位（max_per_server）
+
+        Returns:
+            dict: 包含返回码、标准输出、标准错误和执行结果（OUTCOMES中的一项）的字典
+        """
+        mode = 'local' if is_local(server) else 'ssh'
+        started = time.monotonic()
+        outcome = 'error'
+        acquired = []
+        try:
+            timeout = _remaining_timeout(timeout)
+            deadline = started + timeout
+
+            with self._lock:
+                self.waiting += 1
+            try:
+                for semaphore in (self._server_semaphore(server, pool), self._global):
+                    if not semaphore.acquire(timeout=max(0, deadline - time.monotonic())):
+                        outcome = 'rejected'
+                        raise TimeoutError('等待命令执行槽位超时')
+                    acquired.append(semaphore)
+            finally:
+                with self._lock:
+                    self.waiting -= 1
+
+            with self._lock:
+                self.inflight += 1
+            try:
+                remaining = max(0.1, deadline - time.monotonic())
+                if mode == 'local' and on_output is not None:
+                    result = self._stream_local(command, remaining, cancel, on_output)
+                elif mode == 'local':
+                    result = self._run_local(command, remaining, cancel)
+                else:
+                    pool = self._ssh_pool or get_ssh_pool()
+                    result = pool.execute(server, command, remaining, cancel=cancel, on_output=on_output)
+            finally:
+                with self._lock:
+                    self.inflight -= 1
+
+            outcome = 'ok' if result['returncode'] == 0 else 'failed'
+            result['outcome'] = outcome
+            return result
+
+        except Exception as e:
+            if isinstance(e, InterruptedError):
+                outcome = 'cancelled'
+            elif isinstance(e, (TimeoutError, subprocess.TimeoutExpired)) and outcome != 'rejected':
+                outcome = 'timeout'
+            return {
+                'returncode': -1,
+                'stdout': '',
+                'stderr': str(e),
+                'outcome': outcome
+            }
+        finally:
+            for semaphore in reversed(acquired):
+                semaphore.release()
+            self._record(mode, outcome, time.monotonic() - started)
+
+    def _run_local(self, command, timeout, cancel=None):
+        """在本机子进程中执行命令，超时或取消时终止整个进程组"""
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            text=True,
+            start_new_session=True
+        )
+        deadline = time.monotonic() + timeout
+        try:
+            while True:
+                wait = deadline - time.monotonic()
+                if cancel is not None:
+                    wait = min(wait, 0.2)
+                try:
+                    stdout, stderr = process.communicate(timeout=max(0, wait))
+                    break
+                except subprocess.TimeoutExpired:
+                    if cancel is not None and cancel.is_set():
+                        raise InterruptedError('命令已取消')
+                    if time.monotonic() >= deadline:
+                        raise
+        except BaseException:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            process.communicate()
+            raise
+
+        return {
+            'returncode': process.returncode,
+            'stdout': stdout,
+            'stderr': stderr
+        }
+
+    def _stream_local(self, command, timeout, cancel, on_output):
+        """在本机子进程中执行命令，输出按块读取并交给回调"""
+        process = subprocess.Popen(
+            command,
+            shell=True,
+            stdin=subprocess.DEVNULL,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            start_new_session=True
+        )
+        deadline = time.monotonic() + timeout
+        selector = selectors.DefaultSelector()
+        decoders = {}
+        for name, pipe in (('stdout', process.stdout), ('stderr', process.stderr)):
+            selector.register(pipe, selectors.EVENT_READ, name)
+            decoders[name] = codecs.getincrementaldecoder('utf-8')(errors='replace')
+        try:
+            while selector.get_map():
+                if cancel is not None and cancel.is_set():
+                    raise InterruptedError('命令已取消')
+                wait = deadline - time.monotonic()
+                if wait <= 0:
+                    raise subprocess.TimeoutExpired(command, timeout)
+                for key, _ in selector.select(min(wait, 0.2)):
+                    data = os.read(key.fd, 32768)
+                    if not data:
+                        selector.unregister(key.fileobj)
+                    text = decoders[key.data].decode(data, not data)
+                    if text:
+                        on_output(key.data, text)
+            process.wait(timeout=max(0, deadline - time.monotonic()))
+        except BaseException:
+            try:
+                os.killpg(process.pid, signal.SIGKILL)
+            except OSError:
+                pass
+            process.wait()
+            raise
+        finally:
+            selector.close()
+            process.stdout.close()
+            process.stderr.close()
+
+        return {
+            'returncode': process.returncode,
+            'stdout': '',
+            'stderr': ''
+        }
+
+    def stats(self):
+        """
+        获取执行器统计信息
+
+        Returns:
+            dict: 执行中/等待中的命令数、按执行方式和结果分类的命令数、耗时直方图
+        """
+        with self._lock:
+            return {
+                'max_concurrency': self.max_concurrency,
+                'max_per_server': self.max_per_server,
+                'max_per_pool': self.max_per_pool,
+                'inflight': self.inflight,
+                'waiting': self.waiting,
+                'commands': {f'{mode}.{outcome}': count for (mode, outcome), count in self.counts.items()},
+                'latency': {mode: histogram.snapshot() for mode, histogram in self.histograms.items()}
+            }
+
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    获取当前进程共享的命令执行器（首次调用时按应用配置创建）
+
+    Returns:
+        CommandExecutor: 执行器实例
+    """
+    global _executor
+    if _executor is not None:
+        return _executor
+
+    from flask import current_app, has_app_context
+    config = current_app.config if has_app_context() else {}
+
+    with _executor_lock:
+        if _executor is None:
+            _executor = CommandExecutor(
+                max_concurrency=config.get('EXECUTOR_MAX_CONCURRENCY', 64),
+                max_per_server=config.get('EXECUTOR_MAX_PER_SERVER', 4),
+                max_per_pool=config.get('EXECUTOR_MAX_LOCAL_COMMANDS', 16)
+            )
+    return _executor
+
+
+def execute_remote_command(server, command, timeout=300, cancel=None, on_output=None):
+    """
+    在远程服务器上执行命令
+
+    Args:
+        server: 服务器对象
+        command: 要执行的命令
+        timeout: 超时时间（秒）
+        cancel: 取消事件（threading.Event），被设置时终止命令
+        on_output: 输出回调 on_output(流名称, 文本)，指定时以流式方式执行，
+                   返回结果中的stdout/stderr为空
+
+    Returns:
+        dict: 包含返回码、标准输出和标准错误的字典
+    """
+    return get_executor().execute(server, command, timeout, cancel, on_output)
+
+
+def run_local_command(args, check=False, timeout=300, cancel=None):
+    """
+    在面板所在主机上执行命令
+
+    命令同样受执行器的全局并发限制、超时和统计约束，但不占用本机服务器的槽位：
+    超时不超过LOCAL_LONG_COMMAND_TIMEOUT的命令和更长的命令各使用一组槽位（EXECUTOR_MAX_LOCAL_COMMANDS），
+    耗时操作不会阻塞请求中的短命令。命令不存在时不会抛出FileNotFoundError，而是与shell一致返回127。
+
+    Args:
+        args: 命令参数列表（逐个转义后拼接）或shell命令字符串
+        check: 返回码非0时是否抛出subprocess.CalledProcessError
+        timeout: 超时时间（秒）
+        cancel: 取消事件（threading.Event），被设置时终止命令
+
+    Returns:
+        subprocess.CompletedProcess: 返回码、标准输出和标准错误（文本）
+
+    Raises:
+        subprocess.TimeoutExpired: 命令超时
+        subprocess.CalledProcessError: check为True且返回码非0（包括被取消和等待槽位超时）
+    """
+    command = args if isinstance(args, str) else shlex.join(str(arg) for arg in args)
+    pool = 'local-long' if timeout > LOCAL_LONG_COMMAND_TIMEOUT else 'local'
+    result = get_executor().execute(LOCAL_SERVER, command, timeout, cancel, pool=pool)
+    if result['outcome'] == 'timeout':
+        raise subprocess.TimeoutExpired(args, timeout, output=result['stdout'], stderr=result['stderr'])
+    completed = subprocess.CompletedProcess(args, result['returncode'], result['stdout'], result['stderr'])
+    if check:
+        completed.check_returncode()
+    return completed
@@ -0,0 +1,17 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+批量执行模块
+
+本模块提供在多台服务器上并发执行同一条命令的功能，各服务器的结果在执行完成时逐条返回。
+"""
+
+from flask import Blueprint
+
+# 创建批量执行蓝图
+fleet = Blueprint('fleet', __name__, url_prefix='/fleet')
+
+# 导入路由
+from app.fleet import routes
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+批量执行模块路由
+
+本模块提供批量执行页面和批量执行API。API的响应为逐行JSON（NDJSON）流，
+每台服务器执行完成时立即输出一行结果，无需等待全部服务器完成。
+"""
+
+import json
+import time
+
+from flask import render_template, jsonify, request, current_app, Response
+from flask_login import login_required, current_user
+
+from app.models import Server
+from app.fleet import fleet
+from app.fleet.utils import broadcast_command
+from app.monitoring.collector import server_snapshot
+from app.utils import admin_required
+
+
+@fleet.route('/')
+@login_required
+@admin_required
+def index():
+    """
+    批量执行页面
+    """
+    servers = Server.query.order_by(Server.name).all()
+    return render_template('fleet/index.html', title='批量执行', servers=servers)
+
+
+@fleet.route('/api/broadcast', methods=['POST'])
+@login_required
+@admin_required
+def api_broadcast():
+    """
+    在选中的服务器上并发执行命令的API
+
+    请求体为JSON：{"server_ids": [...], "command": "...", "timeout": 秒}。
+    响应的每一行是一个JSON对象，type依次为start、result（每台服务器一行）和done。
+    """
+    data = request.get_json(silent=True) or {}
+    command = (data.get('command') or '').strip()
+    server_ids = [int(i) for i in data.get('server_ids', []) if str(i).isdigit()]
+    max_timeout = current_app.config.get('FLEET_MAX_TIMEOUT', 600)
+    try:
+        timeout = min(float(data.get('timeout') or current_app.config.get('FLEET_DEFAULT_TIMEOUT', 60)), max_timeout)
+    except (TypeError, ValueError):
+        return jsonify({'success': False, 'message': '超时时间无效'}), 400
+
+    if not command:
+        return jsonify({'success': False, 'message': '请输入要执行的命令'}), 400
+    if not server_ids:
+        return jsonify({'success': False, 'message': '请选择服务器'}), 400
+
+    # 复制服务器字段，执行线程在请求的数据库会话之外读取
+    servers = [server_snapshot(server) for server in Server.query.filter(Server.id.in_(server_ids)).all()]
+    if not servers:
+        return jsonify({'success': False, 'message': '服务器不存在'}), 404
+
+    print(f'用户 {current_user.username} 在{len(servers)}台服务器上批量执行命令: {command}')
+
+    max_workers = current_app.config.get('FLEET_MAX_FANOUT', 32)
+    max_output = current_app.config.get('FLEET_MAX_OUTPUT', 65536)
+
+    def generate():
+        started = time.monotonic()
+        succeeded = 0
+        yield json.dumps({'type': 'start', 'total': len(servers)}, ensure_ascii=False) + '\n'
+        for result in broadcast_command(servers, command, timeout, max_workers, max_output):
+            if result['returncode'] == 0:
+                succeeded += 1
+            yield json.dumps(dict(result, type='result'), ensure_ascii=False) + '\n'
+        yield json.dumps({
+            'type': 'done',
+            'total': len(servers),
+            'succeeded': succeeded,
+            'failed': len(servers) - succeeded,
+            'duration': round(time.monotonic() - started, 3)
+        }, ensure_ascii=False) + '\n'
+
+    return Response(generate(), mimetype='application/x-ndjson', headers={
+        'Cache-Control': 'no-cache',
+        'X-Accel-Buffering': 'no'
+    })
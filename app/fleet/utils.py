@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+批量执行模块工具函数
+
+本模块在有限的并发度下把同一条命令分发到多台服务器，按完成顺序逐台返回结果。
+命令经由统一的命令执行器执行，同样受全局和单台服务器的并发上限约束。
+"""
+
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from app.executor import execute_remote_command
+
+
+def truncate_output(text, limit):
+    """
+    截断过长的命令输出，保留开头和结尾
+
+    Args:
+        text: 命令输出
+        limit: 最大字符数
+
+    Returns:
+        tuple: (截断后的输出, 是否被截断)
+    """
+    if len(text) <= limit:
+        return text, False
+    half = limit // 2
+    return f'{text[:half]}\n... [省略{len(text) - limit}个字符] ...\n{text[-half:]}', True
+
+
+def broadcast_command(servers, command, timeout=60, max_workers=32, max_output=65536):
+    """
+    在多台服务器上并发执行同一条命令，按完成顺序逐台产出结果
+
+    生成器被提前关闭（如客户端断开连接）时，会取消尚未开始的命令并终止正在执行的命令。
+
+    Args:
+        servers: 服务器对象列表（应为脱离数据库会话的快照）
+        command: 要执行的命令
+        timeout: 单台服务器的超时时间（秒）
+        max_workers: 同时执行的服务器数量上限
+        max_output: 每台服务器保留的标准输出/标准错误的最大字符数
+
+    Yields:
+        dict: 单台服务器的执行结果
+    """
+    if not servers:
+        return
+
+    cancel = threading.Event()
+
+    def run(server):
+        started = time.monotonic()
+        result = execute_remote_command(server, command, timeout=timeout, cancel=cancel)
+        stdout, stdout_truncated = truncate_output(result['stdout'], max_output)
+        stderr, stderr_truncated = truncate_output(result['stderr'], max_output)
+        return {
+            'server_id': server.id,
+            'name': server.name,
+            'hostname': server.hostname,
+            'returncode': result['returncode'],
+            'stdout': stdout,
+            'stderr': stderr,
+            'truncated': stdout_truncated or stderr_truncated,
+            'duration': round(time.monotonic() - started, 3)
+        }
+
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(servers)), thread_name_prefix='fleet')
+    try:
+        futures = [pool.submit(run, server) for server in servers]
+        for future in as_completed(futures):
+            yield future.result()
+    finally:
+        cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
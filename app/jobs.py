@@ -0,0 +1,442 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+后台命令任务
+
+本模块在后台线程中以流式方式执行耗时较长的命令（如软件安装），
+命令输出逐行写入有界缓冲区，前端按行偏移量增量读取。
+缓冲区只保留最近的若干行，无论命令输出多少，内存占用都保持不变。
+
+任务状态和缓冲区内容会定期写入任务目录下的JSON文件，
+多进程部署时其他工作进程也能读取到任务进度。任务只在创建它的工作进程中执行，
+状态文件记录该进程的ID：进程退出后仍处于运行状态的任务在读取时标记为失败，
+取消其他进程中的任务时抛出JobNotOwned。
+"""
+
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+import uuid
+from collections import deque
+
+from app.executor import execute_remote_command
+
+
+# 任务ID格式（uuid4的十六进制形式）
+JOB_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# 任务状态
+JOB_STATUSES = ('running', 'success', 'failed', 'cancelled')
+
+
+class JobNotOwned(RuntimeError):
+    """任务由其他工作进程执行，当前进程无法取消"""
+
+    def __init__(self, job_id, pid):
+        super().__init__(f'任务由工作进程 {pid} 执行，无法在当前进程中取消')
+        self.job_id = job_id
+        self.pid = pid
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+class OutputBuffer:
+    """
+    有界的命令输出缓冲区
+
+    输出按行保存，每行带有从0开始递增的绝对偏移量；超过行数上限时丢弃最早的行，
+    读取方根据偏移量判断是否有行被丢弃。超长的行会被截断。
+
+    Args:
+        max_lines: 保留的最大行数
+        max_line_length: 单行的最大字符数
+    """
+
+    def __init__(self, max_lines=1000, max_line_length=1024):
+        self.max_line_length = max_line_length
+        self.lines = deque(maxlen=max_lines)
+        self.next_offset = 0
+        self._partial = {'stdout': '', 'stderr': ''}
+        self._lock = threading.Lock()
+
+    def write(self, stream, text):
+        """
+        写入一段输出，按换行符切分成行
+
+        Args:
+            stream: 流名称（stdout或stderr）
+            text: 输出文本（可以不以换行结尾）
+        """
+        with self._lock:
+            *complete, partial = (self._partial[stream] + text).split('\n')
+            for line in complete:
+                self._append(stream, line)
+            # 长时间没有换行的输出（如进度条）按最大行长切分，避免未完成的行无限增长
+            while len(partial) > self.max_line_length:
+                self._append(stream, partial[:self.max_line_length])
+                partial = partial[self.max_line_length:]
+            self._partial[stream] = partial
+
+    def flush(self):
+        """将尚未以换行结尾的输出作为最后一行写入"""
+        with self._lock:
+            for stream, partial in self._partial.items():
+                if partial:
+                    self._append(stream, partial)
+                self._partial[stream] = ''
+
+    def _append(self, stream, line):
+        # 带有回车的行只保留最后一段（终端中显示的内容）
+        line = line.rstrip('\r').rsplit('\r', 1)[-1]
+        self.lines.append((self.next_offset, stream, line[:self.max_line_length]))
+        self.next_offset += 1
+
+    def snapshot(self):
+        """
+        Returns:
+            tuple: (行列表[(偏移量, 流名称, 内容)], 下一行的偏移量)
+        """
+        with self._lock:
+            return list(self.lines), self.next_offset
+
+
+def read_lines(lines, next_offset, offset=0, limit=500):
+    """
+    从缓冲区快照中读取指定偏移量之后的行
+
+    Args:
+        lines: 行列表[(偏移量, 流名称, 内容)]
+        next_offset: 下一行的偏移量
+        offset: 客户端已读取到的偏移量
+        limit: 单次返回的最大行数
+
+    Returns:
+        dict: 行内容、下一次读取的偏移量和被丢弃的行数
+    """
+    offset = max(0, min(offset, next_offset))
+    first = lines[0][0] if lines else next_offset
+    selected = [line for line in lines if line[0] >= offset][:limit]
+    return {
+        'lines': [{'stream': stream, 'text': text} for _, stream, text in selected],
+        'offset': selected[-1][0] + 1 if selected else max(offset, first),
+        'dropped': max(0, first - offset),
+        'more': bool(selected) and selected[-1][0] + 1 < next_offset
+    }
+
+
+class Job:
+    """
+    后台命令任务
+
+    Args:
+        name: 任务名称（如软件名称），用于查找最近一次任务
+        server_id: 服务器ID
+        buffer: 输出缓冲区
+    """
+
+    def __init__(self, name, server_id, buffer):
+        self.id = uuid.uuid4().hex
+        self.pid = os.getpid()
+        self.name = name
+        self.server_id = server_id
+        self.buffer = buffer
+        self.status = 'running'
+        self.returncode = None
+        self.message = ''
+        self.started_at = time.time()
+        self.finished_at = None
+        self.cancel = threading.Event()
+
+    @property
+    def finished(self):
+        return self.status != 'running'
+
+    def to_dict(self):
+        """
+        Returns:
+            dict: 任务状态和缓冲区内容（可序列化为JSON）
+        """
+        lines, next_offset = self.buffer.snapshot()
+        return {
+            'id': self.id,
+            'pid': self.pid,
+            'name': self.name,
+            'server_id': self.server_id,
+            'status': self.status,
+            'returncode': self.returncode,
+            'message': self.message,
+            'started_at': self.started_at,
+            'finished_at': self.finished_at,
+            'lines': lines,
+            'next_offset': next_offset
+        }
+
+
+class JobRegistry:
+    """
+    后台命令任务注册表
+
+    Args:
+        jobs_dir: 保存任务状态文件的目录
+        max_lines: 每个任务保留的输出行数
+        max_line_length: 单行的最大字符数
+        ttl: 已结束的任务保留时长（秒）
+        persist_interval: 运行中的任务写入状态文件的最小间隔（秒），间隔内的输出由延迟写入在间隔结束时写入
+    """
+
+    def __init__(self, jobs_dir, max_lines=1000, max_line_length=1024, ttl=3600, persist_interval=0.5):
+        self.jobs_dir = jobs_dir
+        self.max_lines = max_lines
+        self.max_line_length = max_line_length
+        self.ttl = ttl
+        self.persist_interval = persist_interval
+        self._jobs = {}
+        self._persisted = {}
+        self._timers = {}
+        self._lock = threading.Lock()
+        self._write_lock = threading.Lock()
+        os.makedirs(jobs_dir, exist_ok=True)
+
+    def submit(self, name, server, command, timeout=1800):
+        """
+        在后台线程中执行命令
+
+        Args:
+            name: 任务名称
+            server: 服务器对象（应为脱离数据库会话的快照）
+            command: 要执行的命令
+            timeout: 超时时间（秒）
+
+        Returns:
+            Job: 新建的任务
+        """
+        self.cleanup()
+        job = Job(name, server.id, OutputBuffer(self.max_lines, self.max_line_length))
+        with self._lock:
+            self._jobs[job.id] = job
+        self._persist(job, force=True)
+
+        def output(stream, text):
+            job.buffer.write(stream, text)
+            self._persist(job)
+
+        def run():
+            result = execute_remote_command(server, command, timeout=timeout, cancel=job.cancel, on_output=output)
+            job.buffer.flush()
+            job.returncode = result['returncode']
+            if job.cancel.is_set():
+                job.status = 'cancelled'
+            else:
+                job.status = 'success' if result['returncode'] == 0 else 'failed'
+            # 流式执行时输出已写入缓冲区，这里的stderr只包含执行器本身的错误
+            job.message = result['stderr']
+            job.finished_at = time.time()
+            self._persist(job, force=True)
+
+        threading.Thread(target=run, name=f'job-{job.id[:8]}', daemon=True).start()
+        return job
+
+    def _path(self, job_id):
+        return os.path.join(self.jobs_dir, f'{job_id}.json')
+
+    def _persist(self, job, force=False):
+        """
+        将任务状态写入文件
+
+        运行中的任务按persist_interval限流：间隔内的写入被推迟到间隔结束时由定时器执行，
+        命令输出一行后长时间没有新输出时，其他工作进程也能在persist_interval内读到这一行。
+        """
+        now = time.monotonic()
+        with self._lock:
+            wait = self._persisted.get(job.id, 0) + self.persist_interval - now
+            if not force and wait > 0:
+                if job.id not in self._timers:
+                    timer = threading.Timer(wait, self._persist, args=(job, True))
+                    timer.daemon = True
+                    self._timers[job.id] = timer
+                    timer.start()
+                return
+            timer = self._timers.pop(job.id, None)
+            if timer is not None:
+                timer.cancel()
+            self._persisted[job.id] = now
+
+        # 快照和替换文件在同一把锁内完成，较早的快照不会覆盖较新的状态
+        path = self._path(job.id)
+        with self._write_lock:
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.jobs_dir, prefix='.job-')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(job.to_dict(), f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f'保存任务状态失败: {e}')
+
+    def _load(self, job_id):
+        """读取任务状态，优先使用本进程内的任务；执行进程已退出的运行中任务标记为失败"""
+        if not JOB_ID_PATTERN.match(job_id or ''):
+            return None
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is not None:
+            return job.to_dict()
+        try:
+            path = self._path(job_id)
+            with open(path) as f:
+                state = json.load(f)
+        except (OSError, ValueError):
+            return None
+
+        pid = state.get('pid')
+        if state['status'] == 'running' and pid and pid != os.getpid() and not _pid_alive(pid):
+            state['status'] = 'failed'
+            state['message'] = '执行任务的工作进程已退出'
+            state['finished_at'] = os.path.getmtime(path)
+            try:
+                fd, tmp_path = tempfile.mkstemp(dir=self.jobs_dir, prefix='.job-')
+                with os.fdopen(fd, 'w') as f:
+                    json.dump(state, f, ensure_ascii=False)
+                os.replace(tmp_path, path)
+            except OSError as e:
+                print(f'保存任务状态失败: {e}')
+        return state
+
+    def read(self, job_id, offset=0, limit=500):
+        """
+        读取任务状态和指定偏移量之后的输出
+
+        Args:
+            job_id: 任务ID
+            offset: 客户端已读取到的行偏移量
+            limit: 单次返回的最大行数
+
+        Returns:
+            dict: 任务状态和增量输出，任务不存在时返回None
+        """
+        state = self._load(job_id)
+        if state is None:
+            return None
+        output = read_lines([tuple(line) for line in state['lines']], state['next_offset'], offset, limit)
+        return {
+            'job_id': state['id'],
+            'name': state['name'],
+            'server_id': state['server_id'],
+            'status': state['status'],
+            'returncode': state['returncode'],
+            'message': state['message'],
+            'started_at': state['started_at'],
+            'finished_at': state['finished_at'],
+            **output
+        }
+
+    def latest(self, name):
+        """
+        查找指定名称最近一次任务的ID
+
+        Args:
+            name: 任务名称
+
+        Returns:
+            str: 任务ID，不存在时返回None
+        """
+        latest_id, latest_started = None, 0
+        try:
+            filenames = os.listdir(self.jobs_dir)
+        except OSError:
+            filenames = []
+        for filename in filenames:
+            job_id, ext = os.path.splitext(filename)
+            if ext != '.json' or not JOB_ID_PATTERN.match(job_id):
+                continue
+            state = self._load(job_id)
+            if state and state['name'] == name and state['started_at'] > latest_started:
+                latest_id, latest_started = job_id, state['started_at']
+        return latest_id
+
+    def cancel(self, job_id):
+        """
+        取消本进程内运行中的任务
+
+        Returns:
+            bool: 是否找到运行中的任务
+
+        Raises:
+            JobNotOwned: 任务正在其他工作进程中运行
+        """
+        with self._lock:
+            job = self._jobs.get(job_id)
+        if job is None:
+            state = self._load(job_id)
+            if state is not None and state['status'] == 'running' and state.get('pid') != os.getpid():
+                raise JobNotOwned(job_id, state.get('pid'))
+            return False
+        if job.finished:
+            return False
+        job.cancel.set()
+        return True
+
+    def cleanup(self):
+        """删除结束超过ttl的任务及其状态文件"""
+        expire = time.time() - self.ttl
+        with self._lock:
+            for job_id, job in list(self._jobs.items()):
+                if job.finished and job.finished_at < expire:
+                    del self._jobs[job_id]
+                    self._persisted.pop(job_id, None)
+            running = {job_id for job_id, job in self._jobs.items() if not job.finished}
+        try:
+            filenames = os.listdir(self.jobs_dir)
+        except OSError:
+            return
+        for filename in filenames:
+            job_id = os.path.splitext(filename)[0]
+            if job_id in running:
+                continue
+            path = os.path.join(self.jobs_dir, filename)
+            try:
+                if os.path.getmtime(path) < expire:
+                    os.remove(path)
+            except OSError:
+                pass
+
+
+_registry = None
+_registry_lock = threading.Lock()
+
+
+def get_job_registry():
+    """
+    获取当前进程的任务注册表（首次调用时按应用配置创建）
+
+    Returns:
+        JobRegistry: 任务注册表
+    """
+    global _registry
+    if _registry is not None:
+        return _registry
+
+    from flask import current_app, has_app_context
+    config = current_app.config if has_app_context() else {}
+
+    with _registry_lock:
+        if _registry is None:
+            _registry = JobRegistry(
+                jobs_dir=config.get('JOBS_DIR') or os.path.join(tempfile.gettempdir(), 'tiny_panel_jobs'),
+                max_lines=config.get('JOBS_MAX_LINES', 1000),
+                max_line_length=config.get('JOBS_MAX_LINE_LENGTH', 1024),
+                ttl=config.get('JOBS_TTL', 3600)
+            )
+    return _registry
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+运行指标模块
+
+本模块统计每个蓝图端点的请求耗时分布、响应状态码和正在处理的请求数，
+汇总所有工作进程的数据后以Prometheus文本格式通过 /metrics 提供。
+"""
+
+from flask import Blueprint
+
+# 创建运行指标蓝图
+metrics = Blueprint('metrics', __name__)
+
+# 导入路由
+from app.metrics import routes
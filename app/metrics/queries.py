@@ -0,0 +1,251 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+SQL查询统计
+
+在SQLAlchemy引擎事件上统计每个请求执行的SQL语句数量和耗时。语句按"形状"（合并空白和
+IN列表后的SQL文本，参数本身已经是占位符）分组，同一形状在一个请求中执行达到阈值次数时
+视为N+1查询：通常是在循环中逐条查询，应改为一次批量查询或联表查询。
+
+统计结果通过响应头X-Query-Count、X-Query-Time和Server-Timing返回（可在浏览器开发者工具中查看），
+并计入 /metrics 的运行指标。重复语句的SQL文本会暴露表结构，只在调试模式或管理员请求的
+响应头X-Query-Repeated中列出。配置了查询预算时，超出预算的请求会输出警告；
+测试模式下直接抛出QueryBudgetExceeded，使测试失败。后台线程中执行的查询不计入统计。
+"""
+
+import re
+import threading
+import time
+from contextlib import contextmanager
+from functools import lru_cache
+
+from flask import g, request
+
+from app.utils import is_admin
+
+
+# 同一形状的语句在一个请求中执行达到该次数时视为N+1查询
+DEFAULT_REPEAT_THRESHOLD = 5
+
+# 响应头中列出的重复语句数和每条语句的最大长度
+REPEATED_HEADER_LIMIT = 3
+REPEATED_HEADER_LENGTH = 200
+
+# 各数据库驱动的参数占位符（?、%s、%(name)s、:name）
+_PLACEHOLDER = r'(?:\?|%s|%\(\w+\)s|:\w+)'
+_IN_LIST_PATTERN = re.compile(r'\(\s*' + _PLACEHOLDER + r'(?:\s*,\s*' + _PLACEHOLDER + r')+\s*\)')
+
+# SELECT语句的列清单（显示时省略，突出FROM和WHERE部分）
+_SELECT_LIST_PATTERN = re.compile(r'^SELECT .+? FROM ')
+
+# 当前线程正在统计的QueryStats列表（请求统计和assert_max_queries可以嵌套）
+_local = threading.local()
+_listeners_installed = False
+_install_lock = threading.Lock()
+
+
+class QueryBudgetExceeded(AssertionError):
+    """请求或代码块执行的SQL语句数超出预算"""
+
+
+@lru_cache(maxsize=1024)
+def statement_shape(statement):
+    """
+    获取SQL语句的形状
+
+    Args:
+        statement: SQL语句
+
+    Returns:
+        str: 合并空白、将IN列表替换为单个占位符后的语句
+    """
+    return _IN_LIST_PATTERN.sub('(?)', ' '.join(statement.split()))
+
+
+def abbreviate(shape, length=REPEATED_HEADER_LENGTH):
+    """省略SELECT的列清单并截断，用于响应头和日志"""
+    return _SELECT_LIST_PATTERN.sub('SELECT ... FROM ', shape, count=1)[:length]
+
+
+class QueryStats:
+    """一段时间内（通常是一个请求）执行的SQL语句统计"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+        # {语句形状: [执行次数, 总耗时]}
+        self.shapes = {}
+
+    def record(self, statement, elapsed):
+        self.count += 1
+        self.duration += elapsed
+        entry = self.shapes.get(statement)
+        if entry is None:
+            entry = self.shapes[statement] = [0, 0.0]
+        entry[0] += 1
+        entry[1] += elapsed
+
+    def repeated(self, threshold=DEFAULT_REPEAT_THRESHOLD):
+        """
+        获取重复执行的语句（可能的N+1查询）
+
+        Args:
+            threshold: 同一形状的执行次数阈值
+
+        Returns:
+            list: [(语句形状, 执行次数, 总耗时)]，按执行次数倒序
+        """
+        merged = {}
+        for statement, (count, elapsed) in self.shapes.items():
+            shape = statement_shape(statement)
+            entry = merged.setdefault(shape, [0, 0.0])
+            entry[0] += count
+            entry[1] += elapsed
+        return sorted(
+            ((shape, count, elapsed) for shape, (count, elapsed) in merged.items() if count >= threshold),
+            key=lambda item: item[1], reverse=True
+        )
+
+
+def _collectors():
+    collectors = getattr(_local, 'collectors', None)
+    if collectors is None:
+        collectors = _local.collectors = []
+    return collectors
+
+
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None and getattr(_local, 'collectors', None):
+        context._query_started = time.perf_counter()
+
+
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    started = getattr(context, '_query_started', None)
+    if started is None:
+        return
+    elapsed = time.perf_counter() - started
+    for stats in getattr(_local, 'collectors', ()):
+        stats.record(statement, elapsed)
+
+
+def install_listeners():
+    """在所有SQLAlchemy引擎上注册语句执行事件（只注册一次）"""
+    global _listeners_installed
+    from sqlalchemy import event
+    from sqlalchemy.engine import Engine
+
+    with _install_lock:
+        if _listeners_installed:
+            return
+        event.listen(Engine, 'before_cursor_execute', _before_cursor_execute)
+        event.listen(Engine, 'after_cursor_execute', _after_cursor_execute)
+        _listeners_installed = True
+
+
+@contextmanager
+def track_queries():
+    """
+    统计代码块中当前线程执行的SQL语句
+
+    用法：
+        with track_queries() as stats:
+            ...
+        print(stats.count, stats.repeated())
+    """
+    install_listeners()
+    stats = QueryStats()
+    collectors = _collectors()
+    collectors.append(stats)
+    try:
+        yield stats
+    finally:
+        collectors.remove(stats)
+
+
+@contextmanager
+def assert_max_queries(limit):
+    """
+    断言代码块执行的SQL语句数不超过limit，供测试使用
+
+    Args:
+        limit: 允许的最大语句数
+
+    Raises:
+        QueryBudgetExceeded: 超出预算时抛出，消息中包含重复执行的语句
+    """
+    with track_queries() as stats:
+        yield stats
+    if stats.count > limit:
+        raise QueryBudgetExceeded(budget_message(stats, limit))
+
+
+def budget_message(stats, limit, endpoint=None):
+    """生成超出查询预算的说明"""
+    target = f'端点 {endpoint} ' if endpoint else ''
+    message = f'{target}执行了 {stats.count} 条SQL语句，超出预算 {limit}'
+    for shape, count, _ in stats.repeated(2)[:REPEATED_HEADER_LIMIT]:
+        message += f'\n  {count}次: {shape}'
+    return message
+
+
+def _header_value(text):
+    # 响应头只能包含latin-1字符
+    return text.encode('ascii', 'replace').decode('ascii')
+
+
+def init_query_accounting(app):
+    """
+    为应用注册SQL查询统计钩子
+
+    Args:
+        app: Flask应用实例
+    """
+    if not app.config.get('SQL_QUERY_ACCOUNTING'):
+        return
+
+    install_listeners()
+
+    @app.before_request
+    def start_query_stats():
+        g.query_stats = QueryStats()
+        _collectors().append(g.query_stats)
+
+    @app.after_request
+    def report_query_stats(response):
+        stats = g.get('query_stats')
+        if stats is None:
+            return response
+
+        repeated = stats.repeated(app.config.get('SQL_QUERY_REPEAT_THRESHOLD', DEFAULT_REPEAT_THRESHOLD))
+        g.query_repeated = len(repeated)
+        response.headers['X-Query-Count'] = str(stats.count)
+        response.headers['X-Query-Time'] = f'{stats.duration * 1000:.2f}'
+        response.headers.add('Server-Timing', f'db;dur={stats.duration * 1000:.2f};desc="{stats.count} queries"')
+        if repeated:
+            if app.debug or is_admin():
+                response.headers['X-Query-Repeated'] = _header_value(' | '.join(
+                    f'{count}x {abbreviate(shape)}' for shape, count, _ in repeated[:REPEATED_HEADER_LIMIT]
+                ))
+            if app.debug:
+                print(f'[SQL] {request.endpoint} 可能存在N+1查询: ' + '; '.join(
+                    f'{count}次 {abbreviate(shape)}' for shape, count, _ in repeated
+                ))
+
+        # 预算在每个请求中读取，测试可以在创建应用后修改配置
+        budgets = app.config.get('SQL_QUERY_BUDGETS') or {}
+        budget = budgets.get(request.endpoint, app.config.get('SQL_QUERY_BUDGET'))
+        if budget is not None and stats.count > budget:
+            message = budget_message(stats, budget, request.endpoint)
+            if app.testing:
+                raise QueryBudgetExceeded(message)
+            print(f'[SQL] {message}')
+        return response
+
+    @app.teardown_request
+    def stop_query_stats(exc):
+        stats = g.get('query_stats')
+        collectors = _collectors()
+        if stats is not None and stats in collectors:
+            collectors.remove(stats)
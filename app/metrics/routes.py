@@ -0,0 +1,43 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+运行指标模块路由
+"""
+
+import hmac
+
+from flask import Response, current_app, request
+
+from app.metrics import metrics
+from app.metrics.utils import collect_metrics, render_prometheus
+from app.utils import is_admin
+
+
+def _authorized():
+    """配置了METRICS_TOKEN时允许使用Bearer令牌访问（供Prometheus抓取），否则只允许管理员访问"""
+    token = current_app.config.get('METRICS_TOKEN')
+    if token:
+        auth = request.headers.get('Authorization', '')
+        if hmac.compare_digest(auth.encode(), f'Bearer {token}'.encode()):
+            return True
+    return is_admin()
+
+
+@metrics.route('/metrics')
+def prometheus_metrics():
+    """
+    以Prometheus文本格式输出所有工作进程合并后的运行指标
+    """
+    if not _authorized():
+        return Response('未授权\n', status=401, mimetype='text/plain')
+
+    recorder = current_app.extensions.get('request_metrics')
+    if recorder is None:
+        return Response('运行指标未启用\n', status=404, mimetype='text/plain')
+
+    # 先写入本进程的最新数据，再合并所有进程的文件
+    recorder.flush()
+    body = render_prometheus(collect_metrics(recorder.metrics_dir))
+    return Response(body, mimetype='text/plain; version=0.0.4; charset=utf-8')
@@ -0,0 +1,531 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+运行指标工具函数
+
+每个工作进程在内存中统计请求指标，由后台线程定期写入指标目录下以进程ID命名的JSON文件，
+处理请求时不进行任何文件操作。/metrics 读取所有进程的文件并合并：计数器和直方图累加，
+仪表（如正在处理的请求数）只统计仍在运行的进程。已退出进程的计数器合并到归档文件后
+删除其文件，工作进程被回收重启后计数也不会倒退。
+
+启用SQL查询统计时（见app.metrics.queries），同时按端点统计每个请求的SQL语句数、查询耗时
+和检测到N+1查询的请求数。除请求指标外，各进程还会写入命令执行器、SSH连接池、监控写入器、
+采集器和探测器的统计信息。
+"""
+
+import atexit
+import fcntl
+import json
+import os
+import re
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+
+from flask import g, request
+
+from app.executor import LatencyHistogram
+
+
+# 请求耗时直方图的桶上限（秒），最后一个桶为+Inf
+REQUEST_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+
+# 每个请求SQL语句数直方图的桶上限
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+
+# 指标名称前缀
+PREFIX = 'tiny_panel_'
+
+# 没有匹配到路由的请求（如404）统一使用的端点名称，避免标签取值无限增长
+UNMATCHED_ENDPOINT = 'unmatched'
+
+# 进程指标文件名和归档文件名
+WORKER_FILE_PATTERN = re.compile(r'^worker-(\d+)\.json$')
+ARCHIVE_FILE = 'archive.json'
+LOCK_FILE = '.lock'
+
+# 指标类型和说明
+METRIC_TYPES = {
+    'http_request_duration_seconds': ('histogram', '请求处理耗时（秒），按端点和请求方法统计'),
+    'http_responses_total': ('counter', '响应数量，按端点、请求方法和状态码统计'),
+    'http_requests_in_flight': ('gauge', '正在处理的请求数'),
+    'workers': ('gauge', '正在上报指标的进程数'),
+    'db_queries_per_request': ('histogram', '每个请求执行的SQL语句数'),
+    'db_query_seconds_total': ('counter', '请求中执行SQL语句的总耗时（秒）'),
+    'db_repeated_query_requests_total': ('counter', '检测到N+1查询（同一语句重复执行）的请求数'),
+    'executor_commands_total': ('counter', '命令执行器执行的命令数，按执行方式和结果统计'),
+    'executor_command_duration_seconds': ('histogram', '命令执行耗时（秒）'),
+    'executor_inflight': ('gauge', '正在执行的命令数'),
+    'executor_waiting': ('gauge', '等待并发槽位的命令数'),
+    'ssh_connections': ('gauge', 'SSH连接池中的连接数'),
+    'ssh_active_channels': ('gauge', '正在使用的SSH命令通道数'),
+    'ssh_handshakes_total': ('counter', 'SSH握手次数'),
+    'ssh_reused_total': ('counter', '复用已有SSH连接的次数'),
+    'ssh_evicted_total': ('counter', '因空闲或失效关闭的SSH连接数'),
+    'ssh_failures_total': ('counter', 'SSH连接失败次数'),
+    'writer_queue_depth': ('gauge', '监控写入器队列中等待写入的样本数'),
+    'writer_samples_written_total': ('counter', '写入数据库的监控样本数'),
+    'writer_samples_dropped_total': ('counter', '队列已满时丢弃的监控样本数'),
+    'writer_samples_failed_total': ('counter', '写入失败的监控样本数'),
+    'writer_flushes_total': ('counter', '批量写入次数'),
+    'writer_last_flush_seconds': ('gauge', '最近一次批量写入的耗时（秒）'),
+    'collector_last_duration_seconds': ('gauge', '最近一轮监控采集的耗时（秒）'),
+    'collector_last_cycle_servers': ('gauge', '最近一轮监控采集的服务器数，按结果统计'),
+    'prober_last_duration_seconds': ('gauge', '最近一轮可达性探测的耗时（秒）'),
+}
+
+
+class RequestMetrics:
+    """
+    当前进程的请求指标
+
+    fork出的子进程会清空从父进程继承的数据，并启动自己的写入线程。
+
+    Args:
+        app: Flask应用实例
+        metrics_dir: 保存各进程指标文件的目录
+        flush_interval: 写入指标文件的周期（秒）
+    """
+
+    def __init__(self, app, metrics_dir, flush_interval=2):
+        self.app = app
+        self.metrics_dir = metrics_dir
+        self.flush_interval = flush_interval
+        os.makedirs(metrics_dir, exist_ok=True)
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+        self._thread = None
+        # {(端点, 方法): LatencyHistogram}
+        self.durations = {}
+        # {(端点, 方法, 状态码): 数量}
+        self.responses = {}
+        # {端点: 正在处理的请求数}
+        self.inflight = {}
+        # {端点: LatencyHistogram}，统计每个请求的SQL语句数
+        self.query_counts = {}
+        # {端点: SQL总耗时}
+        self.query_seconds = {}
+        # {端点: 检测到N+1查询的请求数}
+        self.repeated_queries = {}
+
+    @property
+    def path(self):
+        return os.path.join(self.metrics_dir, f'worker-{os.getpid()}.json')
+
+    def _ensure_started(self):
+        """在当前进程中启动写入线程（首次记录请求时调用）"""
+        if self._pid != os.getpid():
+            self._reset()
+        if self._thread is not None:
+            return
+        with self._lock:
+            if self._thread is not None:
+                return
+            self._thread = threading.Thread(target=self._run, name='metrics-flusher', daemon=True)
+            self._thread.start()
+        # 进程正常退出前写入最后的数据，之后由 /metrics 归档
+        atexit.register(self.flush)
+
+    def start_request(self, endpoint):
+        """
+        记录开始处理请求
+
+        Args:
+            endpoint: 端点名称
+        """
+        self._ensure_started()
+        with self._lock:
+            self.inflight[endpoint] = self.inflight.get(endpoint, 0) + 1
+
+    def finish_request(self, endpoint, method, status, elapsed, query_stats=None, repeated_queries=0):
+        """
+        记录请求处理完成
+
+        Args:
+            endpoint: 端点名称
+            method: 请求方法
+            status: 响应状态码
+            elapsed: 处理耗时（秒）
+            query_stats: 请求的SQL查询统计（QueryStats），未启用查询统计时为None
+            repeated_queries: 检测到的重复语句数
+        """
+        with self._lock:
+            self.inflight[endpoint] = max(0, self.inflight.get(endpoint, 0) - 1)
+            key = (endpoint, method, status)
+            self.responses[key] = self.responses.get(key, 0) + 1
+            histogram = self.durations.get((endpoint, method))
+            if histogram is None:
+                histogram = self.durations[(endpoint, method)] = LatencyHistogram(REQUEST_BUCKETS)
+            histogram.observe(elapsed)
+            if query_stats is not None:
+                histogram = self.query_counts.get(endpoint)
+                if histogram is None:
+                    histogram = self.query_counts[endpoint] = LatencyHistogram(QUERY_COUNT_BUCKETS)
+                histogram.observe(query_stats.count)
+                self.query_seconds[endpoint] = self.query_seconds.get(endpoint, 0.0) + query_stats.duration
+                if repeated_queries:
+                    self.repeated_queries[endpoint] = self.repeated_queries.get(endpoint, 0) + 1
+
+    def snapshot(self):
+        """
+        获取当前进程的全部指标
+
+        Returns:
+            dict: 计数器、直方图和仪表列表，每项为[名称, 标签, 值...]
+        """
+        with self._lock:
+            counters = [
+                ['http_responses_total', {'endpoint': endpoint, 'method': method, 'status': str(status)}, count]
+                for (endpoint, method, status), count in self.responses.items()
+            ]
+            counters += [
+                ['db_query_seconds_total', {'endpoint': endpoint}, seconds]
+                for endpoint, seconds in self.query_seconds.items()
+            ]
+            counters += [
+                ['db_repeated_query_requests_total', {'endpoint': endpoint}, count]
+                for endpoint, count in self.repeated_queries.items()
+            ]
+            histograms = [
+                ['http_request_duration_seconds', {'endpoint': endpoint, 'method': method}, histogram.snapshot()]
+                for (endpoint, method), histogram in self.durations.items()
+            ]
+            histograms += [
+                ['db_queries_per_request', {'endpoint': endpoint}, histogram.snapshot()]
+                for endpoint, histogram in self.query_counts.items()
+            ]
+            gauges = [
+                ['http_requests_in_flight', {'endpoint': endpoint}, count]
+                for endpoint, count in self.inflight.items() if count
+            ]
+
+        with self.app.app_context():
+            component_metrics(self.app, counters, histograms, gauges)
+
+        return {
+            'pid': os.getpid(),
+            'updated': time.time(),
+            'counters': counters,
+            'histograms': histograms,
+            'gauges': gauges
+        }
+
+    def flush(self):
+        """将当前进程的指标写入文件"""
+        try:
+            snapshot = self.snapshot()
+            fd, tmp_path = tempfile.mkstemp(dir=self.metrics_dir, prefix='.worker-')
+            with os.fdopen(fd, 'w') as f:
+                json.dump(snapshot, f, ensure_ascii=False)
+            os.replace(tmp_path, self.path)
+        except Exception as e:
+            print(f'保存运行指标失败: {e}')
+
+    def _run(self):
+        while True:
+            time.sleep(self.flush_interval)
+            if self._pid != os.getpid():
+                return
+            self.flush()
+
+
+def component_metrics(app, counters, histograms, gauges):
+    """
+    追加命令执行器、SSH连接池、监控写入器、采集器和探测器的统计信息
+
+    Args:
+        app: Flask应用实例
+        counters: 计数器列表
+        histograms: 直方图列表
+        gauges: 仪表列表
+    """
+    from app.executor import get_executor
+    from app.ssh_pool import get_ssh_pool
+
+    executor = get_executor().stats()
+    for name, count in executor['commands'].items():
+        mode, outcome = name.split('.', 1)
+        counters.append(['executor_commands_total', {'mode': mode, 'outcome': outcome}, count])
+    for mode, latency in executor['latency'].items():
+        histograms.append(['executor_command_duration_seconds', {'mode': mode}, latency])
+    gauges.append(['executor_inflight', {}, executor['inflight']])
+    gauges.append(['executor_waiting', {}, executor['waiting']])
+
+    ssh = get_ssh_pool().stats()
+    gauges.append(['ssh_connections', {}, ssh['connections']])
+    gauges.append(['ssh_active_channels', {}, ssh['active_channels']])
+    for name in ('handshakes', 'reused', 'evicted', 'failures'):
+        counters.append([f'ssh_{name}_total', {}, ssh[name]])
+
+    writer = app.extensions.get('monitoring_writer')
+    if writer is not None:
+        stats = writer.stats()
+        gauges.append(['writer_queue_depth', {}, stats['queue_depth']])
+        gauges.append(['writer_last_flush_seconds', {}, stats['last_flush_latency_ms'] / 1000])
+        for name in ('written', 'dropped', 'failed'):
+            counters.append([f'writer_samples_{name}_total', {}, stats[name]])
+        counters.append(['writer_flushes_total', {}, stats['flushes']])
+
+    collector = app.extensions.get('monitoring_collector')
+    if collector is not None and collector.running:
+        gauges.append(['collector_last_duration_seconds', {}, collector.last_duration])
+        for result, count in collector.last_cycle.items():
+            gauges.append(['collector_last_cycle_servers', {'result': result}, count])
+        if collector.prober is not None and collector.prober.running:
+            gauges.append(['prober_last_duration_seconds', {}, collector.prober.last_duration])
+
+
+def _key(name, labels):
+    return name, tuple(sorted(labels.items()))
+
+
+def _merge(merged, snapshot, include_gauges):
+    """将一个进程（或归档）的指标合并到merged中"""
+    for name, labels, value in snapshot.get('counters', []):
+        key = _key(name, labels)
+        merged['counters'][key] = merged['counters'].get(key, 0) + value
+    for name, labels, value in snapshot.get('histograms', []):
+        key = _key(name, labels)
+        target = merged['histograms'].setdefault(key, {'buckets': {}, 'sum': 0.0, 'count': 0})
+        for bound, count in value['buckets']:
+            target['buckets'][bound] = target['buckets'].get(bound, 0) + count
+        target['sum'] += value['sum']
+        target['count'] += value['count']
+    if include_gauges:
+        for name, labels, value in snapshot.get('gauges', []):
+            key = _key(name, labels)
+            merged['gauges'][key] = merged['gauges'].get(key, 0) + value
+
+
+def _new_merged():
+    return {'counters': {}, 'histograms': {}, 'gauges': {}}
+
+
+def _bucket_order(bound):
+    return float('inf') if bound == '+Inf' else float(bound)
+
+
+def _to_snapshot(merged):
+    """将合并结果转换回可保存的快照格式（不含仪表）"""
+    return {
+        'counters': [[name, dict(labels), value] for (name, labels), value in merged['counters'].items()],
+        'histograms': [
+            [name, dict(labels), {
+                'buckets': sorted(value['buckets'].items(), key=lambda item: _bucket_order(item[0])),
+                'sum': value['sum'],
+                'count': value['count']
+            }]
+            for (name, labels), value in merged['histograms'].items()
+        ]
+    }
+
+
+def _load(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+@contextmanager
+def _dir_lock(metrics_dir, operation):
+    """对指标目录加文件锁（归档时加排他锁，读取时加共享锁）"""
+    fd = os.open(os.path.join(metrics_dir, LOCK_FILE), os.O_RDWR | os.O_CREAT, 0o600)
+    try:
+        fcntl.flock(fd, operation)
+        yield
+    finally:
+        os.close(fd)
+
+
+def _worker_files(metrics_dir):
+    try:
+        filenames = os.listdir(metrics_dir)
+    except OSError:
+        return []
+    files = []
+    for filename in filenames:
+        match = WORKER_FILE_PATTERN.match(filename)
+        if match:
+            files.append((int(match.group(1)), os.path.join(metrics_dir, filename)))
+    return files
+
+
+def archive_dead_workers(metrics_dir):
+    """
+    将已退出进程的计数器和直方图合并到归档文件，并删除其指标文件
+
+    Args:
+        metrics_dir: 指标目录
+
+    Returns:
+        int: 归档的进程数
+    """
+    dead = [(pid, path) for pid, path in _worker_files(metrics_dir) if not _pid_alive(pid)]
+    if not dead:
+        return 0
+
+    archive_path = os.path.join(metrics_dir, ARCHIVE_FILE)
+    with _dir_lock(metrics_dir, fcntl.LOCK_EX):
+        merged = _new_merged()
+        _merge(merged, _load(archive_path) or {}, include_gauges=False)
+        archived = []
+        for _, path in dead:
+            snapshot = _load(path)
+            if snapshot is not None:
+                _merge(merged, snapshot, include_gauges=False)
+                archived.append(path)
+
+        if not archived:
+            return 0
+        fd, tmp_path = tempfile.mkstemp(dir=metrics_dir, prefix='.archive-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(_to_snapshot(merged), f, ensure_ascii=False)
+        os.replace(tmp_path, archive_path)
+        for path in archived:
+            os.remove(path)
+    return len(archived)
+
+
+def collect_metrics(metrics_dir):
+    """
+    合并所有进程的指标
+
+    Args:
+        metrics_dir: 指标目录
+
+    Returns:
+        dict: 合并后的计数器、直方图和仪表
+    """
+    archive_dead_workers(metrics_dir)
+
+    merged = _new_merged()
+    workers = 0
+    with _dir_lock(metrics_dir, fcntl.LOCK_SH):
+        _merge(merged, _load(os.path.join(metrics_dir, ARCHIVE_FILE)) or {}, include_gauges=False)
+        for pid, path in _worker_files(metrics_dir):
+            snapshot = _load(path)
+            if snapshot is None:
+                continue
+            alive = _pid_alive(pid)
+            _merge(merged, snapshot, include_gauges=alive)
+            workers += alive
+    merged['gauges'][_key('workers', {})] = workers
+    return merged
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(labels, extra=()):
+    pairs = list(labels) + list(extra)
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{name}="{_escape(value)}"' for name, value in pairs) + '}'
+
+
+def _format_value(value):
+    if isinstance(value, float):
+        return repr(round(value, 6))
+    return str(value)
+
+
+def _format_bound(bound):
+    return '+Inf' if bound == '+Inf' else repr(float(bound))
+
+
+def render_prometheus(merged):
+    """
+    以Prometheus文本格式输出指标
+
+    Args:
+        merged: collect_metrics返回的合并结果
+
+    Returns:
+        str: 指标文本
+    """
+    series = {}
+    for kind in ('counters', 'histograms', 'gauges'):
+        for (name, labels), value in merged[kind].items():
+            series.setdefault(name, []).append((labels, value))
+
+    lines = []
+    for name in sorted(series):
+        metric = PREFIX + name
+        metric_type, help_text = METRIC_TYPES.get(name, ('untyped', ''))
+        lines.append(f'# HELP {metric} {help_text}')
+        lines.append(f'# TYPE {metric} {metric_type}')
+        for labels, value in sorted(series[name], key=lambda item: item[0]):
+            if metric_type != 'histogram':
+                lines.append(f'{metric}{_format_labels(labels)} {_format_value(value)}')
+                continue
+            for bound, count in sorted(value['buckets'].items(), key=lambda item: _bucket_order(item[0])):
+                lines.append(f'{metric}_bucket{_format_labels(labels, [("le", _format_bound(bound))])} {count}')
+            lines.append(f'{metric}_sum{_format_labels(labels)} {_format_value(value["sum"])}')
+            lines.append(f'{metric}_count{_format_labels(labels)} {value["count"]}')
+    return '\n'.join(lines) + '\n'
+
+
+def init_metrics(app):
+    """
+    为应用注册请求统计钩子
+
+    耗时从请求开始统计到视图函数返回响应为止，流式响应的传输时间不计入。
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        RequestMetrics: 指标实例（未启用时返回None）
+    """
+    if not app.config.get('METRICS_ENABLED'):
+        return None
+
+    recorder = RequestMetrics(
+        app,
+        metrics_dir=app.config.get('METRICS_DIR') or os.path.join(tempfile.gettempdir(), 'tiny_panel_metrics'),
+        flush_interval=app.config.get('METRICS_FLUSH_INTERVAL', 2)
+    )
+    app.extensions['request_metrics'] = recorder
+
+    @app.before_request
+    def start_request_timer():
+        g.metrics_endpoint = request.endpoint or UNMATCHED_ENDPOINT
+        g.metrics_started = time.perf_counter()
+        recorder.start_request(g.metrics_endpoint)
+
+    @app.after_request
+    def record_response_status(response):
+        g.metrics_status = response.status_code
+        return response
+
+    @app.teardown_request
+    def finish_request_timer(exc):
+        started = g.pop('metrics_started', None)
+        if started is None:
+            return
+        status = 500 if exc is not None else g.get('metrics_status', 500)
+        recorder.finish_request(
+            g.metrics_endpoint, request.method, status, time.perf_counter() - started,
+            query_stats=g.get('query_stats'), repeated_queries=g.get('query_repeated', 0)
+        )
+
+    return recorder
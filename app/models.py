@@ -143,17 +143,104 @@ class Redirect(db.Model):
 
 class MonitoringData(db.Model):
     """服务器监控数据模型"""
+    __table_args__ = (
+        db.Index('ix_monitoring_data_server_timestamp', 'server_id', 'timestamp'),
+    )
+    
     id = db.Column(db.Integer, primary_key=True)
     cpu_usage = db.Column(db.Float, nullable=False)
     memory_usage = db.Column(db.Float, nullable=False)
     disk_usage = db.Column(db.Float, nullable=False)
     network_in = db.Column(db.BigInteger, nullable=False)
     network_out = db.Column(db.BigInteger, nullable=False)
-    uptime = db.Column(db.Integer, nullable=False)  # 秒
+    uptime = db.Column(db.Integer, nullable=False, default=0)  # 秒
     timestamp = db.Column(db.DateTime, nullable=False, default=datetime.utcnow)
     
     # 外键
     server_id = db.Column(db.Integer, db.ForeignKey('server.id'), nullable=False)
+    
+    # 路由和模板中使用network_rx/network_tx命名
+    network_rx = db.synonym('network_in')
+    network_tx = db.synonym('network_out')
+
+
+class ServerLatestSample(db.Model):
+    """服务器最新监控样本模型（每台服务器一行，写入监控数据时同步更新）"""
+    server_id = db.Column(db.Integer, db.ForeignKey('server.id'), primary_key=True)
+    cpu_usage = db.Column(db.Float, nullable=False)
+    memory_usage = db.Column(db.Float, nullable=False)
+    disk_usage = db.Column(db.Float, nullable=False)
+    network_rx = db.Column(db.Float, nullable=False)
+    network_tx = db.Column(db.Float, nullable=False)
+    uptime = db.Column(db.Integer, nullable=False, default=0)  # 秒
+    response_time = db.Column(db.Float)  # 毫秒
+    timestamp = db.Column(db.DateTime, nullable=False)
+
+
+class MonitoringRollup(db.Model):
+    """监控数据汇总模型（按1分钟/5分钟/1小时分桶的最小/平均/最大值）"""
+    __table_args__ = (
+        db.UniqueConstraint('server_id', 'resolution', 'bucket', name='uq_monitoring_rollup_bucket'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    resolution = db.Column(db.Integer, nullable=False)  # 分桶粒度（秒）
+    bucket = db.Column(db.DateTime, nullable=False)  # 分桶起始时间
+    samples = db.Column(db.Integer, nullable=False, default=0)
+    cpu_min = db.Column(db.Float, nullable=False)
+    cpu_avg = db.Column(db.Float, nullable=False)
+    cpu_max = db.Column(db.Float, nullable=False)
+    memory_min = db.Column(db.Float, nullable=False)
+    memory_avg = db.Column(db.Float, nullable=False)
+    memory_max = db.Column(db.Float, nullable=False)
+    disk_min = db.Column(db.Float, nullable=False)
+    disk_avg = db.Column(db.Float, nullable=False)
+    disk_max = db.Column(db.Float, nullable=False)
+    network_rx_min = db.Column(db.Float, nullable=False)
+    network_rx_avg = db.Column(db.Float, nullable=False)
+    network_rx_max = db.Column(db.Float, nullable=False)
+    network_tx_min = db.Column(db.Float, nullable=False)
+    network_tx_avg = db.Column(db.Float, nullable=False)
+    network_tx_max = db.Column(db.Float, nullable=False)
+    
+    # 外键
+    server_id = db.Column(db.Integer, db.ForeignKey('server.id'), nullable=False)
+
+
+class ServerProbe(db.Model):
+    """服务器可达性探测结果模型（每台服务器一行，由后台探测器定期更新）"""
+    server_id = db.Column(db.Integer, db.ForeignKey('server.id'), primary_key=True)
+    online = db.Column(db.Boolean, nullable=False, default=False)
+    ssh_open = db.Column(db.Boolean, nullable=False, default=False)  # SSH端口是否可连接
+    latency = db.Column(db.Float)  # 毫秒，SSH端口可连接时为TCP建连耗时，否则为ICMP往返时间
+    error = db.Column(db.String(255))
+    checked_at = db.Column(db.DateTime, nullable=False)
+    # 最近若干次探测结果的紧凑JSON：[[epoch秒, 是否在线, 延迟毫秒], ...]
+    history = db.Column(Text, nullable=False, default='[]')
+
+
+class ProcessSnapshot(db.Model):
+    """进程快照模型（按固定周期记录CPU/内存/IO占用最高的进程，用于回溯监控曲线上的异常）"""
+    __table_args__ = (
+        db.Index('ix_process_snapshot_server_timestamp', 'server_id', 'timestamp'),
+    )
+    
+    id = db.Column(db.Integer, primary_key=True)
+    timestamp = db.Column(db.DateTime, nullable=False)
+    # 紧凑JSON：每个进程一个数组，字段顺序见app.monitoring.processes.SNAPSHOT_FIELDS
+    processes = db.Column(Text, nullable=False)
+    
+    # 外键
+    server_id = db.Column(db.Integer, db.ForeignKey('server.id'), nullable=False)
+
+
+class AgentHeartbeat(db.Model):
+    """监控代理心跳模型（每台服务器一行，代理推送数据时更新，采集器据此跳过该服务器）"""
+    server_id = db.Column(db.Integer, db.ForeignKey('server.id'), primary_key=True)
+    agent_version = db.Column(db.String(20))
+    interval = db.Column(db.Integer, nullable=False, default=60)  # 代理推送周期（秒）
+    last_seen = db.Column(db.DateTime, nullable=False)
+    samples = db.Column(db.Integer, nullable=False, default=0)  # 累计接收的样本数
 
 
 class Software(db.Model):
@@ -0,0 +1,180 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控代理数据接收
+
+本模块处理监控代理（tiny_panel_agent.py）推送的数据：校验代理令牌、
+解压并校验批量样本，以及记录代理心跳。启用代理的服务器由代理主动推送数据，
+后台采集器不再通过SSH采集这些服务器。
+
+代理令牌由SECRET_KEY和服务器ID派生（HMAC-SHA256），无需单独保存；
+更换SECRET_KEY后所有代理需要使用新令牌。
+"""
+
+import hashlib
+import hmac
+import json
+import math
+import zlib
+from datetime import datetime, timedelta
+
+from flask import current_app
+
+
+# 样本中必须包含的数值字段
+SAMPLE_FIELDS = ('cpu_usage', 'memory_usage', 'disk_usage', 'network_rx', 'network_tx', 'uptime')
+
+# 解压后请求体的大小上限（字节），防止压缩炸弹
+MAX_DECOMPRESSED_SIZE = 8 * 1024 * 1024
+
+
+def agent_token(server_id):
+    """
+    生成服务器的代理令牌
+
+    Args:
+        server_id: 服务器ID
+
+    Returns:
+        str: 十六进制令牌
+    """
+    key = current_app.config['SECRET_KEY'].encode()
+    return hmac.new(key, f'tiny-panel-agent:{server_id}'.encode(), hashlib.sha256).hexdigest()
+
+
+def verify_agent_token(server_id, token):
+    """
+    校验代理令牌
+
+    Args:
+        server_id: 服务器ID
+        token: 请求携带的令牌
+
+    Returns:
+        bool: 令牌是否有效
+    """
+    return bool(token) and hmac.compare_digest(agent_token(server_id), token)
+
+
+def decode_payload(body, content_encoding=None):
+    """
+    解码代理推送的请求体
+
+    Args:
+        body: 原始请求体
+        content_encoding: Content-Encoding请求头，gzip表示请求体经过压缩
+
+    Returns:
+        dict: 解析后的JSON对象
+
+    Raises:
+        ValueError: 请求体过大或格式错误
+    """
+    if content_encoding == 'gzip':
+        decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS)
+        try:
+            body = decompressor.decompress(body, MAX_DECOMPRESSED_SIZE)
+        except zlib.error as e:
+            raise ValueError(f'解压失败: {e}')
+        if decompressor.unconsumed_tail:
+            raise ValueError('请求体解压后超过大小限制')
+
+    payload = json.loads(body)
+    if not isinstance(payload, dict) or not isinstance(payload.get('samples'), list):
+        raise ValueError('缺少samples列表')
+    return payload
+
+
+def parse_samples(server_id, payload, max_samples, max_skew=300):
+    """
+    将代理推送的数据转换为监控样本
+
+    时间戳超前当前时间max_skew秒以上的样本视为时钟错误而丢弃。
+    指标值必须是有限数值（JSON中的NaN、Infinity会被json.loads接受，需要单独拒绝）。
+
+    Args:
+        server_id: 服务器ID
+        payload: decode_payload返回的对象
+        max_samples: 单次请求接收的样本数上限
+        max_skew: 允许的时钟超前量（秒）
+
+    Returns:
+        list: 监控样本列表（字段同save_monitoring_data），按时间升序
+
+    Raises:
+        ValueError: 样本数量超限或字段无效
+    """
+    raw_samples = payload['samples']
+    if len(raw_samples) > max_samples:
+        raise ValueError(f'单次最多推送{max_samples}个样本')
+
+    latest = datetime.now() + timedelta(seconds=max_skew)
+    samples = []
+    for raw in raw_samples:
+        try:
+            sample = {field: float(raw[field]) for field in SAMPLE_FIELDS}
+            if not all(math.isfinite(value) for value in sample.values()):
+                raise ValueError('样本字段不是有限数值')
+            sample['uptime'] = int(sample['uptime'])
+            timestamp = datetime.fromtimestamp(float(raw['timestamp']))
+        except (KeyError, TypeError, ValueError, OverflowError, OSError):
+            raise ValueError('样本字段无效')
+        if timestamp > latest:
+            continue
+        sample.update(server_id=server_id, response_time=None, timestamp=timestamp)
+        samples.append(sample)
+
+    samples.sort(key=lambda s: s['timestamp'])
+    return samples
+
+
+def record_heartbeat(server_id, payload, received):
+    """
+    更新代理心跳（调用方负责提交事务）
+
+    Args:
+        server_id: 服务器ID
+        payload: decode_payload返回的对象
+        received: 本次接收的样本数
+    """
+    from app import db
+    from app.models import AgentHeartbeat
+
+    heartbeat = db.session.get(AgentHeartbeat, server_id)
+    if heartbeat is None:
+        heartbeat = AgentHeartbeat(server_id=server_id, samples=0)
+        db.session.add(heartbeat)
+    heartbeat.agent_version = str(payload.get('agent_version', ''))[:20] or None
+    try:
+        heartbeat.interval = max(1, int(payload.get('interval') or 60))
+    except (TypeError, ValueError):
+        heartbeat.interval = 60
+    heartbeat.last_seen = datetime.now()
+    heartbeat.samples += received
+
+
+def agent_managed_servers(now=None):
+    """
+    获取由代理推送数据的服务器（最近有心跳的服务器）
+
+    心跳超过三个推送周期（且至少MONITORING_AGENT_STALE_AFTER秒）未更新时视为代理已停止，
+    采集器恢复通过SSH采集该服务器。
+
+    Args:
+        now: 当前时间，默认datetime.now()
+
+    Returns:
+        set: 服务器ID集合
+    """
+    from app.models import AgentHeartbeat
+
+    now = now or datetime.now()
+    stale_after = current_app.config.get('MONITORING_AGENT_STALE_AFTER', 180)
+    managed = set()
+    for heartbeat in AgentHeartbeat.query.all():
+        timeout = max(stale_after, heartbeat.interval * 3)
+        if now - heartbeat.last_seen <= timedelta(seconds=timeout):
+            managed.add(heartbeat.server_id)
+    return managed
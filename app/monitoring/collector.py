@@ -0,0 +1,514 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控数据后台采集器
+
+本模块提供后台采集线程，按固定周期为所有服务器采集监控数据并写入数据库，
+使监控相关的API只需读取已采集的数据，不再在请求中阻塞等待采集。
+
+所有服务器通过线程池并发采集，并发数和单台服务器的超时时间可配置，
+一轮采集的耗时约等于最慢的一台服务器，离线服务器不会拖慢其他服务器。
+
+gunicorn多进程部署时，通过文件锁保证只有一个工作进程运行采集器。采集器在工作进程处理请求时
+才尝试启动，create_app()本身不启动线程、不获取文件锁：脚本和测试创建的应用不会运行采集器，
+使用gunicorn --preload时也不会由主进程持有锁（fork后线程不会保留）。持有锁的工作进程退出后，
+其他工作进程会在下一次尝试时接管。也可以通过 `python -m app.monitoring.collector` 作为独立进程运行。
+"""
+
+import fcntl
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+
+
+def server_snapshot(server):
+    """
+    复制服务器对象的字段，供采集线程在数据库会话之外安全读取
+
+    Args:
+        server: 服务器对象
+
+    Returns:
+        SimpleNamespace: 包含服务器全部字段的只读副本
+    """
+    return SimpleNamespace(**{
+        column.name: getattr(server, column.name)
+        for column in server.__table__.columns
+    })
+
+
+class MonitoringCollector:
+    """
+    监控数据后台采集器
+
+    Args:
+        app: Flask应用实例
+        interval: 采集周期（秒），默认读取配置MONITORING_INTERVAL
+        lock_file: 单实例文件锁路径，默认读取配置MONITORING_LOCK_FILE
+        concurrency: 并发采集的服务器数量，默认读取配置MONITORING_CONCURRENCY
+        host_timeout: 单台服务器采集超时（秒），默认读取配置MONITORING_HOST_TIMEOUT
+    """
+
+    def __init__(self, app, interval=None, lock_file=None, concurrency=None, host_timeout=None):
+        self.app = app
+        self.interval = interval or app.config.get('MONITORING_INTERVAL', 10)
+        self.lock_file = lock_file or app.config.get('MONITORING_LOCK_FILE')
+        self.concurrency = concurrency or app.config.get('MONITORING_CONCURRENCY', 32)
+        self.host_timeout = host_timeout or app.config.get('MONITORING_HOST_TIMEOUT', 8)
+        self.last_run = None
+        self.last_duration = 0
+        self.last_cycle = {}
+        self.retention_interval = app.config.get('MONITORING_RETENTION_INTERVAL', 600)
+        self._last_retention = None
+        self.process_snapshot_interval = app.config.get('MONITORING_PROCESS_SNAPSHOT_INTERVAL', 60)
+        self.process_snapshot_top = app.config.get('MONITORING_PROCESS_SNAPSHOT_TOP', 10)
+        self._last_process_snapshot = None
+        # 本轮采集到的进程快照 {服务器ID: 进程信息列表}，为None表示本轮不采集进程快照
+        self._process_snapshots = None
+        self.ring = None
+        self._lock_fd = None
+        self._thread = None
+        self._stop_event = threading.Event()
+        self._executor = None
+        self.prober = None
+        # 最近一次尝试启动的进程和时间，用于在工作进程中按周期重试获取锁
+        self._start_pid = None
+        self._last_start_attempt = 0
+        self._start_lock = threading.Lock()
+        # 仍在采集中的服务器ID（包括已判定超时但线程尚未返回的）
+        self._inflight = set()
+        self._inflight_lock = threading.Lock()
+
+    def _acquire_lock(self):
+        """
+        获取单实例文件锁，保证多个工作进程中只有一个运行采集器
+
+        Returns:
+            bool: 是否成功获取锁
+        """
+        if not self.lock_file:
+            return True
+
+        fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            os.close(fd)
+            return False
+
+        os.ftruncate(fd, 0)
+        os.write(fd, str(os.getpid()).encode())
+        self._lock_fd = fd
+        return True
+
+    def _release_lock(self):
+        """释放单实例文件锁"""
+        if self._lock_fd is not None:
+            fcntl.flock(self._lock_fd, fcntl.LOCK_UN)
+            os.close(self._lock_fd)
+            self._lock_fd = None
+
+    @property
+    def running(self):
+        """采集线程是否正在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """
+        启动后台采集线程
+
+        Returns:
+            bool: 是否启动成功（其他进程已持有锁时返回False）
+        """
+        if self.running:
+            return True
+
+        if not self._acquire_lock():
+            return False
+
+        if self.app.config.get('MONITORING_RINGBUFFER_ENABLED') and self.ring is None:
+            self._open_ring()
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='monitoring-collector', daemon=True)
+        self._thread.start()
+
+        # 可达性探测器与采集器在同一进程中运行
+        if self.app.config.get('MONITORING_PROBE_INTERVAL'):
+            from app.monitoring.prober import FleetProber
+            if self.prober is None:
+                self.prober = FleetProber(self.app)
+            self.prober.start()
+        return True
+
+    def ensure_started(self):
+        """
+        在当前进程中尝试启动采集器，其他进程持有锁时每个采集周期最多重试一次
+
+        Returns:
+            bool: 采集器是否在当前进程中运行
+        """
+        pid = os.getpid()
+        if self._start_pid == pid and self.running:
+            return True
+        now = time.monotonic()
+        if self._start_pid == pid and now - self._last_start_attempt < self.interval:
+            return False
+        with self._start_lock:
+            if self._start_pid != pid:
+                # fork继承的线程、线程池和探测器不属于当前进程
+                self._thread = None
+                self._executor = None
+                self.prober = None
+            elif now - self._last_start_attempt < self.interval:
+                return self.running
+            self._start_pid = pid
+            self._last_start_attempt = now
+            return self.start()
+
+    def stop(self, timeout=None):
+        """
+        停止后台采集线程
+
+        Args:
+            timeout: 等待线程退出的超时时间（秒）
+        """
+        self._stop_event.set()
+        if self.prober is not None:
+            self.prober.stop(timeout)
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+        if self._executor is not None:
+            self._executor.shutdown(wait=False, cancel_futures=True)
+            self._executor = None
+        self._release_lock()
+
+    def _open_ring(self):
+        """打开共享内存环形缓冲区，并用数据库中的近期数据预热没有数据的服务器"""
+        from app import db
+        from app.models import MonitoringData
+        from app.monitoring.ringbuffer import open_writer, RECORD_FIELDS
+
+        self.ring = open_writer(self.app)
+        if self.ring is None:
+            return
+
+        window = timedelta(seconds=self.ring.capacity * self.interval)
+        with self.app.app_context():
+            try:
+                rows = MonitoringData.query.with_entities(
+                    MonitoringData.server_id,
+                    MonitoringData.timestamp,
+                    MonitoringData.cpu_usage,
+                    MonitoringData.memory_usage,
+                    MonitoringData.disk_usage,
+                    MonitoringData.network_in,
+                    MonitoringData.network_out,
+                    MonitoringData.uptime
+                ).filter(
+                    MonitoringData.timestamp >= datetime.now() - window
+                ).order_by(MonitoringData.server_id, MonitoringData.timestamp).all()
+            except Exception as e:
+                print(f'预热监控环形缓冲区失败: {e}')
+                rows = []
+            finally:
+                db.session.remove()
+
+        warm = {}
+        for row in rows:
+            if row[0] not in warm:
+                warm[row[0]] = not self.ring.has_data(row[0])
+            if warm[row[0]]:
+                self.ring.append(dict(zip(('server_id',) + RECORD_FIELDS, row)))
+
+    def _mirror_agent_samples(self, server_ids):
+        """
+        将监控代理推送的样本同步到环形缓冲区
+
+        代理样本由接收请求的工作进程交给写入器写入数据库，环形缓冲区只由采集器写入，
+        因此每轮采集从数据库读取比缓冲区中最新样本更新的代理样本并追加到缓冲区。
+
+        Args:
+            server_ids: 由代理推送数据的服务器ID集合
+        """
+        from app.models import MonitoringData
+        from app.monitoring.ringbuffer import RECORD_FIELDS
+
+        window_start = time.time() - self.ring.capacity * self.interval
+        latest = {server_id: max(self.ring.latest_timestamp(server_id) or 0, window_start)
+                  for server_id in server_ids}
+
+        try:
+            rows = MonitoringData.query.with_entities(
+                MonitoringData.server_id,
+                MonitoringData.timestamp,
+                MonitoringData.cpu_usage,
+                MonitoringData.memory_usage,
+                MonitoringData.disk_usage,
+                MonitoringData.network_in,
+                MonitoringData.network_out,
+                MonitoringData.uptime
+            ).filter(
+                MonitoringData.server_id.in_(server_ids),
+                MonitoringData.timestamp > datetime.fromtimestamp(min(latest.values()))
+            ).order_by(MonitoringData.server_id, MonitoringData.timestamp).all()
+        except Exception as e:
+            print(f'同步代理监控数据失败: {e}')
+            return
+
+        for row in rows:
+            if row[1].timestamp() > latest[row[0]]:
+                self.ring.append(dict(zip(('server_id',) + RECORD_FIELDS, row)))
+
+    def _sample(self, server, started):
+        """
+        在线程池中采集单台服务器，所有命令受host_timeout截止时间约束
+
+        Args:
+            server: 服务器快照
+            started: 用于记录开始时间的字典
+
+        Returns:
+            dict: 监控样本，服务器离线时返回None
+        """
+        from app.executor import command_deadline
+        from app.monitoring.utils import sample_monitoring_data
+        from app.monitoring.processes import collect_process_snapshot
+
+        started[server.id] = time.monotonic()
+        with command_deadline(self.host_timeout):
+            sample = sample_monitoring_data(server)
+            snapshots = self._process_snapshots
+            if sample is not None and snapshots is not None:
+                try:
+                    processes = collect_process_snapshot(server, self.process_snapshot_top)
+                    if processes:
+                        snapshots[server.id] = (sample['timestamp'], processes)
+                except Exception as e:
+                    print(f'采集服务器 {server.name} 进程快照失败: {e}')
+            return sample
+
+    def _release(self, server_id):
+        """采集任务结束后将服务器移出进行中集合"""
+        with self._inflight_lock:
+            self._inflight.discard(server_id)
+
+    def sample_all(self, servers):
+        """
+        并发采集一组服务器
+
+        上一轮仍未返回的服务器本轮跳过；从开始执行算起超过host_timeout
+        仍未完成的服务器判定为超时，不再等待。
+
+        Args:
+            servers: 服务器快照列表
+
+        Returns:
+            list: 成功采集到的监控样本
+        """
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(max_workers=self.concurrency,
+                                                thread_name_prefix='monitoring-sample')
+
+        started = {}
+        pending = {}
+        skipped = 0
+        for server in servers:
+            with self._inflight_lock:
+                if server.id in self._inflight:
+                    skipped += 1
+                    continue
+                self._inflight.add(server.id)
+            future = self._executor.submit(self._sample, server, started)
+            future.add_done_callback(lambda _, server_id=server.id: self._release(server_id))
+            pending[future] = server
+
+        samples = []
+        timeouts = 0
+        failures = 0
+        while pending:
+            done, _ = wait(pending, timeout=0.2, return_when=FIRST_COMPLETED)
+            for future in done:
+                server = pending.pop(future)
+                try:
+                    sample = future.result()
+                except Exception as e:
+                    failures += 1
+                    print(f'采集服务器 {server.name} 监控数据失败: {e}')
+                    continue
+                if sample is not None:
+                    samples.append(sample)
+
+            # 放弃已超时的服务器，其线程返回后会自动释放
+            now = time.monotonic()
+            for future, server in list(pending.items()):
+                begin = started.get(server.id)
+                if begin is not None and now - begin > self.host_timeout:
+                    pending.pop(future)
+                    timeouts += 1
+
+        self.last_cycle = {
+            'servers': len(servers),
+            'collected': len(samples),
+            'skipped': skipped,
+            'timeouts': timeouts,
+            'failures': failures
+        }
+        return samples
+
+    def run_once(self):
+        """
+        执行一轮采集：并发为所有服务器采集一次监控数据，交给批量写入器写入数据库
+
+        Returns:
+            int: 本轮成功采集的服务器数量
+        """
+        from app import db
+        from app.models import Server
+        from app.monitoring.writer import get_writer
+        from app.monitoring.agent import agent_managed_servers
+        from app.executor import is_local
+        from app.monitoring.processes import publish_local_processes
+
+        with self.app.app_context():
+            try:
+                # 由监控代理推送数据的服务器不再通过SSH采集
+                managed = agent_managed_servers()
+                servers = [server_snapshot(server) for server in Server.query.all()
+                           if server.id not in managed]
+                if managed and self.ring is not None:
+                    self._mirror_agent_samples(managed)
+            finally:
+                db.session.remove()
+
+        # 进程快照按MONITORING_PROCESS_SNAPSHOT_INTERVAL周期随监控数据一同采集
+        now = time.monotonic()
+        if self.process_snapshot_interval and (self._last_process_snapshot is None or
+                                               now - self._last_process_snapshot >= self.process_snapshot_interval):
+            self._last_process_snapshot = now
+            self._process_snapshots = {}
+        else:
+            self._process_snapshots = None
+
+        # 面板所在主机的进程表每轮刷新一次，供各工作进程的进程列表接口读取
+        if any(is_local(server) for server in servers):
+            publish_local_processes(self.app)
+
+        samples = self.sample_all(servers)
+        snapshots, self._process_snapshots = self._process_snapshots, None
+
+        # 环形缓冲区立即更新，数据库由批量写入器异步写入
+        if samples:
+            if self.ring is not None:
+                self.ring.extend(samples)
+            get_writer(self.app).submit(samples)
+
+        with self.app.app_context():
+            try:
+                if snapshots:
+                    self._save_process_snapshots(snapshots)
+                self._apply_retention()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+        return len(samples)
+
+    def _save_process_snapshots(self, snapshots):
+        """
+        保存本轮采集到的进程快照
+
+        Args:
+            snapshots: {服务器ID: (采集时间, 进程信息列表)}
+        """
+        from app import db
+        from app.models import ProcessSnapshot
+        from app.monitoring.processes import pack_snapshot
+
+        db.session.add_all([
+            ProcessSnapshot(server_id=server_id, timestamp=timestamp, processes=pack_snapshot(processes))
+            for server_id, (timestamp, processes) in snapshots.items()
+        ])
+        db.session.commit()
+
+    def _apply_retention(self):
+        """按MONITORING_RETENTION_INTERVAL周期清理过期的监控数据"""
+        from app.monitoring.rollup import apply_retention
+
+        now = time.monotonic()
+        if self._last_retention is not None and now - self._last_retention < self.retention_interval:
+            return
+        self._last_retention = now
+        apply_retention()
+
+    def _run(self):
+        """采集线程主循环，按固定节拍运行，不因单轮耗时产生漂移"""
+        from app.monitoring.status import publish_status
+
+        next_run = time.monotonic()
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f'监控数据采集失败: {e}')
+
+            self.last_run = time.time()
+            self.last_duration = time.monotonic() - started
+            publish_status(self.app)
+
+            # 计算下一次采集时间，若本轮超时则跳过错过的节拍
+            next_run += self.interval
+            now = time.monotonic()
+            if next_run < now:
+                next_run = now
+            self._stop_event.wait(next_run - now)
+
+
+def init_collector(app):
+    """
+    根据配置为应用创建后台采集器，并在工作进程处理请求时启动
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        MonitoringCollector: 采集器实例（未启用时返回None）
+    """
+    if not app.config.get('MONITORING_COLLECTOR_ENABLED'):
+        return None
+
+    collector = MonitoringCollector(app)
+    app.extensions['monitoring_collector'] = collector
+
+    @app.before_request
+    def start_collector():
+        # 测试应用不启动采集线程
+        if not app.testing:
+            collector.ensure_started()
+
+    return collector
+
+
+if __name__ == '__main__':
+    # 独立进程模式运行采集器
+    from app import create_app
+
+    app = create_app(os.environ.get('FLASK_ENV', 'dev'))
+    collector = app.extensions.get('monitoring_collector') or MonitoringCollector(app)
+    if not collector.start():
+        print('已有其他进程在运行监控采集器')
+    else:
+        try:
+            while collector.running:
+                time.sleep(1)
+        except KeyboardInterrupt:
+            collector.stop()
@@ -0,0 +1,91 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控数据降采样
+
+本模块使用Largest-Triangle-Three-Buckets（LTTB）算法对图表数据降采样：
+首尾两点保留，其余数据点均分为若干个桶，每个桶选出与上一个选中点、
+下一个桶平均点构成三角形面积最大的点，从而在限制数据点数量的同时保留峰值形状。
+numpy在首次降采样时才导入。
+"""
+
+
+def lttb_indices(x, ys, threshold):
+    """
+    计算LTTB降采样后保留的数据点下标
+
+    多个序列共享同一组时间戳时，各序列按值域归一化后分别计算三角形面积，
+    每个桶选择面积最大值最大的点，使任一序列的峰值都能被保留。
+
+    Args:
+        x: 横坐标数组（长度N，升序）
+        ys: 纵坐标数组（长度N）或多个序列组成的二维数组（序列数×N）
+        threshold: 降采样后的数据点数量（至少为3）
+
+    Returns:
+        ndarray: 保留的数据点下标（升序）
+    """
+    import numpy as np
+
+    x = np.asarray(x, dtype=np.float64)
+    ys = np.atleast_2d(np.asarray(ys, dtype=np.float64))
+    length = x.shape[0]
+    if threshold >= length or threshold < 3:
+        return np.arange(length)
+
+    # 按值域归一化，避免数值大的序列（如网络速率）主导面积比较
+    spans = np.ptp(ys, axis=1)
+    spans[spans == 0] = 1
+    ys = (ys - ys.min(axis=1, keepdims=True)) / spans[:, None]
+    spans = np.ptp(x) or 1
+    x = (x - x[0]) / spans
+
+    # 除首尾两点外的数据均分为threshold-2个桶，edges为各桶的起止下标
+    edges = (np.linspace(1, length - 1, threshold - 1)).astype(np.int64)
+    counts = np.diff(edges)
+
+    # 所有桶的平均点一次算出，作为前一个桶选点时的第三个顶点；
+    # reduceat的最后一段延伸到数组末尾，因此只对最后一点之前的数据求和，使最后一个桶不包含终点
+    avg_x = np.add.reduceat(x[:length - 1], edges[:-1]) / counts
+    avg_y = np.add.reduceat(ys[:, :length - 1], edges[:-1], axis=1) / counts
+    avg_x = np.append(avg_x[1:], x[-1])
+    avg_y = np.concatenate([avg_y[:, 1:], ys[:, -1:]], axis=1)
+
+    selected = np.empty(threshold, dtype=np.int64)
+    selected[0] = 0
+    selected[-1] = length - 1
+    previous = 0
+    for i in range(threshold - 2):
+        start, end = edges[i], edges[i + 1]
+        px, py = x[previous], ys[:, previous]
+        bx, by = x[start:end], ys[:, start:end]
+        # 三角形面积的2倍：|(A-C)×(B-A)|，对桶内所有点和所有序列同时计算
+        areas = np.abs((px - avg_x[i]) * (by - py[:, None])
+                       - (bx - px) * (py - avg_y[:, i])[:, None])
+        previous = start + int(np.argmax(areas.max(axis=0)))
+        selected[i + 1] = previous
+
+    return selected
+
+
+def downsample_rows(rows, max_points):
+    """
+    对监控数据行降采样
+
+    Args:
+        rows: (时间, 指标1, 指标2, ...) 元组列表，按时间升序
+        max_points: 最多保留的数据点数量
+
+    Returns:
+        list: 降采样后的数据行（未超过max_points时原样返回）
+    """
+    if not max_points or len(rows) <= max_points:
+        return rows
+
+    import numpy as np
+
+    x = np.fromiter((row[0].timestamp() for row in rows), dtype=np.float64, count=len(rows))
+    ys = np.array([row[1:] for row in rows], dtype=np.float64).T
+    return [rows[i] for i in lttb_indices(x, ys, max_points).tolist()]
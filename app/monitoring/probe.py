@@ -0,0 +1,213 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+远程监控探针
+
+本模块通过一次远程命令读取/proc/stat、/proc/meminfo、/proc/net/dev、/proc/loadavg、
+/proc/uptime和根分区的statvfs信息，解析为结构化的监控数据。
+每个样本只需一次往返，命令本身的耗时即作为服务器响应时间。
+"""
+
+import time
+
+from app.executor import execute_remote_command
+from app.monitoring.sampler import rate_sampler, parse_proc_stat_cpu, parse_proc_net_dev
+
+
+# 各段输出之前的分隔标记
+SECTION_MARKER = '==tiny-panel:'
+
+# 探针命令：依次输出各数据源，stat -f输出 块大小 总块数 空闲块数 可用块数
+PROBE_SECTIONS = (
+    ('stat', 'head -n 1 /proc/stat'),
+    ('meminfo', 'cat /proc/meminfo'),
+    ('netdev', 'cat /proc/net/dev'),
+    ('loadavg', 'cat /proc/loadavg'),
+    ('uptime', 'cat /proc/uptime'),
+    ('statvfs', "stat -f -c '%S %b %f %a' {path}")
+)
+
+
+def build_probe_command(path='/'):
+    """
+    生成探针命令
+
+    Args:
+        path: 统计磁盘使用率的挂载点
+
+    Returns:
+        str: shell命令
+    """
+    parts = []
+    for name, command in PROBE_SECTIONS:
+        parts.append(f"echo '{SECTION_MARKER}{name}'")
+        parts.append(command.format(path=path) + ' 2>/dev/null')
+    return '; '.join(parts)
+
+
+def split_sections(output):
+    """
+    按分隔标记拆分探针输出
+
+    Args:
+        output: 探针命令的标准输出
+
+    Returns:
+        dict: {段名: 内容}
+    """
+    sections = {}
+    name = None
+    lines = []
+    for line in output.splitlines():
+        if line.startswith(SECTION_MARKER):
+            if name is not None:
+                sections[name] = '\n'.join(lines)
+            name = line[len(SECTION_MARKER):].strip()
+            lines = []
+        elif name is not None:
+            lines.append(line)
+    if name is not None:
+        sections[name] = '\n'.join(lines)
+    return sections
+
+
+def parse_meminfo(content):
+    """
+    解析/proc/meminfo
+
+    Args:
+        content: /proc/meminfo的内容
+
+    Returns:
+        dict: 总内存、可用内存（字节）和使用率，解析失败返回None
+    """
+    values = {}
+    for line in content.splitlines():
+        name, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts:
+            values[name.strip()] = int(parts[0]) * 1024
+
+    total = values.get('MemTotal')
+    if not total:
+        return None
+    available = values.get('MemAvailable')
+    if available is None:
+        # 3.14之前的内核没有MemAvailable，按free的算法估算
+        available = values.get('MemFree', 0) + values.get('Buffers', 0) + values.get('Cached', 0)
+    return {
+        'total': total,
+        'available': available,
+        'percent': round((total - available) / total * 100, 1)
+    }
+
+
+def parse_statvfs(content):
+    """
+    解析stat -f输出的文件系统信息
+
+    使用率的算法与df一致：已用 / (已用 + 普通用户可用)。
+
+    Args:
+        content: "块大小 总块数 空闲块数 可用块数"
+
+    Returns:
+        dict: 总容量、已用、可用（字节）和使用率，解析失败返回None
+    """
+    parts = content.split()
+    if len(parts) < 4:
+        return None
+    block_size, blocks, free, available = (int(p) for p in parts[:4])
+    used = (blocks - free) * block_size
+    available *= block_size
+    if used + available <= 0:
+        return None
+    return {
+        'total': blocks * block_size,
+        'used': used,
+        'available': available,
+        'percent': round(used / (used + available) * 100, 1)
+    }
+
+
+def parse_probe_output(server_id, output):
+    """
+    将探针输出解析为监控数据（CPU使用率和网络速率基于上次快照的差值）
+
+    Args:
+        server_id: 服务器ID（速率采样器的键）
+        output: 探针命令的标准输出
+
+    Returns:
+        dict: 结构化的监控数据，缺少的数据项为0或None
+    """
+    sections = split_sections(output)
+    payload = {
+        'cpu_usage': 0,
+        'memory_usage': 0,
+        'disk_usage': 0,
+        'network_rx': 0,
+        'network_tx': 0,
+        'uptime': 0,
+        'load_average': None,
+        'memory': None,
+        'disk': None
+    }
+
+    cpu_times = parse_proc_stat_cpu(sections.get('stat', ''))
+    if cpu_times:
+        payload['cpu_usage'] = rate_sampler.cpu_percent(server_id, cpu_times)
+
+    memory = parse_meminfo(sections.get('meminfo', ''))
+    if memory:
+        payload['memory'] = memory
+        payload['memory_usage'] = memory['percent']
+
+    if '|' in sections.get('netdev', ''):
+        bytes_recv, bytes_sent = parse_proc_net_dev(sections['netdev'])
+        payload['network_rx'], payload['network_tx'] = rate_sampler.net_rates(server_id, bytes_recv, bytes_sent)
+
+    loadavg = sections.get('loadavg', '').split()
+    if len(loadavg) >= 3:
+        payload['load_average'] = tuple(float(v) for v in loadavg[:3])
+
+    uptime = sections.get('uptime', '').split()
+    if uptime:
+        payload['uptime'] = int(float(uptime[0]))
+
+    disk = parse_statvfs(sections.get('statvfs', ''))
+    if disk:
+        payload['disk'] = disk
+        payload['disk_usage'] = disk['percent']
+
+    return payload
+
+
+def probe_server(server, path='/', timeout=10):
+    """
+    通过一次远程命令采集服务器的监控数据
+
+    Args:
+        server: 服务器对象
+        path: 统计磁盘使用率的挂载点
+        timeout: 超时时间（秒）
+
+    Returns:
+        dict: 结构化的监控数据（含response_time，毫秒），命令执行失败时返回None
+    """
+    started = time.monotonic()
+    result = execute_remote_command(server, build_probe_command(path), timeout=timeout)
+    elapsed = (time.monotonic() - started) * 1000
+    # 返回码只反映最后一段命令，以输出中是否有分隔标记判断探针是否执行
+    if SECTION_MARKER not in result['stdout']:
+        return None
+
+    try:
+        payload = parse_probe_output(server.id, result['stdout'])
+    except ValueError as e:
+        print(f'解析服务器 {server.hostname} 的探针输出失败: {e}')
+        return None
+    payload['response_time'] = round(elapsed, 2)
+    return payload
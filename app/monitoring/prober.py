@@ -0,0 +1,333 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+服务器可达性探测器
+
+本模块在后台线程中按固定周期用asyncio并发探测所有服务器：先测量SSH端口的TCP建连耗时，
+端口无响应时再用ping判断主机是否可达。一轮探测的耗时约等于单台服务器的超时时间，
+与服务器数量无关。
+
+探测结果和最近若干次的历史记录保存在ServerProbe表中，页面和API只读取缓存的结果，
+不会在请求中等待网络探测。探测器随监控采集器在持有采集锁的进程中运行。
+"""
+
+import asyncio
+import json
+import re
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta
+
+from app.executor import is_local
+
+
+# ping输出中的往返时间
+PING_TIME_PATTERN = re.compile(r'time[=<]([\d.]+)\s*ms')
+
+
+async def probe_tcp(host, port, timeout):
+    """
+    测量TCP建连耗时
+
+    Args:
+        host: 主机名或IP
+        port: 端口
+        timeout: 超时时间（秒）
+
+    Returns:
+        tuple: (结果, 耗时毫秒, 错误信息)，结果为open、refused、timeout或error
+    """
+    started = time.monotonic()
+    try:
+        _, writer = await asyncio.wait_for(asyncio.open_connection(host, port), timeout)
+    except ConnectionRefusedError:
+        return 'refused', (time.monotonic() - started) * 1000, '连接被拒绝'
+    except asyncio.TimeoutError:
+        return 'timeout', None, '连接超时'
+    except OSError as e:
+        return 'error', None, str(e)
+
+    latency = (time.monotonic() - started) * 1000
+    writer.close()
+    try:
+        await writer.wait_closed()
+    except OSError:
+        pass
+    return 'open', latency, None
+
+
+async def probe_icmp(host, timeout):
+    """
+    使用ping测量ICMP往返时间（普通用户无法直接发送ICMP报文，通过ping命令实现）
+
+    Args:
+        host: 主机名或IP
+        timeout: 超时时间（秒）
+
+    Returns:
+        float: 往返时间（毫秒），不可达时返回None
+    """
+    try:
+        process = await asyncio.create_subprocess_exec(
+            'ping', '-n', '-c', '1', '-W', str(max(1, int(timeout))), host,
+            stdout=asyncio.subprocess.PIPE,
+            stderr=asyncio.subprocess.DEVNULL
+        )
+    except OSError:
+        return None
+
+    try:
+        stdout, _ = await asyncio.wait_for(process.communicate(), timeout + 1)
+    except asyncio.TimeoutError:
+        process.kill()
+        await process.wait()
+        return None
+
+    if process.returncode != 0:
+        return None
+    match = PING_TIME_PATTERN.search(stdout.decode(errors='replace'))
+    return float(match.group(1)) if match else 0.0
+
+
+async def probe_target(server, timeout):
+    """
+    探测单台服务器
+
+    SSH端口可连接或拒绝连接都说明主机在线；端口超时或出错时再用ping确认主机是否可达。
+
+    Args:
+        server: 服务器对象（需包含hostname和port）
+        timeout: 单项探测的超时时间（秒）
+
+    Returns:
+        dict: 探测结果
+    """
+    if is_local(server):
+        return {'online': True, 'ssh_open': True, 'latency': 0.0, 'error': None}
+
+    state, latency, error = await probe_tcp(server.hostname, server.port or 22, timeout)
+    if state in ('open', 'refused'):
+        return {'online': True, 'ssh_open': state == 'open', 'latency': latency, 'error': error}
+
+    rtt = await probe_icmp(server.hostname, timeout)
+    return {'online': rtt is not None, 'ssh_open': False, 'latency': rtt, 'error': error}
+
+
+async def probe_all(servers, timeout=2, concurrency=256):
+    """
+    并发探测一组服务器
+
+    Args:
+        servers: 服务器对象列表
+        timeout: 单项探测的超时时间（秒）
+        concurrency: 同时进行的探测数上限
+
+    Returns:
+        dict: {服务器ID: 探测结果}
+    """
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def run(server):
+        async with semaphore:
+            try:
+                return server.id, await probe_target(server, timeout)
+            except Exception as e:
+                return server.id, {'online': False, 'ssh_open': False, 'latency': None, 'error': str(e)[:255]}
+
+    return dict(await asyncio.gather(*(run(server) for server in servers)))
+
+
+def run_probes(servers, timeout=2, concurrency=256):
+    """
+    在新的事件循环中探测一组服务器
+
+    域名解析（getaddrinfo）在事件循环的默认线程池中执行，这里使用更大的线程池避免解析排队；
+    结束时不等待仍阻塞在解析上的线程，使一轮探测的耗时不受DNS超时影响。
+
+    Args:
+        servers: 服务器对象列表
+        timeout: 单项探测的超时时间（秒）
+        concurrency: 同时进行的探测数上限
+
+    Returns:
+        dict: {服务器ID: 探测结果}
+    """
+    loop = asyncio.new_event_loop()
+    executor = ThreadPoolExecutor(max_workers=min(concurrency, 64), thread_name_prefix='probe-resolve')
+    loop.set_default_executor(executor)
+    try:
+        return loop.run_until_complete(probe_all(servers, timeout, concurrency))
+    finally:
+        executor.shutdown(wait=False, cancel_futures=True)
+        loop.close()
+
+
+def save_probe_results(results, checked_at, history_size=60):
+    """
+    保存一轮探测结果并追加历史记录（调用方负责提交事务）
+
+    Args:
+        results: probe_all返回的结果
+        checked_at: 探测时间
+        history_size: 每台服务器保留的历史记录条数
+    """
+    from app import db
+    from app.models import ServerProbe
+
+    if not results:
+        return
+
+    existing = {
+        probe.server_id: probe
+        for probe in ServerProbe.query.filter(ServerProbe.server_id.in_(list(results)))
+    }
+    epoch = round(checked_at.timestamp(), 3)
+    for server_id, result in results.items():
+        probe = existing.get(server_id)
+        if probe is None:
+            probe = ServerProbe(server_id=server_id, history='[]')
+            db.session.add(probe)
+        latency = round(result['latency'], 3) if result['latency'] is not None else None
+        probe.online = result['online']
+        probe.ssh_open = result['ssh_open']
+        probe.latency = latency
+        probe.error = result['error']
+        probe.checked_at = checked_at
+        history = json.loads(probe.history or '[]')
+        history.append([epoch, int(result['online']), latency])
+        probe.history = json.dumps(history[-history_size:], separators=(',', ':'))
+
+
+# 未传入参数的标记（None表示已查询但不存在）
+_UNSET = object()
+
+
+def cached_server_status(server, latest=_UNSET, probe=_UNSET):
+    """
+    从探测缓存获取服务器状态（不进行网络探测）
+
+    探测结果过期（超过三个探测周期）或尚无探测结果时，根据最新监控样本的时效推断状态。
+    批量获取状态时（如监控首页）由调用方一次查询出探测结果和最新样本后传入。
+
+    Args:
+        server: 服务器对象
+        latest: 最新样本（ServerLatestSample，可以为None），未提供时按需查询
+        probe: 探测结果（ServerProbe，可以为None），未提供时查询
+
+    Returns:
+        dict: 包含服务器状态的字典（online、response_time，有探测结果时还包括ssh_open、checked_at和history）
+    """
+    from flask import current_app
+    from app import db
+    from app.models import ServerProbe, ServerLatestSample
+    from app.monitoring.utils import status_from_latest
+
+    if probe is _UNSET:
+        probe = db.session.get(ServerProbe, server.id)
+    interval = current_app.config.get('MONITORING_PROBE_INTERVAL', 30)
+    if probe is not None and datetime.now() - probe.checked_at <= timedelta(seconds=interval * 3):
+        return {
+            'online': probe.online,
+            'response_time': probe.latency or 0,
+            'ssh_open': probe.ssh_open,
+            'error': probe.error,
+            'checked_at': probe.checked_at.strftime('%Y-%m-%d %H:%M:%S'),
+            'history': json.loads(probe.history or '[]')
+        }
+
+    if latest is _UNSET:
+        latest = db.session.get(ServerLatestSample, server.id)
+    return status_from_latest(latest, current_app.config.get('MONITORING_INTERVAL', 10))
+
+
+class FleetProber:
+    """
+    后台服务器探测器
+
+    Args:
+        app: Flask应用实例
+        interval: 探测周期（秒），默认读取配置MONITORING_PROBE_INTERVAL
+        timeout: 单项探测的超时时间（秒），默认读取配置MONITORING_PROBE_TIMEOUT
+    """
+
+    def __init__(self, app, interval=None, timeout=None):
+        self.app = app
+        self.interval = interval or app.config.get('MONITORING_PROBE_INTERVAL', 30)
+        self.timeout = timeout or app.config.get('MONITORING_PROBE_TIMEOUT', 2)
+        self.concurrency = app.config.get('MONITORING_PROBE_CONCURRENCY', 256)
+        self.history_size = app.config.get('MONITORING_PROBE_HISTORY', 60)
+        self.last_run = None
+        self.last_duration = 0
+        self._thread = None
+        self._stop_event = threading.Event()
+
+    @property
+    def running(self):
+        """探测线程是否正在运行"""
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        """启动后台探测线程"""
+        if self.running:
+            return
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._run, name='monitoring-prober', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=None):
+        """
+        停止后台探测线程
+
+        Args:
+            timeout: 等待线程退出的超时时间（秒）
+        """
+        self._stop_event.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+            self._thread = None
+
+    def run_once(self):
+        """
+        执行一轮探测并保存结果
+
+        Returns:
+            int: 在线的服务器数量
+        """
+        from app import db
+        from app.models import Server
+        from app.monitoring.collector import server_snapshot
+
+        with self.app.app_context():
+            try:
+                servers = [server_snapshot(server) for server in Server.query.all()]
+            finally:
+                db.session.remove()
+
+        results = run_probes(servers, self.timeout, self.concurrency)
+
+        with self.app.app_context():
+            try:
+                save_probe_results(results, datetime.now(), self.history_size)
+                db.session.commit()
+            except Exception:
+                db.session.rollback()
+                raise
+            finally:
+                db.session.remove()
+
+        return sum(1 for result in results.values() if result['online'])
+
+    def _run(self):
+        """探测线程主循环"""
+        while not self._stop_event.is_set():
+            started = time.monotonic()
+            try:
+                self.run_once()
+            except Exception as e:
+                print(f'服务器可达性探测失败: {e}')
+            self.last_run = time.time()
+            self.last_duration = time.monotonic() - started
+            self._stop_event.wait(max(0, self.interval - self.last_duration))
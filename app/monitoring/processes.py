@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+本机进程采样器
+
+本模块在内存中缓存psutil.Process对象及其上一次的CPU时间和IO计数器，
+通过与上次采样的差值计算每个进程的CPU使用率和IO速率，首次调用之后的读数都是真实值。
+每次刷新只读取各进程的计数器，进程名、用户名和启动时间只为最终返回的前k个进程获取；
+前k个进程通过堆选择，不对整个进程表排序。
+
+多进程部署时，运行采集器的工作进程每轮刷新本机进程表，并将占用CPU最多的进程写入状态目录下的
+共享文件；其他工作进程的进程列表接口直接读取该文件，不必各自维护采样器（首次刷新需要等待prime_interval）。
+
+本模块还负责进程快照：采集器按固定周期记录每台服务器CPU/内存/IO占用最高的进程，
+以紧凑JSON保存，用于查询某一时刻或某段时间内占用资源最多的进程。
+"""
+
+import heapq
+import json
+import os
+import tempfile
+import threading
+import time
+from datetime import datetime
+from operator import itemgetter
+
+from app.executor import execute_remote_command, is_local
+
+
+# 采样行中各字段的位置：(pid, CPU使用率, 内存使用率, 常驻内存字节数, IO字节速率)
+ROW_FIELDS = ('pid', 'cpu_percent', 'memory_percent', 'memory_rss', 'io_rate')
+
+# 可用于排序的字段
+SORT_KEYS = ('cpu_percent', 'memory_percent', 'memory_rss', 'io_rate')
+
+# 进程快照中每个进程保存的字段（按顺序保存为数组）
+SNAPSHOT_FIELDS = ('pid', 'name', 'username', 'cpu_percent', 'memory_percent', 'memory_rss', 'io_rate')
+
+# 远程服务器的进程快照命令：top第二轮输出中的CPU使用率是两轮之间的实际值（ps给出的是进程生命周期内的平均值）
+REMOTE_TOP_COMMAND = "LC_ALL=C COLUMNS=512 top -b -n 2 -d 0.5 | awk '/^top -/{{n++}} n==2' | head -n {lines}"
+
+# 共享进程列表的文件名和保存的进程数
+LOCAL_PROCESSES_FILE = 'local_processes.json'
+LOCAL_PROCESSES_COUNT = 100
+
+# top输出中RES列的单位后缀（默认单位为KiB）
+TOP_MEMORY_UNITS = {'k': 1, 'm': 2, 'g': 3, 't': 4, 'p': 5}
+
+
+class ProcessSampler:
+    """
+    基于差值的本机进程采样器
+
+    Args:
+        prime_interval: 首次刷新后等待多久再刷新一次（秒），使首次调用也能得到CPU使用率
+        min_interval: 最小采样窗口（秒），采集器和接口先后刷新时避免把采样窗口切得过短
+        track_io: 是否采集进程IO速率（读取/proc/<pid>/io，非root用户对其他用户的进程无权限）
+    """
+
+    def __init__(self, prime_interval=0.5, min_interval=1.0, track_io=True):
+        self.prime_interval = prime_interval
+        self.min_interval = min_interval
+        self.track_io = track_io
+        self._procs = {}
+        self._rows = []
+        self._sampled_at = None
+        self._total_memory = None
+        self._lock = threading.Lock()
+
+    @property
+    def sampled_at(self):
+        """最近一次刷新的时间（单调时钟秒），尚未刷新时为None"""
+        return self._sampled_at
+
+    def refresh(self, max_age=0):
+        """
+        刷新进程表
+
+        距离上次刷新不足max_age秒（且至少min_interval秒）时直接使用上次的结果。
+
+        Args:
+            max_age: 可接受的结果时长（秒）
+
+        Returns:
+            bool: 是否进行了刷新
+        """
+        with self._lock:
+            if self._sampled_at is not None and \
+                    time.monotonic() - self._sampled_at < max(max_age, self.min_interval):
+                return False
+            first = self._sampled_at is None
+            self._refresh()
+
+        if first and self.prime_interval:
+            time.sleep(self.prime_interval)
+            with self._lock:
+                self._refresh()
+        return True
+
+    def _refresh(self):
+        """读取全部进程的计数器，与上次的值相减得到速率"""
+        import psutil
+
+        now = time.monotonic()
+        elapsed = now - self._sampled_at if self._sampled_at is not None else 0
+        if self._total_memory is None:
+            self._total_memory = psutil.virtual_memory().total
+
+        procs = {}
+        rows = []
+        for pid in psutil.pids():
+            cached = self._procs.get(pid)
+            proc = cached[0] if cached else None
+            try:
+                if proc is None:
+                    proc = psutil.Process(pid)
+                with proc.oneshot():
+                    cpu_times = proc.cpu_times()
+                    cpu_total = cpu_times.user + cpu_times.system
+                    rss = proc.memory_info().rss
+                    io_total = None
+                    if self.track_io:
+                        try:
+                            io = proc.io_counters()
+                            io_total = io.read_bytes + io.write_bytes
+                        except (psutil.AccessDenied, AttributeError):
+                            pass
+            except (psutil.NoSuchProcess, psutil.ZombieProcess, psutil.AccessDenied):
+                continue
+
+            # CPU时间倒退说明PID已被新进程复用，丢弃旧的Process对象
+            if cached is not None and cpu_total < cached[1]:
+                self._procs.pop(pid, None)
+                try:
+                    proc = psutil.Process(pid)
+                except psutil.Error:
+                    continue
+                cached = None
+
+            cpu_percent = 0.0
+            io_rate = 0.0
+            if cached is not None and elapsed > 0:
+                cpu_percent = (cpu_total - cached[1]) / elapsed * 100
+                if io_total is not None and cached[2] is not None and io_total >= cached[2]:
+                    io_rate = (io_total - cached[2]) / elapsed
+
+            procs[pid] = (proc, cpu_total, io_total)
+            rows.append((pid, cpu_percent, rss / self._total_memory * 100, rss, io_rate))
+
+        # 已退出的进程不再出现在新的缓存中
+        self._procs = procs
+        self._rows = rows
+        self._sampled_at = now
+
+    def top(self, limit=20, sort_key='cpu_percent', max_age=None):
+        """
+        获取资源占用最高的进程
+
+        Args:
+            limit: 返回的进程数
+            sort_key: 排序字段，见SORT_KEYS
+            max_age: 指定时先按max_age调用refresh；为None时只在从未刷新过时刷新
+
+        Returns:
+            list: 进程信息列表，按sort_key降序
+        """
+        if sort_key not in SORT_KEYS:
+            raise ValueError(f'不支持的排序字段: {sort_key}')
+        if max_age is not None or self._sampled_at is None:
+            self.refresh(max_age or 0)
+
+        rows = heapq.nlargest(limit, self._rows, key=itemgetter(ROW_FIELDS.index(sort_key)))
+        return [self._format(row) for row in rows]
+
+    def snapshot(self, limit=10):
+        """
+        获取进程快照：CPU、内存和IO占用最高的各limit个进程（去重）
+
+        使用最近一次刷新的结果，从未刷新过时先刷新。
+
+        Args:
+            limit: 每项指标选取的进程数
+
+        Returns:
+            list: 进程信息列表
+        """
+        if self._sampled_at is None:
+            self.refresh()
+        rows = self._rows
+        selected = {}
+        for sort_key in ('cpu_percent', 'memory_rss', 'io_rate'):
+            index = ROW_FIELDS.index(sort_key)
+            for row in heapq.nlargest(limit, rows, key=itemgetter(index)):
+                if row[index] > 0:
+                    selected[row[0]] = row
+        return [self._format(row) for row in selected.values()]
+
+    def _format(self, row):
+        """补充进程名、用户名和启动时间，生成返回给前端的字典"""
+        import psutil
+
+        pid, cpu_percent, memory_percent, rss, io_rate = row
+        cached = self._procs.get(pid)
+        name = username = create_time = None
+        if cached is not None:
+            proc = cached[0]
+            try:
+                name = proc.name()
+                create_time = datetime.fromtimestamp(proc.create_time()).strftime('%Y-%m-%d %H:%M:%S')
+                username = proc.username()
+            except (psutil.Error, KeyError):
+                # 进程已退出或用户不存在（KeyError），保留已获取到的字段
+                pass
+        return {
+            'pid': pid,
+            'name': name,
+            'cpu_percent': round(cpu_percent, 1),
+            'memory_percent': round(memory_percent, 2),
+            'memory_rss': rss,
+            'io_rate': round(io_rate, 1),
+            'create_time': create_time,
+            'username': username
+        }
+
+
+# 进程内共享的本机进程采样器
+process_sampler = ProcessSampler()
+
+
+def publish_local_processes(app):
+    """
+    刷新本机进程表，并将占用CPU最多的进程写入共享文件（由采集器每轮调用）
+
+    Args:
+        app: Flask应用实例
+    """
+    from app.monitoring.status import status_dir
+
+    process_sampler.refresh()
+    processes = process_sampler.top(LOCAL_PROCESSES_COUNT)
+    try:
+        directory = status_dir(app)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.processes-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump({'sampled_at': time.time(), 'processes': processes}, f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, LOCAL_PROCESSES_FILE))
+    except OSError as e:
+        print(f'保存本机进程列表失败: {e}')
+
+
+def read_local_processes(app, max_age):
+    """
+    读取采集器写入的本机进程列表
+
+    Args:
+        app: Flask应用实例
+        max_age: 可接受的结果时长（秒）
+
+    Returns:
+        list: 进程信息列表（按CPU使用率降序），文件不存在或已过期时返回None
+    """
+    from app.monitoring.status import status_dir
+
+    try:
+        with open(os.path.join(status_dir(app), LOCAL_PROCESSES_FILE)) as f:
+            data = json.load(f)
+    except (OSError, ValueError):
+        return None
+    if time.time() - data['sampled_at'] > max_age:
+        return None
+    return data['processes']
+
+
+def parse_top_memory(value):
+    """
+    解析top输出中的RES列
+
+    Args:
+        value: 如 123456、1.2g
+
+    Returns:
+        int: 字节数
+    """
+    value = value.lower()
+    exponent = 1
+    if value and value[-1] in TOP_MEMORY_UNITS:
+        exponent = TOP_MEMORY_UNITS[value[-1]]
+        value = value[:-1]
+    return int(float(value) * 1024 ** exponent)
+
+
+def parse_top_output(output, limit=10):
+    """
+    解析top批处理模式的输出
+
+    Args:
+        output: top输出（从表头行开始解析，表头之前的汇总信息被忽略）
+        limit: 最多返回的进程数
+
+    Returns:
+        list: 进程信息列表（无IO速率），按CPU使用率降序
+    """
+    header = None
+    processes = []
+    for line in output.splitlines():
+        parts = line.split()
+        if header is None:
+            if parts and parts[0] == 'PID':
+                header = parts
+            continue
+        if len(parts) < len(header):
+            continue
+        # 最后一列为命令名，可能包含空格
+        fields = dict(zip(header[:-1], parts))
+        try:
+            processes.append({
+                'pid': int(fields['PID']),
+                'name': ' '.join(parts[len(header) - 1:]),
+                'username': fields.get('USER'),
+                'cpu_percent': float(fields['%CPU']),
+                'memory_percent': float(fields['%MEM']),
+                'memory_rss': parse_top_memory(fields['RES']),
+                'io_rate': None
+            })
+        except (KeyError, ValueError):
+            continue
+    processes.sort(key=itemgetter('cpu_percent'), reverse=True)
+    return processes[:limit]
+
+
+def collect_process_snapshot(server, limit=10):
+    """
+    采集服务器的进程快照
+
+    本机使用进程采样器（CPU、内存、IO各取前limit个），远程服务器执行一次top（按CPU取前limit个）。
+
+    Args:
+        server: 服务器对象
+        limit: 每项指标选取的进程数
+
+    Returns:
+        list: 进程信息列表，采集失败返回None
+    """
+    if is_local(server):
+        return process_sampler.snapshot(limit)
+
+    result = execute_remote_command(server, REMOTE_TOP_COMMAND.format(lines=limit + 8), timeout=10)
+    if result['returncode'] != 0:
+        return None
+    return parse_top_output(result['stdout'], limit)
+
+
+def pack_snapshot(processes):
+    """
+    将进程快照编码为紧凑JSON
+
+    Args:
+        processes: 进程信息列表
+
+    Returns:
+        str: JSON字符串，每个进程为一个按SNAPSHOT_FIELDS排列的数组
+    """
+    return json.dumps([[p.get(field) for field in SNAPSHOT_FIELDS] for p in processes],
+                      ensure_ascii=False, separators=(',', ':'))
+
+
+def unpack_snapshot(text):
+    """
+    解码pack_snapshot生成的JSON
+
+    Args:
+        text: JSON字符串
+
+    Returns:
+        list: 进程信息列表
+    """
+    return [dict(zip(SNAPSHOT_FIELDS, values)) for values in json.loads(text)]
+
+
+def process_leaderboard(snapshots, sort_key='cpu_percent', limit=20):
+    """
+    汇总一段时间内的进程快照，得到资源占用排行
+
+    同一进程（PID和进程名相同）在多个快照中出现时合并：CPU使用率给出平均值和最大值，
+    内存和IO给出最大值。平均值按该进程出现的快照计算。
+
+    Args:
+        snapshots: [(时间, 进程信息列表)]，按时间升序
+        sort_key: 排序字段，见SORT_KEYS（CPU按平均值排序，其余按最大值排序）
+        limit: 返回的进程数
+
+    Returns:
+        list: 进程排行列表
+    """
+    if sort_key not in SORT_KEYS:
+        raise ValueError(f'不支持的排序字段: {sort_key}')
+
+    merged = {}
+    for timestamp, processes in snapshots:
+        for p in processes:
+            key = (p['pid'], p['name'])
+            entry = merged.get(key)
+            if entry is None:
+                entry = merged[key] = {
+                    'pid': p['pid'],
+                    'name': p['name'],
+                    'username': p['username'],
+                    'samples': 0,
+                    'cpu_total': 0.0,
+                    'cpu_max': 0.0,
+                    'memory_percent': 0.0,
+                    'memory_rss': 0,
+                    'io_rate': None,
+                    'first_seen': timestamp,
+                    'last_seen': timestamp
+                }
+            entry['samples'] += 1
+            entry['cpu_total'] += p['cpu_percent'] or 0
+            entry['cpu_max'] = max(entry['cpu_max'], p['cpu_percent'] or 0)
+            entry['memory_percent'] = max(entry['memory_percent'], p['memory_percent'] or 0)
+            entry['memory_rss'] = max(entry['memory_rss'], p['memory_rss'] or 0)
+            if p['io_rate'] is not None:
+                entry['io_rate'] = max(entry['io_rate'] or 0, p['io_rate'])
+            entry['last_seen'] = timestamp
+
+    for entry in merged.values():
+        entry['cpu_percent'] = round(entry.pop('cpu_total') / entry['samples'], 1)
+
+    return heapq.nlargest(limit, merged.values(), key=lambda e: e[sort_key] or 0)
@@ -0,0 +1,405 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控数据共享内存环形缓冲区
+
+本模块在共享内存文件（默认位于/dev/shm）中为每台服务器维护一个定长的环形缓冲区，
+保存最近的监控样本。采集器进程写入，所有gunicorn工作进程通过mmap直接读取，
+图表请求读取热点时间窗口时无需查询数据库，也无需构建ORM对象。
+
+文件布局（小端）：
+    文件头（64字节）: magic(8s) 槽位数(I) 每槽容量(I) 每条记录字段数(I)
+    槽位表（每槽32字节）: 服务器ID(q) 序列号(Q) 累计写入条数(Q)
+    数据区: 每槽 容量 × 字段数 个float64
+
+写入使用序列锁：写入前后各将序列号加1，读取方发现序列号为奇数或前后不一致时重试。
+缓冲区只由采集器进程写入：监控代理推送的样本先由写入器写入数据库，再由采集器同步到缓冲区。
+读取方发现某台服务器的最新样本已过期时视为未命中，回退到数据库查询。
+numpy在首次打开缓冲区时才导入。
+"""
+
+import mmap
+import os
+import struct
+import tempfile
+import threading
+import time
+from datetime import datetime
+
+
+MAGIC = b'TPRING01'
+HEADER = struct.Struct('<8sIII')
+HEADER_SIZE = 64
+SLOT = struct.Struct('<qQQ')
+SLOT_SIZE = 32
+
+# 每条记录的字段（均为float64）
+RECORD_FIELDS = ('timestamp', 'cpu_usage', 'memory_usage', 'disk_usage',
+                 'network_rx', 'network_tx', 'uptime')
+
+# 读取时序列锁的最大重试次数
+READ_RETRIES = 16
+
+
+def default_path():
+    """
+    获取环形缓冲区文件的默认路径
+
+    Returns:
+        str: 优先使用/dev/shm，不存在时使用系统临时目录
+    """
+    directory = '/dev/shm' if os.path.isdir('/dev/shm') else tempfile.gettempdir()
+    return os.path.join(directory, 'tiny_panel_monitoring.ring')
+
+
+class RingBuffer:
+    """
+    共享内存环形缓冲区
+
+    Args:
+        path: 共享内存文件路径
+        slots: 槽位数（可容纳的服务器数量），仅创建文件时使用
+        capacity: 每台服务器保存的样本数，仅创建文件时使用
+        writable: 是否以写入方式打开（仅采集器进程使用）
+    """
+
+    def __init__(self, path, slots=256, capacity=8640, writable=False):
+        self.path = path
+        self.writable = writable
+        self.fields = len(RECORD_FIELDS)
+
+        if writable:
+            self._create_if_needed(slots, capacity)
+
+        fd = os.open(path, os.O_RDWR if writable else os.O_RDONLY)
+        try:
+            stat = os.fstat(fd)
+            size = stat.st_size
+            self.inode = stat.st_ino
+            access = mmap.ACCESS_WRITE if writable else mmap.ACCESS_READ
+            self._mmap = mmap.mmap(fd, size, access=access)
+        finally:
+            os.close(fd)
+
+        magic, self.slots, self.capacity, fields = HEADER.unpack_from(self._mmap, 0)
+        if magic != MAGIC or fields != self.fields:
+            self._mmap.close()
+            raise ValueError(f'环形缓冲区文件格式不匹配: {path}')
+
+        self._data_offset = HEADER_SIZE + self.slots * SLOT_SIZE
+        self._record_size = self.fields * 8
+        self._slot_index = {}
+        self._write_lock = threading.Lock()
+
+        import numpy as np
+
+        # 整个数据区的零拷贝视图：(槽位, 容量, 字段)
+        self._data = np.frombuffer(
+            self._mmap, dtype='<f8', count=self.slots * self.capacity * self.fields,
+            offset=self._data_offset
+        ).reshape(self.slots, self.capacity, self.fields)
+
+    def _create_if_needed(self, slots, capacity):
+        """文件不存在或格式不符时，原子地创建新的缓冲区文件"""
+        try:
+            with open(self.path, 'rb') as f:
+                magic, old_slots, old_capacity, fields = HEADER.unpack(f.read(HEADER.size))
+            if magic == MAGIC and (old_slots, old_capacity, fields) == (slots, capacity, self.fields):
+                return
+        except (OSError, struct.error):
+            pass
+
+        size = HEADER_SIZE + slots * SLOT_SIZE + slots * capacity * self.fields * 8
+        directory = os.path.dirname(self.path) or '.'
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tiny_panel_ring')
+        try:
+            os.ftruncate(fd, size)
+            os.pwrite(fd, HEADER.pack(MAGIC, slots, capacity, self.fields), 0)
+            os.fchmod(fd, 0o644)
+        finally:
+            os.close(fd)
+        os.replace(tmp_path, self.path)
+
+    def is_stale(self):
+        """
+        判断映射的文件是否已被替换（采集器重建了缓冲区文件）
+
+        Returns:
+            bool: 是否需要重新打开
+        """
+        try:
+            return os.stat(self.path).st_ino != self.inode
+        except OSError:
+            return True
+
+    def close(self):
+        """关闭内存映射"""
+        self._data = None
+        self._mmap.close()
+
+    def _slot_offset(self, slot):
+        return HEADER_SIZE + slot * SLOT_SIZE
+
+    def _read_slot(self, slot):
+        return SLOT.unpack_from(self._mmap, self._slot_offset(slot))
+
+    def find_slot(self, server_id, claim=False):
+        """
+        查找服务器对应的槽位（开放寻址，线性探测）
+
+        Args:
+            server_id: 服务器ID
+            claim: 未找到时是否占用一个空槽位（仅写入方）
+
+        Returns:
+            int: 槽位号，未找到或已满时返回None
+        """
+        slot = self._slot_index.get(server_id)
+        if slot is not None:
+            return slot
+
+        start = server_id % self.slots
+        for i in range(self.slots):
+            slot = (start + i) % self.slots
+            owner = self._read_slot(slot)[0]
+            if owner == server_id:
+                self._slot_index[server_id] = slot
+                return slot
+            if owner == 0:
+                if not claim:
+                    return None
+                SLOT.pack_into(self._mmap, self._slot_offset(slot), server_id, 0, 0)
+                self._slot_index[server_id] = slot
+                return slot
+        return None
+
+    def append(self, sample):
+        """
+        写入一个监控样本（仅采集器进程调用）
+
+        Args:
+            sample: 监控样本（dict，字段同RECORD_FIELDS，timestamp为datetime）
+
+        Returns:
+            bool: 是否写入成功（槽位已满时返回False）
+        """
+        with self._write_lock:
+            slot = self.find_slot(sample['server_id'], claim=True)
+            if slot is None:
+                return False
+
+            server_id, seq, head = self._read_slot(slot)
+            record = [sample['timestamp'].timestamp()] + [float(sample[f]) for f in RECORD_FIELDS[1:]]
+
+            offset = self._slot_offset(slot)
+            SLOT.pack_into(self._mmap, offset, server_id, seq + 1, head)
+            self._data[slot, head % self.capacity] = record
+            SLOT.pack_into(self._mmap, offset, server_id, seq + 2, head + 1)
+            return True
+
+    def extend(self, samples):
+        """
+        批量写入监控样本（按时间顺序）
+
+        Args:
+            samples: 监控样本列表
+
+        Returns:
+            int: 成功写入的样本数
+        """
+        written = 0
+        for sample in sorted(samples, key=lambda s: s['timestamp']):
+            if self.append(sample):
+                written += 1
+        return written
+
+    def has_data(self, server_id):
+        """
+        判断缓冲区中是否已有某台服务器的数据
+
+        Args:
+            server_id: 服务器ID
+
+        Returns:
+            bool: 是否有数据
+        """
+        slot = self.find_slot(server_id)
+        return slot is not None and self._read_slot(slot)[2] > 0
+
+    def latest_timestamp(self, server_id):
+        """
+        获取某台服务器最新样本的时间
+
+        Args:
+            server_id: 服务器ID
+
+        Returns:
+            float: 最新样本的时间（epoch秒），无数据时返回None
+        """
+        slot = self.find_slot(server_id)
+        if slot is None:
+            return None
+
+        offset = self._slot_offset(slot)
+        for _ in range(READ_RETRIES):
+            _, seq, head = SLOT.unpack_from(self._mmap, offset)
+            if seq % 2:
+                continue
+            if head == 0:
+                return None
+            latest = float(self._data[slot, (head - 1) % self.capacity, 0])
+            if SLOT.unpack_from(self._mmap, offset)[1] == seq:
+                return latest
+        return None
+
+    def read_since(self, server_id, since):
+        """
+        读取某台服务器在指定时间之后的样本
+
+        Args:
+            server_id: 服务器ID
+            since: 起始时间（epoch秒）
+
+        Returns:
+            tuple: (样本数组(N, 字段数), 缓冲区中最早样本的时间)；
+                   无数据时返回(None, None)
+        """
+        import numpy as np
+
+        slot = self.find_slot(server_id)
+        if slot is None:
+            return None, None
+
+        offset = self._slot_offset(slot)
+        for _ in range(READ_RETRIES):
+            _, seq, head = SLOT.unpack_from(self._mmap, offset)
+            if seq % 2:
+                continue
+            if head == 0:
+                return None, None
+
+            data = self._data[slot]
+            count = min(head, self.capacity)
+            index = head % self.capacity
+            # 按时间顺序排列的两段视图（不拷贝）
+            if head <= self.capacity:
+                segments = (data[:count],)
+            else:
+                segments = (data[index:], data[:index])
+
+            oldest = segments[0][0, 0]
+            parts = []
+            for segment in segments:
+                start = np.searchsorted(segment[:, 0], since, side='left')
+                if start < len(segment):
+                    parts.append(segment[start:])
+            result = np.concatenate(parts) if parts else np.empty((0, self.fields))
+
+            if SLOT.unpack_from(self._mmap, offset)[1] == seq:
+                return result, float(oldest)
+
+        return None, None
+
+
+_reader = None
+_reader_lock = threading.Lock()
+
+
+def stale_after(app):
+    """
+    获取缓冲区数据的过期时长
+
+    最新样本早于该时长的服务器（采集器已停止，或同步代理样本滞后）视为缓冲区未命中。
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        int: 过期时长（秒）
+    """
+    return max(app.config.get('MONITORING_INTERVAL', 10) * 3, 60)
+
+
+def open_writer(app):
+    """
+    以写入方式打开应用配置的环形缓冲区（采集器进程使用）
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        RingBuffer: 环形缓冲区，打开失败时返回None
+    """
+    try:
+        return RingBuffer(
+            app.config.get('MONITORING_RINGBUFFER_PATH') or default_path(),
+            slots=app.config.get('MONITORING_RINGBUFFER_SLOTS', 256),
+            capacity=app.config.get('MONITORING_RINGBUFFER_CAPACITY', 8640),
+            writable=True
+        )
+    except (OSError, ValueError) as e:
+        print(f'打开监控环形缓冲区失败: {e}')
+        return None
+
+
+def get_reader(app):
+    """
+    获取当前进程共享的只读环形缓冲区
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        RingBuffer: 环形缓冲区，文件尚未创建时返回None
+    """
+    global _reader
+    if _reader is not None and not _reader.is_stale():
+        return _reader
+
+    with _reader_lock:
+        if _reader is None or _reader.is_stale():
+            try:
+                _reader = RingBuffer(app.config.get('MONITORING_RINGBUFFER_PATH') or default_path())
+            except (OSError, ValueError):
+                return None
+    return _reader
+
+
+def read_recent_series(app, server_id, start_time, tolerance=0, after=None):
+    """
+    从环形缓冲区读取时间窗口内的监控数据
+
+    只有当缓冲区中最早的样本早于读取起点（允许tolerance秒误差）且最新样本未过期时才返回数据，
+    否则说明缓冲区未覆盖整个窗口或数据已过期，调用方应回退到数据库查询。
+
+    Args:
+        app: Flask应用实例
+        server_id: 服务器ID
+        start_time: 窗口起始时间
+        tolerance: 覆盖判断允许的误差（秒）
+        after: 只返回该时间之后（不含）的数据，用于增量查询
+
+    Returns:
+        list: (时间, CPU, 内存, 磁盘, 网络接收, 网络发送) 元组列表；未命中时返回None
+    """
+    ring = get_reader(app)
+    if ring is None:
+        return None
+
+    latest = ring.latest_timestamp(server_id)
+    if latest is None or time.time() - latest > stale_after(app):
+        return None
+
+    since = start_time.timestamp()
+    if after is not None:
+        since = max(since, after.timestamp() + 1e-6)
+    records, oldest = ring.read_since(server_id, since)
+    if records is None or oldest > since + tolerance:
+        return None
+
+    return [
+        (datetime.fromtimestamp(row[0]), row[1], row[2], row[3], row[4], row[5])
+        for row in records.tolist()
+    ]
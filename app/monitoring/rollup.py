@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控数据汇总
+
+本模块在写入监控样本时增量维护1分钟/5分钟/1小时三个粒度的汇总数据
+（最小值/平均值/最大值），按粒度执行数据保留策略，并为查询选择代价最低的数据层级。
+
+多个工作进程的写入器可能同时写入同一台服务器的同一分桶。SQLite和PostgreSQL上使用
+INSERT ... ON CONFLICT DO UPDATE，合并在数据库中完成，不会因并发插入违反唯一约束，
+也不会因并发更新丢失样本；其他数据库回退为读取后在Python中合并。
+"""
+
+from datetime import datetime, timedelta
+
+from flask import current_app
+from sqlalchemy import case
+
+
+# 汇总粒度（秒）
+ROLLUP_RESOLUTIONS = (60, 300, 3600)
+
+# 汇总的指标：(汇总列前缀, 样本字段)
+ROLLUP_METRICS = (
+    ('cpu', 'cpu_usage'),
+    ('memory', 'memory_usage'),
+    ('disk', 'disk_usage'),
+    ('network_rx', 'network_rx'),
+    ('network_tx', 'network_tx')
+)
+
+# 原始数据层级的粒度标记
+RAW_RESOLUTION = 0
+
+_EPOCH = datetime(1970, 1, 1)
+
+
+def bucket_start(timestamp, resolution):
+    """
+    计算时间戳所在分桶的起始时间
+
+    Args:
+        timestamp: 样本时间
+        resolution: 分桶粒度（秒）
+
+    Returns:
+        datetime: 分桶起始时间
+    """
+    offset = int((timestamp - _EPOCH).total_seconds()) % resolution
+    return timestamp.replace(microsecond=0) - timedelta(seconds=offset)
+
+
+def dialect_insert(model):
+    """
+    获取支持ON CONFLICT DO UPDATE的INSERT语句
+
+    Args:
+        model: 模型类
+
+    Returns:
+        Insert: SQLite或PostgreSQL方言的INSERT语句，其他数据库返回None
+    """
+    from app import db
+
+    name = db.session.get_bind().dialect.name
+    if name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    elif name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    else:
+        return None
+    return insert(model)
+
+
+def _upsert_rollups(stmt, grouped, resolution):
+    """将每个分桶的本批汇总值以一条upsert语句合并到汇总表（在数据库中计算合并结果）"""
+    from app import db
+
+    rows = []
+    for (server_id, bucket), bucket_samples in sorted(grouped.items()):
+        row = {'server_id': server_id, 'resolution': resolution, 'bucket': bucket,
+               'samples': len(bucket_samples)}
+        for prefix, field in ROLLUP_METRICS:
+            values = [float(sample[field]) for sample in bucket_samples]
+            row[f'{prefix}_min'] = min(values)
+            row[f'{prefix}_avg'] = sum(values) / len(values)
+            row[f'{prefix}_max'] = max(values)
+        rows.append(row)
+
+    table, new = stmt.table.c, stmt.excluded
+    total = table.samples + new.samples
+    update = {'samples': total}
+    for prefix, _ in ROLLUP_METRICS:
+        low, avg, high = f'{prefix}_min', f'{prefix}_avg', f'{prefix}_max'
+        update[low] = case((new[low] < table[low], new[low]), else_=table[low])
+        update[high] = case((new[high] > table[high], new[high]), else_=table[high])
+        update[avg] = (table[avg] * table.samples + new[avg] * new.samples) / total
+
+    db.session.execute(stmt.on_conflict_do_update(
+        index_elements=['server_id', 'resolution', 'bucket'], set_=update
+    ), rows)
+
+
+def _merge_value(row, prefix, value, samples):
+    """将一个样本值合并到汇总行的最小/平均/最大值中"""
+    setattr(row, f'{prefix}_min', min(getattr(row, f'{prefix}_min'), value))
+    setattr(row, f'{prefix}_max', max(getattr(row, f'{prefix}_max'), value))
+    avg = getattr(row, f'{prefix}_avg')
+    setattr(row, f'{prefix}_avg', avg + (value - avg) / samples)
+
+
+def update_rollups(samples):
+    """
+    将新样本增量合并到各粒度的汇总数据中（调用方负责提交事务）
+
+    Args:
+        samples: 监控样本列表（dict，字段同MonitoringData）
+    """
+    from app import db
+    from app.models import MonitoringRollup
+
+    if not samples:
+        return
+
+    stmt = dialect_insert(MonitoringRollup)
+    for resolution in ROLLUP_RESOLUTIONS:
+        grouped = {}
+        for sample in samples:
+            key = (sample['server_id'], bucket_start(sample['timestamp'], resolution))
+            grouped.setdefault(key, []).append(sample)
+
+        if stmt is not None:
+            _upsert_rollups(stmt, grouped, resolution)
+            continue
+
+        # 一次查询取出本批样本涉及的全部已有分桶
+        server_ids = {key[0] for key in grouped}
+        buckets = {key[1] for key in grouped}
+        existing = {
+            (row.server_id, row.bucket): row
+            for row in MonitoringRollup.query.filter(
+                MonitoringRollup.resolution == resolution,
+                MonitoringRollup.server_id.in_(server_ids),
+                MonitoringRollup.bucket.in_(buckets)
+            )
+        }
+
+        for (server_id, bucket), bucket_samples in grouped.items():
+            row = existing.get((server_id, bucket))
+            for sample in bucket_samples:
+                if row is None:
+                    row = MonitoringRollup(server_id=server_id, resolution=resolution,
+                                           bucket=bucket, samples=1)
+                    for prefix, field in ROLLUP_METRICS:
+                        value = float(sample[field])
+                        setattr(row, f'{prefix}_min', value)
+                        setattr(row, f'{prefix}_avg', value)
+                        setattr(row, f'{prefix}_max', value)
+                    db.session.add(row)
+                    continue
+
+                row.samples += 1
+                for prefix, field in ROLLUP_METRICS:
+                    _merge_value(row, prefix, float(sample[field]), row.samples)
+
+
+def get_retention():
+    """
+    获取各层级的数据保留时长
+
+    Returns:
+        dict: {粒度(秒): timedelta}，原始数据使用RAW_RESOLUTION
+    """
+    config = current_app.config.get('MONITORING_RETENTION', {})
+    retention = {RAW_RESOLUTION: timedelta(hours=config.get('raw', 48))}
+    for resolution in ROLLUP_RESOLUTIONS:
+        retention[resolution] = timedelta(hours=config.get(resolution, 24 * 365))
+    return retention
+
+
+def apply_retention(now=None):
+    """
+    删除超过保留时长的原始数据、汇总数据和进程快照
+
+    Args:
+        now: 当前时间，默认datetime.now()
+
+    Returns:
+        int: 删除的记录数
+    """
+    from app import db
+    from app.models import MonitoringData, MonitoringRollup, ProcessSnapshot
+
+    now = now or datetime.now()
+    retention = get_retention()
+    deleted = MonitoringData.query.filter(
+        MonitoringData.timestamp < now - retention[RAW_RESOLUTION]
+    ).delete(synchronize_session=False)
+
+    for resolution in ROLLUP_RESOLUTIONS:
+        deleted += MonitoringRollup.query.filter(
+            MonitoringRollup.resolution == resolution,
+            MonitoringRollup.bucket < now - retention[resolution]
+        ).delete(synchronize_session=False)
+
+    process_retention = timedelta(hours=current_app.config.get('MONITORING_PROCESS_RETENTION', 24 * 7))
+    deleted += ProcessSnapshot.query.filter(
+        ProcessSnapshot.timestamp < now - process_retention
+    ).delete(synchronize_session=False)
+
+    db.session.commit()
+    return deleted
+
+
+def choose_resolution(hours, interval=None):
+    """
+    为查询选择代价最低的数据层级
+
+    在保留时长覆盖查询窗口的层级中，选择不超过请求间隔的最粗粒度；
+    若请求间隔比所有可用层级都细，则选择覆盖窗口的最细粒度。
+
+    Args:
+        hours: 查询窗口（小时）
+        interval: 期望的数据点间隔（分钟），None表示使用原始数据
+
+    Returns:
+        int: 粒度（秒），RAW_RESOLUTION表示原始数据
+    """
+    retention = get_retention()
+    window = timedelta(hours=hours)
+    covering = [r for r in (RAW_RESOLUTION,) + ROLLUP_RESOLUTIONS if retention[r] >= window]
+    if not covering:
+        return ROLLUP_RESOLUTIONS[-1]
+
+    if interval is None:
+        return covering[0]
+
+    fitting = [r for r in covering if r <= interval * 60]
+    return fitting[-1] if fitting else covering[0]
+
+
+def query_series(server_id, start_time, resolution, after=None):
+    """
+    查询指定层级的监控数据序列
+
+    Args:
+        server_id: 服务器ID
+        start_time: 起始时间
+        resolution: 粒度（秒），RAW_RESOLUTION表示原始数据
+        after: 只返回该时间之后的数据，用于增量查询。汇总层级会包含after
+               所在的分桶，因为该分桶可能仍在累积新样本
+
+    Returns:
+        list: (时间, CPU, 内存, 磁盘, 网络接收, 网络发送) 元组列表，按时间升序
+    """
+    from app.models import MonitoringData, MonitoringRollup
+
+    if resolution == RAW_RESOLUTION:
+        query = MonitoringData.query.with_entities(
+            MonitoringData.timestamp,
+            MonitoringData.cpu_usage,
+            MonitoringData.memory_usage,
+            MonitoringData.disk_usage,
+            MonitoringData.network_in,
+            MonitoringData.network_out
+        ).filter(
+            MonitoringData.server_id == server_id,
+            MonitoringData.timestamp >= start_time
+        )
+        if after is not None:
+            query = query.filter(MonitoringData.timestamp > after)
+        query = query.order_by(MonitoringData.timestamp)
+    else:
+        if after is not None:
+            start_time = max(start_time, after)
+        query = MonitoringRollup.query.with_entities(
+            MonitoringRollup.bucket,
+            MonitoringRollup.cpu_avg,
+            MonitoringRollup.memory_avg,
+            MonitoringRollup.disk_avg,
+            MonitoringRollup.network_rx_avg,
+            MonitoringRollup.network_tx_avg
+        ).filter(
+            MonitoringRollup.server_id == server_id,
+            MonitoringRollup.resolution == resolution,
+            MonitoringRollup.bucket >= bucket_start(start_time, resolution)
+        ).order_by(MonitoringRollup.bucket)
+
+    return query.all()
+
+
+def query_rollup_summary(server_ids, start_time, resolution=3600):
+    """
+    用一次查询获取多台服务器的汇总数据（平均值和最大值）
+
+    Args:
+        server_ids: 服务器ID列表
+        start_time: 起始时间
+        resolution: 汇总粒度（秒），默认1小时
+
+    Returns:
+        list: (服务器ID, 分桶时间, CPU平均, CPU最大, 内存平均, 内存最大, 磁盘平均, 磁盘最大,
+               网络接收平均, 网络接收最大, 网络发送平均, 网络发送最大) 元组列表，按服务器和时间升序
+    """
+    from app.models import MonitoringRollup
+
+    if not server_ids:
+        return []
+
+    columns = [MonitoringRollup.server_id, MonitoringRollup.bucket]
+    for prefix, _ in ROLLUP_METRICS:
+        columns.append(getattr(MonitoringRollup, f'{prefix}_avg'))
+        columns.append(getattr(MonitoringRollup, f'{prefix}_max'))
+
+    return MonitoringRollup.query.with_entities(*columns).filter(
+        MonitoringRollup.resolution == resolution,
+        MonitoringRollup.server_id.in_(server_ids),
+        MonitoringRollup.bucket >= bucket_start(start_time, resolution)
+    ).order_by(MonitoringRollup.server_id, MonitoringRollup.bucket).all()
@@ -8,16 +8,15 @@ Tiny Panel - Linux服务器管理面板
 本模块提供监控相关的路由和视图函数，包括服务器状态监控、资源使用情况等功能。
 """
 
-from flask import render_template, jsonify, request, current_app
-from flask_login import login_required
+from flask import render_template, jsonify, request, current_app, Response, stream_with_context, url_for
+from flask_login import login_required, current_user
 from datetime import datetime, timedelta
 import time
 
 from app import db
-from app.models import Server, MonitoringData
+from app.models import Server, ServerLatestSample, ServerProbe, ProcessSnapshot
 from app.monitoring import monitoring_bp
 from app.monitoring.utils import (
-    get_server_status, 
     get_cpu_usage, 
     get_memory_usage, 
     get_disk_usage, 
@@ -25,6 +24,24 @@ from app.monitoring.utils import (
     get_process_list,
     collect_monitoring_data
 )
+from app.monitoring.rollup import choose_resolution, query_series, RAW_RESOLUTION, ROLLUP_RESOLUTIONS
+from app.monitoring.ringbuffer import read_recent_series
+from app.monitoring.downsample import downsample_rows
+from app.monitoring.processes import SORT_KEYS, unpack_snapshot, process_leaderboard
+from app.monitoring.prober import cached_server_status
+from app.monitoring.stream import stream_monitoring_events, acquire_stream_slot, release_stream_slot
+from app.monitoring.agent import (
+    agent_token,
+    verify_agent_token,
+    decode_payload,
+    parse_samples,
+    record_heartbeat
+)
+from app.monitoring.writer import get_writer
+from app.monitoring.status import publish_status, read_status
+from app.executor import get_executor
+from app.ssh_pool import get_ssh_pool
+from app.utils import admin_required, is_admin
 
 
 @monitoring_bp.route('/')
@@ -33,22 +50,17 @@ def index():
     """
     监控管理首页
     """
-    # 获取所有服务器
-    servers = Server.query.all()
-    
-    # 获取监控数据（最近1小时）
-    one_hour_ago = datetime.now() - timedelta(hours=1)
+    # 一次查询取出所有服务器及其最新监控数据和探测结果
+    rows = db.session.query(Server, ServerLatestSample, ServerProbe).outerjoin(
+        ServerLatestSample, ServerLatestSample.server_id == Server.id
+    ).outerjoin(
+        ServerProbe, ServerProbe.server_id == Server.id
+    ).all()
     
-    # 为每个服务器获取最新的监控数据
     servers_with_status = []
-    for server in servers:
-        # 获取服务器状态
-        status = get_server_status(server)
-        
-        # 获取最新的监控数据
-        latest_data = MonitoringData.query.filter_by(
-            server_id=server.id
-        ).order_by(MonitoringData.timestamp.desc()).first()
+    for server, latest_data, probe in rows:
+        # 与服务器页面和状态API一致，从探测缓存获取服务器状态，页面加载时不进行网络探测
+        status = cached_server_status(server, latest_data, probe)
         
         # 如果没有监控数据，使用模拟数据
         if not latest_data:
@@ -86,16 +98,15 @@ def server_monitoring(server_id):
     # 获取服务器信息
     server = Server.query.get_or_404(server_id)
     
-    # 获取服务器状态
-    status = get_server_status(server)
+    # 从探测缓存获取服务器状态，页面加载时不进行网络探测
+    status = cached_server_status(server)
     
-    # 获取最近24小时的监控数据
+    # 获取最近24小时的监控数据（优先读取共享内存环形缓冲区）
     twenty_four_hours_ago = datetime.now() - timedelta(days=1)
-    monitoring_data = MonitoringData.query.filter_by(
-        server_id=server_id
-    ).filter(
-        MonitoringData.timestamp >= twenty_four_hours_ago
-    ).order_by(MonitoringData.timestamp).all()
+    rows = read_recent_series(current_app, server_id, twenty_four_hours_ago,
+                              tolerance=current_app.config.get('MONITORING_INTERVAL', 10))
+    if rows is None:
+        rows = query_series(server_id, twenty_four_hours_ago, RAW_RESOLUTION)
     
     # 准备图表数据
     timestamps = []
@@ -105,13 +116,13 @@ def server_monitoring(server_id):
     network_rx_data = []
     network_tx_data = []
     
-    for data in monitoring_data:
-        timestamps.append(data.timestamp.strftime('%Y-%m-%d %H:%M:%S'))
-        cpu_data.append(data.cpu_usage)
-        memory_data.append(data.memory_usage)
-        disk_data.append(data.disk_usage)
-        network_rx_data.append(data.network_rx)
-        network_tx_data.append(data.network_tx)
+    for timestamp, cpu_usage, memory_usage, disk_usage, network_rx, network_tx in rows:
+        timestamps.append(timestamp.strftime('%Y-%m-%d %H:%M:%S'))
+        cpu_data.append(cpu_usage)
+        memory_data.append(memory_usage)
+        disk_data.append(disk_usage)
+        network_rx_data.append(network_rx)
+        network_tx_data.append(network_tx)
     
     # 获取进程列表（仅当服务器在线时）
     processes = []
@@ -140,21 +151,11 @@ def api_server_status(server_id):
     # 获取服务器信息
     server = Server.query.get_or_404(server_id)
     
-    # 获取服务器状态
-    status = get_server_status(server)
-    
-    # 获取最新的监控数据
-    latest_data = MonitoringData.query.filter_by(
-        server_id=server_id
-    ).order_by(MonitoringData.timestamp.desc()).first()
-    
-    # 收集最新的监控数据
-    collect_monitoring_data(server)
+    # 读取后台采集器已写入的最新监控数据
+    updated_data = ServerLatestSample.query.get(server_id)
     
-    # 获取更新后的监控数据
-    updated_data = MonitoringData.query.filter_by(
-        server_id=server_id
-    ).order_by(MonitoringData.timestamp.desc()).first()
+    # 从探测缓存获取服务器状态
+    status = cached_server_status(server, updated_data)
     
     # 准备响应数据
     response_data = {
@@ -174,39 +175,82 @@ def api_server_status(server_id):
 def api_monitoring_data(server_id):
     """
     获取服务器监控数据的API
+
+    支持增量查询：传入since（epoch秒）或上次响应返回的cursor时，只返回更新的数据点。
+    响应中的seq为最新数据点时间的微秒数，对同一服务器单调递增；cursor同时记录了
+    数据层级，使用cursor续查时层级保持不变。汇总层级的最后一个分桶仍在累积样本，
+    续查时会重复返回，客户端应以相同时间戳的数据点覆盖旧值。
+
+    传入max_points时，数据点超过该数量的序列会在服务端降采样。
     """
     # 获取查询参数
     hours = request.args.get('hours', default=24, type=int)
     interval = request.args.get('interval', default=60, type=int)  # 分钟
+    since = request.args.get('since', type=float)
+    cursor = request.args.get('cursor')
+    max_points = request.args.get('max_points', type=int)
     
     # 计算时间范围
     start_time = datetime.now() - timedelta(hours=hours)
     
-    # 获取监控数据
-    monitoring_data = MonitoringData.query.filter_by(
-        server_id=server_id
-    ).filter(
-        MonitoringData.timestamp >= start_time
-    ).order_by(MonitoringData.timestamp).all()
+    # 根据时间范围和间隔选择代价最低的数据层级（原始数据或汇总数据）
+    resolution = choose_resolution(hours, interval)
+    seq = None
+    try:
+        if cursor:
+            resolution, seq = (int(part) for part in cursor.split(':', 1))
+            if resolution not in (RAW_RESOLUTION,) + ROLLUP_RESOLUTIONS:
+                raise ValueError(f'无效的数据层级: {resolution}')
+            since = seq / 1000000
+        elif since is not None:
+            seq = int(since * 1000000)
+        after = _parse_time(since) if since is not None else None
+    except (ValueError, OverflowError):
+        # 超出时间范围的since或cursor（如since=1e20）和未知的数据层级与格式错误同样处理
+        return jsonify({'success': False, 'message': '无效的since或cursor参数'}), 400
+    
+    rows = None
+    if resolution == RAW_RESOLUTION:
+        # 原始数据的热点窗口优先读取共享内存环形缓冲区
+        rows = read_recent_series(current_app, server_id, start_time,
+                                  tolerance=current_app.config.get('MONITORING_INTERVAL', 10),
+                                  after=after)
+    if rows is None:
+        rows = query_series(server_id, start_time, resolution, after=after)
+    
+    # 数据点过多时按LTTB算法降采样，保留峰值形状
+    if max_points:
+        rows = downsample_rows(rows, max(max_points, 3))
     
     # 准备图表数据
     timestamps = []
+    epochs = []
     cpu_data = []
     memory_data = []
     disk_data = []
     network_rx_data = []
     network_tx_data = []
     
-    for data in monitoring_data:
-        timestamps.append(data.timestamp.strftime('%Y-%m-%d %H:%M:%S'))
-        cpu_data.append(data.cpu_usage)
-        memory_data.append(data.memory_usage)
-        disk_data.append(data.disk_usage)
-        network_rx_data.append(data.network_rx)
-        network_tx_data.append(data.network_tx)
+    for timestamp, cpu_usage, memory_usage, disk_usage, network_rx, network_tx in rows:
+        timestamps.append(timestamp.strftime('%Y-%m-%d %H:%M:%S'))
+        epochs.append(timestamp.timestamp())
+        cpu_data.append(cpu_usage)
+        memory_data.append(memory_usage)
+        disk_data.append(disk_usage)
+        network_rx_data.append(network_rx)
+        network_tx_data.append(network_tx)
+    
+    # 没有新数据时保持原序列号，客户端可原样续查
+    if epochs:
+        seq = max(seq or 0, round(epochs[-1] * 1000000))
     
     return jsonify({
+        'resolution': resolution,
+        'seq': seq,
+        'cursor': f'{resolution}:{seq}' if seq is not None else None,
+        'incremental': after is not None,
         'timestamps': timestamps,
+        'epochs': epochs,
         'cpu_data': cpu_data,
         'memory_data': memory_data,
         'disk_data': disk_data,
@@ -229,6 +273,106 @@ def api_process_list(server_id):
     return jsonify(processes)
 
 
+def _parse_time(value):
+    """
+    解析查询参数中的时间（epoch秒或ISO格式）
+
+    带时区的ISO时间转换为本地时间并去掉时区信息，与数据库中的时间（本地时间，不带时区）保持一致。
+
+    Raises:
+        ValueError: 格式无效或超出范围
+    """
+    try:
+        return datetime.fromtimestamp(float(value))
+    except (OverflowError, OSError) as e:
+        raise ValueError(str(e))
+    except ValueError:
+        if not isinstance(value, str):
+            raise
+        parsed = datetime.fromisoformat(value)
+        if parsed.tzinfo is not None:
+            try:
+                parsed = parsed.astimezone().replace(tzinfo=None)
+            except (OverflowError, OSError) as e:
+                raise ValueError(str(e))
+        return parsed
+
+
+@monitoring_bp.route('/api/process_history/<int:server_id>')
+@login_required
+def api_process_history(server_id):
+    """
+    查询历史进程快照的API
+
+    传入at（epoch秒或ISO时间）时返回离该时刻最近的一个快照；
+    传入start和end时返回该时间段内的进程排行，同一进程在多个快照中出现时合并。
+    sort为排序字段（cpu_percent、memory_percent、memory_rss、io_rate），limit为返回的进程数。
+    """
+    server = Server.query.get_or_404(server_id)
+    sort_key = request.args.get('sort', 'cpu_percent')
+    limit = max(1, min(request.args.get('limit', 20, type=int), 200))
+    if sort_key not in SORT_KEYS:
+        return jsonify({'success': False, 'message': '无效的sort参数'}), 400
+
+    try:
+        at = _parse_time(request.args['at']) if request.args.get('at') else None
+        start = _parse_time(request.args['start']) if request.args.get('start') else None
+        end = _parse_time(request.args['end']) if request.args.get('end') else datetime.now()
+    except ValueError:
+        return jsonify({'success': False, 'message': '无效的时间参数'}), 400
+
+    query = ProcessSnapshot.query.filter(ProcessSnapshot.server_id == server.id)
+
+    if at is not None:
+        # 取该时刻前后最近的快照中距离较近的一个，相差超过两个快照周期视为没有快照
+        before = query.filter(ProcessSnapshot.timestamp <= at).order_by(ProcessSnapshot.timestamp.desc()).first()
+        after = query.filter(ProcessSnapshot.timestamp > at).order_by(ProcessSnapshot.timestamp).first()
+        candidates = [s for s in (before, after) if s is not None]
+        snapshot = min(candidates, key=lambda s: abs(s.timestamp - at), default=None)
+        tolerance = timedelta(seconds=2 * max(current_app.config.get('MONITORING_PROCESS_SNAPSHOT_INTERVAL', 60),
+                                              current_app.config.get('MONITORING_INTERVAL', 10)))
+        if snapshot is None or abs(snapshot.timestamp - at) > tolerance:
+            return jsonify({'success': False, 'message': '该时刻没有进程快照'}), 404
+
+        processes = unpack_snapshot(snapshot.processes)
+        processes.sort(key=lambda p: p[sort_key] or 0, reverse=True)
+        return jsonify({
+            'success': True,
+            'server_id': server.id,
+            'timestamp': snapshot.timestamp.strftime('%Y-%m-%d %H:%M:%S'),
+            'epoch': snapshot.timestamp.timestamp(),
+            'processes': processes[:limit]
+        })
+
+    if start is None:
+        return jsonify({'success': False, 'message': '请指定at或start参数'}), 400
+    if start > end:
+        return jsonify({'success': False, 'message': '开始时间晚于结束时间'}), 400
+
+    rows = query.filter(
+        ProcessSnapshot.timestamp >= start,
+        ProcessSnapshot.timestamp <= end
+    ).order_by(ProcessSnapshot.timestamp).with_entities(
+        ProcessSnapshot.timestamp, ProcessSnapshot.processes
+    ).all()
+    snapshots = [(timestamp, unpack_snapshot(processes)) for timestamp, processes in rows]
+
+    leaderboard = process_leaderboard(snapshots, sort_key, limit)
+    for entry in leaderboard:
+        entry['first_seen'] = entry['first_seen'].strftime('%Y-%m-%d %H:%M:%S')
+        entry['last_seen'] = entry['last_seen'].strftime('%Y-%m-%d %H:%M:%S')
+
+    return jsonify({
+        'success': True,
+        'server_id': server.id,
+        'start': start.strftime('%Y-%m-%d %H:%M:%S'),
+        'end': end.strftime('%Y-%m-%d %H:%M:%S'),
+        'snapshots': len(snapshots),
+        'timestamps': [timestamp.strftime('%Y-%m-%d %H:%M:%S') for timestamp, _ in snapshots],
+        'processes': leaderboard
+    })
+
+
 @monitoring_bp.route('/collect_data/<int:server_id>')
 def collect_data(server_id):
     """
@@ -244,3 +388,130 @@ def collect_data(server_id):
         return jsonify({'success': True, 'message': '监控数据收集成功'})
     else:
         return jsonify({'success': False, 'message': '监控数据收集失败'})
+
+
+@monitoring_bp.route('/api/collector_status')
+@login_required
+def api_collector_status():
+    """
+    获取后台采集器、探测器、批量写入器和命令执行器状态的API
+
+    采集器、探测器和写入器的状态读取自各工作进程共享的状态文件，
+    命令执行器和SSH连接池为处理本请求的进程的统计信息。
+    """
+    app = current_app._get_current_object()
+    publish_status(app)
+    status = read_status(app)
+    collector = status['collector']
+    
+    return jsonify({
+        'collector': collector or {
+            'running': False,
+            'interval': None,
+            'last_run': None,
+            'last_duration': None,
+            'last_cycle': {}
+        },
+        'prober': status['prober'],
+        'writer': status['writer'],
+        'executor': get_executor().stats(),
+        'ssh_pool': get_ssh_pool().stats()
+    })
+
+
+@monitoring_bp.route('/api/ingest', methods=['POST'])
+def api_ingest():
+    """
+    接收监控代理批量推送的监控数据
+    
+    请求头X-Server-Id指定服务器，Authorization: Bearer <代理令牌>用于认证；
+    请求体为JSON（可使用Content-Encoding: gzip压缩）：
+    {"agent_version": "...", "interval": 推送周期(秒), "samples": [{"timestamp": epoch秒, ...}, ...]}
+    """
+    server_id = request.headers.get('X-Server-Id', type=int)
+    auth = request.headers.get('Authorization', '')
+    token = auth[7:] if auth.startswith('Bearer ') else ''
+    if server_id is None or not verify_agent_token(server_id, token):
+        return jsonify({'success': False, 'message': '代理认证失败'}), 401
+    
+    if db.session.get(Server, server_id) is None:
+        return jsonify({'success': False, 'message': '服务器不存在'}), 404
+    
+    try:
+        payload = decode_payload(request.get_data(cache=False), request.headers.get('Content-Encoding'))
+        samples = parse_samples(server_id, payload,
+                                current_app.config.get('MONITORING_INGEST_MAX_SAMPLES', 1000))
+    except ValueError as e:
+        return jsonify({'success': False, 'message': f'数据格式错误: {e}'}), 400
+    
+    # 样本交给批量写入器写入数据库，请求只提交心跳
+    get_writer(current_app._get_current_object()).submit(samples)
+    try:
+        record_heartbeat(server_id, payload, len(samples))
+        db.session.commit()
+    except Exception as e:
+        db.session.rollback()
+        print(f'更新代理心跳失败: {e}')
+    
+    return jsonify({'success': True, 'accepted': len(samples)})
+
+
+@monitoring_bp.route('/api/agent_token/<int:server_id>')
+@login_required
+@admin_required
+def api_agent_token(server_id):
+    """
+    获取服务器监控代理令牌的API（仅管理员）
+    """
+    server = Server.query.get_or_404(server_id)
+    
+    return jsonify({
+        'server_id': server.id,
+        'token': agent_token(server.id),
+        'ingest_url': url_for('monitoring.api_ingest', _external=True)
+    })
+
+
+@monitoring_bp.route('/api/stream')
+@login_required
+def api_stream():
+    """
+    实时推送监控数据的API（Server-Sent Events）
+    
+    查询参数servers为逗号分隔的服务器ID，省略时订阅当前用户可见的全部服务器
+    （管理员可见所有服务器，其他用户只能订阅自己的服务器）；
+    断线重连时根据Last-Event-ID只推送之后的新样本。
+    每个工作进程同时保持的推送连接数受MONITORING_STREAM_MAX_PER_WORKER限制，超出时返回503。
+    """
+    query = db.session.query(Server.id)
+    if not is_admin():
+        query = query.filter(Server.user_id == current_user.id)
+    requested = {int(i) for i in request.args.get('servers', '').split(',') if i.strip().isdigit()}
+    if requested:
+        query = query.filter(Server.id.in_(requested))
+    server_ids = [server_id for server_id, in query.all()]
+    if requested and not server_ids:
+        return jsonify({'success': False, 'message': '没有可订阅的服务器'}), 404
+    
+    # 起始时间：优先使用重连时的Last-Event-ID，否则只推送之后的新数据
+    since = request.headers.get('Last-Event-ID') or request.args.get('since')
+    try:
+        since = float(since)
+    except (TypeError, ValueError):
+        since = time.time()
+    
+    # 推送连接长期占用工作线程，超出上限时让浏览器稍后重连，保留线程处理其他请求
+    if not acquire_stream_slot(current_app.config.get('MONITORING_STREAM_MAX_PER_WORKER', 8)):
+        response = jsonify({'success': False, 'message': '实时推送连接数已达上限，请稍后重试'})
+        response.status_code = 503
+        response.headers['Retry-After'] = '30'
+        return response
+    
+    app = current_app._get_current_object()
+    response = Response(
+        stream_with_context(stream_monitoring_events(app, server_ids, since)),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+    response.call_on_close(release_stream_slot)
+    return response
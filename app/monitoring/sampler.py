@@ -0,0 +1,200 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控速率采样器
+
+本模块在内存中保存每台服务器上一次的CPU时间和网络计数器快照，
+通过与上次快照的差值计算CPU使用率和网络速率，读取时无需sleep等待。
+"""
+
+import threading
+import time
+
+
+# CPU时间中属于空闲的字段（/proc/stat中的idle和iowait）
+CPU_IDLE_FIELDS = ('idle', 'iowait')
+
+
+def parse_proc_stat_cpu(content):
+    """
+    解析/proc/stat中的cpu汇总行
+
+    Args:
+        content: /proc/stat的内容（至少包含首行）
+
+    Returns:
+        dict: 各项CPU时间（jiffies），解析失败返回None
+    """
+    fields = ('user', 'nice', 'system', 'idle', 'iowait', 'irq', 'softirq', 'steal')
+    for line in content.splitlines():
+        parts = line.split()
+        if parts and parts[0] == 'cpu':
+            values = [float(v) for v in parts[1:len(fields) + 1]]
+            return dict(zip(fields, values))
+    return None
+
+
+def parse_proc_net_dev(content):
+    """
+    解析/proc/net/dev，汇总除回环接口外的收发字节数
+
+    Args:
+        content: /proc/net/dev的内容
+
+    Returns:
+        tuple: (接收字节数, 发送字节数)
+    """
+    bytes_recv = 0
+    bytes_sent = 0
+    for line in content.splitlines():
+        if ':' not in line:
+            continue
+        name, data = line.split(':', 1)
+        if name.strip() == 'lo':
+            continue
+        parts = data.split()
+        if len(parts) >= 9:
+            bytes_recv += int(parts[0])
+            bytes_sent += int(parts[8])
+    return bytes_recv, bytes_sent
+
+
+class RateSampler:
+    """
+    基于快照差值的速率采样器
+
+    每个key（通常是服务器）保存上一次的计数器快照。两次读取间隔小于
+    min_interval时直接返回上次计算的结果，避免并发请求把采样窗口切得过短。
+
+    Args:
+        min_interval: 最小采样窗口（秒）
+    """
+
+    def __init__(self, min_interval=1.0):
+        self.min_interval = min_interval
+        self._snapshots = {}
+        self._results = {}
+        self._lock = threading.Lock()
+
+    def _update(self, key, counters, compute, now=None):
+        """
+        用新的计数器快照更新key，并根据差值计算结果
+
+        Args:
+            key: 快照键
+            counters: 当前计数器（dict）
+            compute: 计算函数 compute(previous, current, elapsed)，previous可能为None
+            now: 当前时间（单调时钟秒），默认time.monotonic()
+
+        Returns:
+            计算结果
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            previous = self._snapshots.get(key)
+            if previous is not None and now - previous[0] < self.min_interval and key in self._results:
+                return self._results[key]
+
+            if previous is None:
+                result = compute(None, counters, 0)
+            else:
+                result = compute(previous[1], counters, now - previous[0])
+
+            self._snapshots[key] = (now, counters)
+            self._results[key] = result
+            return result
+
+    def cpu_percent(self, key, cpu_times, now=None):
+        """
+        根据CPU时间快照计算CPU使用率
+
+        首次采样没有上一次快照时，返回自开机以来的平均使用率。
+
+        Args:
+            key: 快照键
+            cpu_times: 各项CPU时间（dict，需包含idle字段）
+            now: 当前时间（单调时钟秒）
+
+        Returns:
+            float: CPU使用率（百分比）
+        """
+        def compute(previous, current, elapsed):
+            previous = previous or {}
+            total = sum(current.values()) - sum(previous.values())
+            idle = sum(current.get(f, 0) - previous.get(f, 0) for f in CPU_IDLE_FIELDS)
+            if total <= 0:
+                return 0.0
+            return round(max(0.0, min(100.0, (1 - idle / total) * 100)), 1)
+
+        return self._update(('cpu', key), dict(cpu_times), compute, now)
+
+    def net_rates(self, key, bytes_recv, bytes_sent, now=None):
+        """
+        根据网络计数器快照计算每秒收发字节数
+
+        首次采样或计数器回绕（如重启）时返回(0, 0)。
+
+        Args:
+            key: 快照键
+            bytes_recv: 累计接收字节数
+            bytes_sent: 累计发送字节数
+            now: 当前时间（单调时钟秒）
+
+        Returns:
+            tuple: (每秒接收字节数, 每秒发送字节数)
+        """
+        def compute(previous, current, elapsed):
+            if previous is None or elapsed <= 0:
+                return (0, 0)
+            recv = current['recv'] - previous['recv']
+            sent = current['sent'] - previous['sent']
+            if recv < 0 or sent < 0:
+                return (0, 0)
+            return (recv / elapsed, sent / elapsed)
+
+        return self._update(('net', key), {'recv': bytes_recv, 'sent': bytes_sent}, compute, now)
+
+    def forget(self, key):
+        """
+        删除某个key的全部快照
+
+        Args:
+            key: 快照键
+        """
+        with self._lock:
+            for kind in ('cpu', 'net'):
+                self._snapshots.pop((kind, key), None)
+                self._results.pop((kind, key), None)
+
+
+# 进程内共享的采样器实例
+rate_sampler = RateSampler()
+
+
+def local_cpu_percent():
+    """
+    获取本机CPU使用率（非阻塞）
+
+    Returns:
+        float: CPU使用率（百分比）
+    """
+    import psutil
+    cpu_times = psutil.cpu_times()._asdict()
+    # guest时间已计入user/nice，需剔除避免重复计算
+    cpu_times.pop('guest', None)
+    cpu_times.pop('guest_nice', None)
+    return rate_sampler.cpu_percent('localhost', cpu_times)
+
+
+def local_net_rates():
+    """
+    获取本机网络速率（非阻塞）
+
+    Returns:
+        tuple: (每秒接收字节数, 每秒发送字节数)
+    """
+    import psutil
+    counters = psutil.net_io_counters()
+    return rate_sampler.net_rates('localhost', counters.bytes_recv, counters.bytes_sent)
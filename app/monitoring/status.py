@@ -0,0 +1,148 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控组件状态共享
+
+采集器、探测器和批量写入器的统计信息保存在各自进程的内存中，gunicorn多进程部署时
+只有持有采集锁的工作进程运行采集器，而每个接收过代理推送的工作进程都有自己的写入器。
+各进程将状态写入状态目录下以进程ID命名的JSON文件，状态API读取并合并所有进程的文件，
+无论请求由哪个工作进程处理，结果都一致。
+"""
+
+import json
+import os
+import re
+import tempfile
+import time
+
+
+# 进程状态文件名
+STATUS_FILE_PATTERN = re.compile(r'^status-(\d+)\.json$')
+
+# 合并写入器统计时累加的字段和取最大值的字段
+WRITER_SUM_FIELDS = ('queue_depth', 'written', 'dropped', 'failed', 'flushes')
+WRITER_MAX_FIELDS = ('last_flush_at', 'max_flush_latency_ms')
+
+
+def status_dir(app):
+    """获取状态目录（不存在时创建）"""
+    path = app.config.get('MONITORING_STATUS_DIR') or \
+        os.path.join(tempfile.gettempdir(), 'tiny_panel_monitoring_status')
+    os.makedirs(path, exist_ok=True)
+    return path
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass
+    return True
+
+
+def process_status(app):
+    """
+    获取当前进程中采集器、探测器和写入器的状态
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        dict: 当前进程的状态
+    """
+    collector = app.extensions.get('monitoring_collector')
+    writer = app.extensions.get('monitoring_writer')
+    running = bool(collector and collector.running)
+    prober = collector.prober if running else None
+
+    return {
+        'pid': os.getpid(),
+        'updated': time.time(),
+        'collector': {
+            'running': True,
+            'interval': collector.interval,
+            'last_run': collector.last_run,
+            'last_duration': collector.last_duration,
+            'last_cycle': collector.last_cycle
+        } if running else None,
+        'prober': {
+            'running': prober.running,
+            'interval': prober.interval,
+            'last_run': prober.last_run,
+            'last_duration': prober.last_duration
+        } if prober else None,
+        'writer': writer.stats() if writer else None
+    }
+
+
+def publish_status(app):
+    """
+    将当前进程的状态写入状态文件
+
+    Args:
+        app: Flask应用实例
+    """
+    try:
+        directory = status_dir(app)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.status-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(process_status(app), f, ensure_ascii=False)
+        os.replace(tmp_path, os.path.join(directory, f'status-{os.getpid()}.json'))
+    except Exception as e:
+        print(f'保存监控组件状态失败: {e}')
+
+
+def read_status(app):
+    """
+    读取并合并所有进程的状态，删除已退出进程的状态文件
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        dict: 采集器和探测器状态（取自运行采集器的进程）、合并后的写入器统计和各进程的写入器统计
+    """
+    directory = status_dir(app)
+    statuses = []
+    for filename in os.listdir(directory):
+        match = STATUS_FILE_PATTERN.match(filename)
+        if not match:
+            continue
+        path = os.path.join(directory, filename)
+        if not _pid_alive(int(match.group(1))):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            continue
+        try:
+            with open(path) as f:
+                statuses.append(json.load(f))
+        except (OSError, ValueError):
+            continue
+
+    leader = max((s for s in statuses if s.get('collector')), key=lambda s: s['updated'], default=None)
+
+    writers = [dict(s['writer'], pid=s['pid']) for s in statuses if s.get('writer')]
+    writer = None
+    if writers:
+        writer = {field: sum(w[field] for w in writers) for field in WRITER_SUM_FIELDS}
+        for field in WRITER_MAX_FIELDS:
+            writer[field] = max((w[field] for w in writers if w[field] is not None), default=None)
+        # 最近一次写入的数量和耗时取自最后写入的进程
+        latest = max(writers, key=lambda w: w['last_flush_at'] or 0)
+        writer['last_flush_size'] = latest['last_flush_size']
+        writer['last_flush_latency_ms'] = latest['last_flush_latency_ms']
+        total = sum(w['avg_flush_latency_ms'] * w['flushes'] for w in writers)
+        writer['avg_flush_latency_ms'] = round(total / writer['flushes'], 2) if writer['flushes'] else 0
+        writer['workers'] = writers
+
+    return {
+        'collector': dict(leader['collector'], pid=leader['pid'], updated=leader['updated']) if leader else None,
+        'prober': leader['prober'] if leader else None,
+        'writer': writer
+    }
@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控数据实时推送
+
+本模块以Server-Sent Events（SSE）格式推送客户端订阅的服务器的新监控样本和状态变化，
+替代页面的定时轮询。数据优先从共享内存环形缓冲区读取，缓冲区不可用、其中没有某台服务器的数据
+或数据已过期时，回退为定期查询最新样本表。
+
+每个连接在MONITORING_STREAM_MAX_DURATION秒后主动结束，浏览器的EventSource会携带
+Last-Event-ID自动重连并从断点继续，避免长连接长期占用gunicorn工作进程。
+每个连接在推送期间占用一个工作线程，因此需要使用gthread等多线程工作模式，
+并通过MONITORING_STREAM_MAX_PER_WORKER限制每个进程的连接数，为普通请求保留线程。
+"""
+
+import json
+import threading
+import time
+from datetime import datetime
+
+from app.monitoring.ringbuffer import get_reader, stale_after, RECORD_FIELDS
+
+
+# 空闲时发送心跳注释的间隔（秒）
+KEEPALIVE_INTERVAL = 15
+
+# 当前进程中正在推送的连接数
+_active_streams = 0
+_streams_lock = threading.Lock()
+
+
+def acquire_stream_slot(limit):
+    """
+    占用一个推送连接名额
+
+    Args:
+        limit: 每个进程的连接数上限
+
+    Returns:
+        bool: 是否占用成功（已达上限时返回False）
+    """
+    global _active_streams
+    with _streams_lock:
+        if _active_streams >= limit:
+            return False
+        _active_streams += 1
+        return True
+
+
+def release_stream_slot():
+    """释放推送连接名额（响应关闭时调用）"""
+    global _active_streams
+    with _streams_lock:
+        _active_streams = max(0, _active_streams - 1)
+
+
+def format_event(event, data, event_id=None):
+    """
+    格式化一条SSE消息
+
+    Args:
+        event: 事件类型
+        data: 事件数据（可JSON序列化）
+        event_id: 事件ID（浏览器重连时通过Last-Event-ID回传）
+
+    Returns:
+        str: SSE消息文本
+    """
+    lines = []
+    if event_id is not None:
+        lines.append(f'id: {event_id}')
+    lines.append(f'event: {event}')
+    lines.append(f'data: {json.dumps(data, ensure_ascii=False)}')
+    return '\n'.join(lines) + '\n\n'
+
+
+def _sample_payload(server_id, record):
+    """将环形缓冲区中的一条记录转换为推送数据"""
+    payload = dict(zip(RECORD_FIELDS, record))
+    payload['server_id'] = server_id
+    payload['epoch'] = payload['timestamp']
+    payload['timestamp'] = datetime.fromtimestamp(payload['timestamp']).strftime('%Y-%m-%d %H:%M:%S')
+    return payload
+
+
+def _read_latest_samples(server_ids, since):
+    """从最新样本表读取比since更新的样本（环形缓冲区不可用时使用）"""
+    from app import db
+    from app.models import ServerLatestSample
+
+    try:
+        rows = ServerLatestSample.query.filter(ServerLatestSample.server_id.in_(server_ids)).all()
+        samples = {}
+        for row in rows:
+            epoch = row.timestamp.timestamp()
+            if epoch > since.get(row.server_id, 0):
+                samples[row.server_id] = [[epoch, row.cpu_usage, row.memory_usage, row.disk_usage,
+                                           row.network_rx, row.network_tx, row.uptime]]
+        return samples
+    finally:
+        db.session.remove()
+
+
+def stream_monitoring_events(app, server_ids, since=0):
+    """
+    生成订阅服务器的监控事件流
+
+    事件类型：
+        sample: 新的监控样本
+        status: 服务器在线状态变化（连接建立时会先推送一次当前状态）
+
+    Args:
+        app: Flask应用实例
+        server_ids: 订阅的服务器ID列表
+        since: 只推送该时间（epoch秒）之后的样本
+
+    Yields:
+        str: SSE消息文本
+    """
+    interval = app.config.get('MONITORING_INTERVAL', 10)
+    poll_interval = app.config.get('MONITORING_STREAM_POLL_INTERVAL', 1)
+    max_duration = app.config.get('MONITORING_STREAM_MAX_DURATION', 300)
+    offline_after = stale_after(app)
+
+    last_sent = {server_id: since for server_id in server_ids}
+    latest_seen = {}
+    online = {}
+    started = time.monotonic()
+    last_output = started
+    last_fallback_poll = 0
+
+    # 记录各服务器最新样本的时间，用于判断初始在线状态
+    ring = get_reader(app)
+    fallback = list(server_ids) if ring is None else []
+    if ring is not None:
+        for server_id in server_ids:
+            records, _ = ring.read_since(server_id, time.time() - offline_after)
+            if records is None or not len(records):
+                fallback.append(server_id)
+            elif len(records):
+                latest_seen[server_id] = float(records[-1][0])
+    if fallback:
+        for server_id, records in _read_latest_samples(fallback, {}).items():
+            latest_seen[server_id] = records[-1][0]
+
+    # 建议浏览器断线后1秒重连
+    yield 'retry: 1000\n\n'
+
+    while time.monotonic() - started < max_duration:
+        # 环形缓冲区中没有或数据已过期的服务器（如采集器已停止）定期查询最新样本表
+        ring = get_reader(app)
+        updates = {}
+        fallback = list(server_ids) if ring is None else []
+        if ring is not None:
+            now = time.time()
+            for server_id in server_ids:
+                records, _ = ring.read_since(server_id, last_sent[server_id] + 1e-6)
+                if records is None:
+                    fallback.append(server_id)
+                elif len(records):
+                    updates[server_id] = records.tolist()
+                elif now - (ring.latest_timestamp(server_id) or 0) > offline_after:
+                    fallback.append(server_id)
+        if fallback and time.monotonic() - last_fallback_poll >= interval:
+            last_fallback_poll = time.monotonic()
+            updates.update(_read_latest_samples(fallback, last_sent))
+
+        for server_id, records in updates.items():
+            for record in records:
+                yield format_event('sample', _sample_payload(server_id, record), event_id=record[0])
+                last_output = time.monotonic()
+            last_sent[server_id] = records[-1][0]
+            latest_seen[server_id] = records[-1][0]
+
+        # 根据最新样本的时效推送状态变化
+        now = time.time()
+        for server_id in server_ids:
+            is_online = server_id in latest_seen and now - latest_seen[server_id] <= offline_after
+            if online.get(server_id) != is_online:
+                online[server_id] = is_online
+                yield format_event('status', {'server_id': server_id, 'online': is_online})
+                last_output = time.monotonic()
+
+        if time.monotonic() - last_output >= KEEPALIVE_INTERVAL:
+            yield ': keepalive\n\n'
+            last_output = time.monotonic()
+
+        time.sleep(poll_interval)
@@ -8,57 +8,22 @@ Tiny Panel - Linux服务器管理面板
 本模块提供监控相关的工具函数，包括服务器状态检查、资源使用情况获取、监控数据收集等功能。
 """
 
-import subprocess
 import re
-import psutil
 import time
-from datetime import datetime
+from datetime import datetime, timedelta
+from flask import current_app
+from sqlalchemy import insert
 
-
-
-def execute_remote_command(server, command, timeout=300):
-    """
-    在远程服务器上执行命令
-    
-    Args:
-        server: 服务器对象
-        command: 要执行的命令
-        timeout: 超时时间（秒）
-    
-    Returns:
-        dict: 包含返回码、标准输出和标准错误的字典
-    """
-    try:
-        # 如果是本地服务器（用于开发测试）
-        if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True,
-                timeout=timeout
-            )
-            return {
-                'returncode': result.returncode,
-                'stdout': result.stdout,
-                'stderr': result.stderr
-            }
-        
-        # 否则通过SSH连接到远程服务器
-        # 这里应该使用paramiko或其他SSH库
-        # 为了演示，我们返回模拟数据
-        return {
-            'returncode': 0,
-            'stdout': f'[模拟] 在服务器 {server.hostname} 上执行命令: {command}',
-            'stderr': ''
-        }
-        
-    except Exception as e:
-        return {
-            'returncode': -1,
-            'stdout': '',
-            'stderr': str(e)
-        }
+from app.executor import execute_remote_command, is_local
+from app.monitoring.probe import probe_server
+from app.monitoring.processes import process_sampler, read_local_processes
+from app.monitoring.sampler import (
+    rate_sampler,
+    local_cpu_percent,
+    local_net_rates,
+    parse_proc_stat_cpu,
+    parse_proc_net_dev
+)
 
 
 def get_server_status(server):
@@ -106,15 +71,16 @@ def get_cpu_usage(server):
         float: CPU使用率（百分比）
     """
     try:
-        # 如果是本地服务器，使用psutil获取
+        # 如果是本地服务器，使用psutil获取（基于上次快照的差值，无需等待）
         if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
-            return psutil.cpu_percent(interval=1)
+            return local_cpu_percent()
         
-        # 否则通过SSH获取
-        result = execute_remote_command(server, 'top -bn1 | grep "Cpu(s)" | sed "s/.*, *\([0-9.]*\)%* id.*/\1/"')
-        if result['returncode'] == 0 and result['stdout'].strip():
-            idle = float(result['stdout'].strip())
-            return 100 - idle
+        # 否则通过SSH读取/proc/stat，与上次快照比较计算使用率
+        result = execute_remote_command(server, 'head -n 1 /proc/stat')
+        if result['returncode'] == 0:
+            cpu_times = parse_proc_stat_cpu(result['stdout'])
+            if cpu_times:
+                return rate_sampler.cpu_percent(server.id, cpu_times)
         
         # 模拟数据
         return 0
@@ -133,6 +99,8 @@ def get_memory_usage(server):
     Returns:
         float: 内存使用率（百分比）
     """
+    import psutil
+
     try:
         # 如果是本地服务器，使用psutil获取
         if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
@@ -162,6 +130,8 @@ def get_disk_usage(server, path='/'):
     Returns:
         float: 磁盘使用率（百分比）
     """
+    import psutil
+
     try:
         # 如果是本地服务器，使用psutil获取
         if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
@@ -182,31 +152,29 @@ def get_disk_usage(server, path='/'):
         return 0
 
 
-def get_network_usage(server, interval=1):
+def get_network_usage(server):
     """
     获取网络使用率
     
+    基于上次采样的计数器快照计算速率，首次采样返回0。
+    
     Args:
         server: 服务器对象
-        interval: 采样间隔（秒）
     
     Returns:
-        tuple: (接收字节数, 发送字节数)
+        tuple: (每秒接收字节数, 每秒发送字节数)
     """
     try:
         # 如果是本地服务器，使用psutil获取
         if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
-            net_io_start = psutil.net_io_counters()
-            time.sleep(interval)
-            net_io_end = psutil.net_io_counters()
-            
-            # 计算每秒钟的网络流量
-            bytes_recv = (net_io_end.bytes_recv - net_io_start.bytes_recv) / interval
-            bytes_sent = (net_io_end.bytes_sent - net_io_start.bytes_sent) / interval
-            
-            return (bytes_recv, bytes_sent)
+            return local_net_rates()
+        
+        # 否则通过SSH读取/proc/net/dev
+        result = execute_remote_command(server, 'cat /proc/net/dev')
+        if result['returncode'] == 0 and '|' in result['stdout']:
+            bytes_recv, bytes_sent = parse_proc_net_dev(result['stdout'])
+            return rate_sampler.net_rates(server.id, bytes_recv, bytes_sent)
         
-        # 否则通过SSH获取
         # 简化处理，返回模拟数据
         return (1024 * 1024, 512 * 1024)  # 1MB/s 接收，512KB/s 发送
         
@@ -214,6 +182,34 @@ def get_network_usage(server, interval=1):
         return (0, 0)
 
 
+def get_uptime(server):
+    """
+    获取系统运行时间
+    
+    Args:
+        server: 服务器对象
+    
+    Returns:
+        int: 运行时间（秒）
+    """
+    import psutil
+
+    try:
+        # 如果是本地服务器，使用psutil获取
+        if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
+            return int(time.time() - psutil.boot_time())
+        
+        # 否则通过SSH获取
+        result = execute_remote_command(server, 'cat /proc/uptime')
+        if result['returncode'] == 0 and result['stdout'].strip():
+            return int(float(result['stdout'].split()[0]))
+        
+        return 0
+        
+    except Exception:
+        return 0
+
+
 def get_process_list(server, limit=20):
     """
     获取进程列表
@@ -228,26 +224,13 @@ def get_process_list(server, limit=20):
     try:
         processes = []
         
-        # 如果是本地服务器，使用psutil获取
-        if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
-            # 获取所有进程
-            for proc in psutil.process_iter(['pid', 'name', 'cpu_percent', 'memory_percent', 'create_time', 'username']):
-                try:
-                    process_info = proc.info
-                    processes.append({
-                        'pid': process_info['pid'],
-                        'name': process_info['name'],
-                        'cpu_percent': process_info['cpu_percent'],
-                        'memory_percent': process_info['memory_percent'],
-                        'create_time': datetime.fromtimestamp(process_info['create_time']).strftime('%Y-%m-%d %H:%M:%S'),
-                        'username': process_info['username']
-                    })
-                except (psutil.NoSuchProcess, psutil.AccessDenied, psutil.ZombieProcess):
-                    pass
-            
-            # 按CPU使用率排序，取前limit个
-            processes.sort(key=lambda x: x['cpu_percent'], reverse=True)
-            return processes[:limit]
+        # 如果是本地服务器，优先读取采集器每轮写入的进程列表；采集器未运行时使用本进程的进程采样器
+        if is_local(server):
+            interval = current_app.config.get('MONITORING_INTERVAL', 10)
+            processes = read_local_processes(current_app, interval * 2)
+            if processes is not None:
+                return processes[:limit]
+            return process_sampler.top(limit, max_age=interval)
         
         # 否则通过SSH获取
         result = execute_remote_command(server, f'ps aux --sort=-%cpu | head -n {limit + 1}')
@@ -284,6 +267,166 @@ def get_process_list(server, limit=20):
         ]
 
 
+def sample_monitoring_data(server):
+    """
+    采集服务器的一个监控样本（不写入数据库）
+    
+    Args:
+        server: 服务器对象
+    
+    Returns:
+        dict: 监控样本字段，服务器离线时返回None
+    """
+    # 远程服务器通过一次探针命令采集全部数据，探针执行失败视为离线
+    if not is_local(server):
+        payload = probe_server(server)
+        if payload is None:
+            return None
+        sample = {field: payload[field] for field in MONITORING_FIELDS[1:-1]}
+        sample.update(server_id=server.id, response_time=payload['response_time'],
+                      timestamp=datetime.now())
+        return sample
+    
+    # 检查服务器是否在线
+    status = get_server_status(server)
+    if not status['online']:
+        return None
+    
+    # 按采集周期刷新本机进程表，进程列表接口直接使用刷新结果
+    try:
+        process_sampler.refresh()
+    except Exception as e:
+        print(f'采集进程列表失败: {e}')
+    
+    # 获取各项监控数据
+    cpu_usage = get_cpu_usage(server)
+    memory_usage = get_memory_usage(server)
+    disk_usage = get_disk_usage(server)
+    network_rx, network_tx = get_network_usage(server)
+    uptime = get_uptime(server)
+    
+    return {
+        'server_id': server.id,
+        'cpu_usage': cpu_usage,
+        'memory_usage': memory_usage,
+        'disk_usage': disk_usage,
+        'network_rx': network_rx,
+        'network_tx': network_tx,
+        'uptime': uptime,
+        'response_time': status['response_time'],
+        'timestamp': datetime.now()
+    }
+
+
+# MonitoringData中保存的样本字段
+MONITORING_FIELDS = (
+    'server_id', 'cpu_usage', 'memory_usage', 'disk_usage',
+    'network_rx', 'network_tx', 'uptime', 'timestamp'
+)
+
+
+def update_latest_samples(samples):
+    """
+    用新样本更新每台服务器的最新样本表（调用方负责提交事务）
+    
+    Args:
+        samples: 监控样本列表
+    """
+    from app import db
+    from app.models import ServerLatestSample
+    from app.monitoring.rollup import dialect_insert
+    
+    # 同一批次中每台服务器只保留最新的样本
+    newest = {}
+    for sample in samples:
+        current = newest.get(sample['server_id'])
+        if current is None or sample['timestamp'] >= current['timestamp']:
+            newest[sample['server_id']] = sample
+    
+    # 支持upsert的数据库上一条语句完成插入或更新，只有更新的样本才覆盖（多个写入器并发写入时不会冲突）
+    stmt = dialect_insert(ServerLatestSample)
+    if stmt is not None:
+        fields = MONITORING_FIELDS[1:] + ('response_time',)
+        db.session.execute(stmt.on_conflict_do_update(
+            index_elements=['server_id'],
+            set_={field: stmt.excluded[field] for field in fields},
+            where=stmt.excluded.timestamp >= stmt.table.c.timestamp
+        ), [
+            dict({field: sample[field] for field in MONITORING_FIELDS}, response_time=sample.get('response_time'))
+            for _, sample in sorted(newest.items())
+        ])
+        return
+    
+    existing = {
+        row.server_id: row
+        for row in ServerLatestSample.query.filter(ServerLatestSample.server_id.in_(newest))
+    }
+    
+    for server_id, sample in newest.items():
+        row = existing.get(server_id)
+        if row is None:
+            row = ServerLatestSample(server_id=server_id)
+            db.session.add(row)
+        elif row.timestamp > sample['timestamp']:
+            continue
+        for field in MONITORING_FIELDS[1:]:
+            setattr(row, field, sample[field])
+        row.response_time = sample.get('response_time')
+
+
+def save_monitoring_data(samples):
+    """
+    将监控样本保存到数据库，并增量更新汇总数据和最新样本
+    
+    Args:
+        samples: 监控样本列表（sample_monitoring_data的返回值）
+    """
+    from app import db
+    from app.models import MonitoringData
+    from app.monitoring.rollup import update_rollups
+    
+    # 批量INSERT（executemany），网络字段对应network_in/network_out列
+    db.session.execute(insert(MonitoringData), [
+        {
+            'server_id': sample['server_id'],
+            'cpu_usage': sample['cpu_usage'],
+            'memory_usage': sample['memory_usage'],
+            'disk_usage': sample['disk_usage'],
+            'network_in': sample['network_rx'],
+            'network_out': sample['network_tx'],
+            'uptime': sample['uptime'],
+            'timestamp': sample['timestamp']
+        }
+        for sample in samples
+    ])
+    update_rollups(samples)
+    update_latest_samples(samples)
+    db.session.commit()
+
+
+def status_from_latest(latest, interval):
+    """
+    根据最新样本的时效推断服务器状态（不进行网络探测）
+    
+    采集器只为在线的服务器写入样本，最近几个采集周期内有样本即视为在线。
+    
+    Args:
+        latest: 最新样本（ServerLatestSample），可以为None
+        interval: 采集周期（秒）
+    
+    Returns:
+        dict: 包含服务器状态的字典
+    """
+    if latest is None:
+        return {'online': False, 'response_time': 0}
+    
+    max_age = timedelta(seconds=max(interval * 3, 60))
+    if datetime.now() - latest.timestamp > max_age:
+        return {'online': False, 'response_time': 0}
+    
+    return {'online': True, 'response_time': latest.response_time or 0}
+
+
 def collect_monitoring_data(server):
     """
     收集服务器监控数据并保存到数据库
@@ -295,38 +438,16 @@ def collect_monitoring_data(server):
         bool: 是否成功收集数据
     """
     try:
-        from app import db
-        from app.models import MonitoringData
-        
-        # 检查服务器是否在线
-        status = get_server_status(server)
-        if not status['online']:
+        sample = sample_monitoring_data(server)
+        if sample is None:
             return False
         
-        # 获取各项监控数据
-        cpu_usage = get_cpu_usage(server)
-        memory_usage = get_memory_usage(server)
-        disk_usage = get_disk_usage(server)
-        network_rx, network_tx = get_network_usage(server)
-        
-        # 创建监控数据记录
-        monitoring_data = MonitoringData(
-            server_id=server.id,
-            cpu_usage=cpu_usage,
-            memory_usage=memory_usage,
-            disk_usage=disk_usage,
-            network_rx=network_rx,
-            network_tx=network_tx,
-            timestamp=datetime.now()
-        )
-        
-        # 保存到数据库
-        db.session.add(monitoring_data)
-        db.session.commit()
-        
+        save_monitoring_data([sample])
         return True
         
     except Exception:
+        from app import db
+        db.session.rollback()
         return False
 
 
@@ -340,6 +461,8 @@ def get_disk_partitions(server):
     Returns:
         list: 磁盘分区列表
     """
+    import psutil
+
     try:
         partitions = []
         
@@ -404,6 +527,8 @@ def get_network_interfaces(server):
     Returns:
         list: 网络接口列表
     """
+    import psutil
+
     try:
         interfaces = []
         
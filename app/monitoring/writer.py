@@ -0,0 +1,228 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控数据批量写入器
+
+本模块将监控样本放入内存队列，由后台线程在达到数量阈值或时间阈值时
+批量写入数据库（executemany方式的批量INSERT，一次提交），
+避免每个样本单独提交带来的写入瓶颈。写入器提供队列深度和写入延迟等统计信息，
+并在每个写入周期将其写入共享状态文件（见app.monitoring.status）。
+"""
+
+import atexit
+import threading
+import time
+from collections import deque
+
+
+class MonitoringWriter:
+    """
+    监控数据批量写入器
+
+    Args:
+        app: Flask应用实例
+        batch_size: 队列达到该数量时立即写入，默认读取配置MONITORING_WRITE_BATCH_SIZE
+        flush_interval: 样本在队列中的最长停留时间（秒），默认读取配置MONITORING_WRITE_FLUSH_INTERVAL
+        max_queue: 队列上限，超出时丢弃最旧的样本，默认读取配置MONITORING_WRITE_MAX_QUEUE
+    """
+
+    def __init__(self, app, batch_size=None, flush_interval=None, max_queue=None):
+        self.app = app
+        self.batch_size = batch_size or app.config.get('MONITORING_WRITE_BATCH_SIZE', 500)
+        self.flush_interval = flush_interval or app.config.get('MONITORING_WRITE_FLUSH_INTERVAL', 5)
+        self.max_queue = max_queue or app.config.get('MONITORING_WRITE_MAX_QUEUE', 50000)
+
+        self._queue = deque()
+        self._oldest = None
+        self._condition = threading.Condition()
+        self._flush_lock = threading.Lock()
+        self._thread = None
+        self._stopped = False
+
+        # 统计信息
+        self.written = 0
+        self.dropped = 0
+        self.failed = 0
+        self.flushes = 0
+        self.last_flush_at = None
+        self.last_flush_size = 0
+        self.last_flush_latency = 0
+        self.max_flush_latency = 0
+        self.total_flush_latency = 0
+
+    @property
+    def queue_depth(self):
+        """当前队列中等待写入的样本数"""
+        return len(self._queue)
+
+    def start(self):
+        """启动后台写入线程"""
+        if self._thread is not None and self._thread.is_alive():
+            return
+        self._stopped = False
+        self._thread = threading.Thread(target=self._run, name='monitoring-writer', daemon=True)
+        self._thread.start()
+        atexit.register(self.stop)
+
+    def stop(self):
+        """停止后台写入线程，并写入队列中剩余的样本"""
+        with self._condition:
+            self._stopped = True
+            self._condition.notify()
+        if self._thread is not None:
+            self._thread.join(self.flush_interval + 5)
+            self._thread = None
+        self.flush()
+
+    def submit(self, samples):
+        """
+        将监控样本放入写入队列
+
+        Args:
+            samples: 监控样本列表（字段同save_monitoring_data）
+        """
+        if not samples:
+            return
+
+        with self._condition:
+            if self._oldest is None:
+                # 队列由空变为非空，唤醒写入线程开始计时
+                self._oldest = time.monotonic()
+                self._condition.notify()
+            self._queue.extend(samples)
+
+            # 超过队列上限时丢弃最旧的样本
+            overflow = len(self._queue) - self.max_queue
+            if overflow > 0:
+                for _ in range(overflow):
+                    self._queue.popleft()
+                self.dropped += overflow
+
+            if len(self._queue) >= self.batch_size:
+                self._condition.notify()
+
+    def _drain(self, limit):
+        """从队列头部取出最多limit个样本"""
+        with self._condition:
+            count = min(limit, len(self._queue))
+            batch = [self._queue.popleft() for _ in range(count)]
+            self._oldest = time.monotonic() if self._queue else None
+            return batch
+
+    def flush(self):
+        """
+        立即写入队列中的全部样本
+
+        Returns:
+            int: 写入的样本数
+        """
+        from app import db
+        from app.monitoring.utils import save_monitoring_data
+
+        written = 0
+        with self._flush_lock:
+            while self._queue:
+                batch = self._drain(self.batch_size)
+                started = time.monotonic()
+                with self.app.app_context():
+                    try:
+                        save_monitoring_data(batch)
+                    except Exception as e:
+                        db.session.rollback()
+                        self.failed += len(batch)
+                        print(f'批量写入监控数据失败: {e}')
+                        continue
+                    finally:
+                        db.session.remove()
+
+                latency = time.monotonic() - started
+                written += len(batch)
+                self.written += len(batch)
+                self.flushes += 1
+                self.last_flush_at = time.time()
+                self.last_flush_size = len(batch)
+                self.last_flush_latency = latency
+                self.total_flush_latency += latency
+                self.max_flush_latency = max(self.max_flush_latency, latency)
+        return written
+
+    def _wait_ready(self):
+        """
+        等待达到写入条件，队列为空时最多等待一个写入周期
+
+        Returns:
+            bool: 是否需要写入
+        """
+        while not self._stopped:
+            if len(self._queue) >= self.batch_size:
+                return True
+            if self._oldest is not None:
+                remaining = self._oldest + self.flush_interval - time.monotonic()
+                if remaining <= 0:
+                    return True
+                self._condition.wait(remaining)
+            elif not self._condition.wait(self.flush_interval):
+                return False
+        return False
+
+    def _run(self):
+        """后台写入线程：达到数量阈值或最旧样本超过时间阈值时写入，每个周期更新共享状态"""
+        from app.monitoring.status import publish_status
+
+        while True:
+            with self._condition:
+                ready = self._wait_ready()
+                if self._stopped:
+                    return
+
+            if ready:
+                self.flush()
+            publish_status(self.app)
+
+    def stats(self):
+        """
+        获取写入器统计信息
+
+        Returns:
+            dict: 队列深度、写入数量和写入延迟（毫秒）等
+        """
+        return {
+            'queue_depth': self.queue_depth,
+            'written': self.written,
+            'dropped': self.dropped,
+            'failed': self.failed,
+            'flushes': self.flushes,
+            'last_flush_at': self.last_flush_at,
+            'last_flush_size': self.last_flush_size,
+            'last_flush_latency_ms': round(self.last_flush_latency * 1000, 2),
+            'avg_flush_latency_ms': round(self.total_flush_latency / self.flushes * 1000, 2) if self.flushes else 0,
+            'max_flush_latency_ms': round(self.max_flush_latency * 1000, 2)
+        }
+
+
+_writer_lock = threading.Lock()
+
+
+def get_writer(app):
+    """
+    获取当前进程的监控数据写入器（首次调用时创建并启动）
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        MonitoringWriter: 写入器实例
+    """
+    writer = app.extensions.get('monitoring_writer')
+    if writer is not None:
+        return writer
+
+    with _writer_lock:
+        writer = app.extensions.get('monitoring_writer')
+        if writer is None:
+            writer = MonitoringWriter(app)
+            writer.start()
+            app.extensions['monitoring_writer'] = writer
+    return writer
@@ -0,0 +1,18 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+性能分析模块
+
+管理员在请求上附加请求头 X-Profile: 1 或查询参数 _profile=1 时，使用cProfile分析该请求，
+分析结果保存后可以在面板中查看或下载。未附加标记的请求不受影响。
+"""
+
+from flask import Blueprint
+
+# 创建性能分析蓝图
+profiling = Blueprint('profiling', __name__, url_prefix='/profiling')
+
+# 导入路由
+from app.profiling import routes
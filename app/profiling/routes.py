@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+性能分析模块路由
+"""
+
+from flask import render_template, request, current_app, send_file, abort
+from flask_login import login_required
+
+from app.profiling import profiling
+from app.profiling.utils import PROFILE_HEADER, PROFILE_QUERY_PARAM, SORT_KEYS
+from app.utils import admin_required
+
+
+def _get_store():
+    store = current_app.extensions.get('profile_store')
+    if store is None:
+        abort(404)
+    return store
+
+
+@profiling.route('/')
+@login_required
+@admin_required
+def index():
+    """
+    性能分析记录列表页面
+    """
+    return render_template(
+        'profiling/index.html',
+        title='性能分析',
+        profiles=_get_store().list(),
+        profile_header=PROFILE_HEADER,
+        profile_query_param=PROFILE_QUERY_PARAM
+    )
+
+
+@profiling.route('/<profile_id>')
+@login_required
+@admin_required
+def view(profile_id):
+    """
+    查看一次分析结果
+
+    查询参数sort指定排序方式（cumulative、tottime或calls），limit指定输出的函数数
+    """
+    store = _get_store()
+    profile = store.get(profile_id)
+    if profile is None:
+        abort(404)
+
+    sort = request.args.get('sort', 'cumulative')
+    if sort not in SORT_KEYS:
+        sort = 'cumulative'
+    limit = min(max(request.args.get('limit', 80, type=int), 10), 1000)
+
+    return render_template(
+        'profiling/view.html',
+        title='性能分析结果',
+        profile=profile,
+        stats=store.render(profile_id, sort, limit),
+        sort=sort,
+        sort_keys=SORT_KEYS,
+        limit=limit
+    )
+
+
+@profiling.route('/<profile_id>/download')
+@login_required
+@admin_required
+def download(profile_id):
+    """
+    下载pstats格式的分析结果
+    """
+    store = _get_store()
+    if store.get(profile_id) is None:
+        abort(404)
+    return send_file(store.path(profile_id), as_attachment=True, download_name=f'profile-{profile_id}.prof')
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+性能分析工具函数
+
+请求钩子只检查请求头和查询参数，未要求分析的请求没有额外开销。要求分析的管理员请求
+在before_request中启动cProfile，在after_request中停止，覆盖视图函数、数据库查询和模板渲染；
+分析结果以pstats格式保存到分析目录，并附带请求信息和关键调用（子进程、SQL、模板渲染）的耗时汇总。
+
+cProfile同一时间只能有一个实例在运行，同时收到多个分析请求时只分析其中一个，
+其余请求正常处理并在响应头X-Profile-Status中返回busy。
+
+Python 3.12起cProfile基于sys.monitoring实现，启用后记录进程内所有线程的调用，
+分析期间其他线程（采集器、写入器、其他请求和实时推送连接）的调用也会计入结果，
+无法按线程过滤。此时分析记录中的all_threads为True，查看页面会给出提示。
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import re
+import site
+import sys
+import sysconfig
+import tempfile
+import threading
+import time
+import uuid
+from datetime import datetime
+
+from flask import g, request, url_for
+from flask_login import current_user
+
+from app.utils import is_admin
+
+
+# 触发分析的请求头和查询参数
+PROFILE_HEADER = 'X-Profile'
+PROFILE_QUERY_PARAM = '_profile'
+
+# 分析记录ID格式（uuid4的十六进制形式）
+PROFILE_ID_PATTERN = re.compile(r'^[0-9a-f]{32}$')
+
+# 查看分析结果时可用的排序方式
+SORT_KEYS = {
+    'cumulative': '累计耗时',
+    'tottime': '自身耗时',
+    'calls': '调用次数'
+}
+
+# 需要单独汇总耗时的关键调用：(名称, 模块, 函数名)
+KEY_FUNCTIONS = (
+    ('命令执行', 'app.executor', 'execute'),
+    ('创建子进程', 'subprocess', '_execute_child'),
+    ('SQL查询', 'sqlalchemy.engine.base', '_execute_context'),
+    ('模板渲染', 'flask.templating', '_render'),
+)
+
+# cProfile是否记录所有线程（Python 3.12起基于sys.monitoring）
+PROFILE_ALL_THREADS = sys.version_info >= (3, 12)
+
+# 同一时间只允许一个cProfile实例运行
+_profile_lock = threading.Lock()
+
+
+def profiling_requested():
+    """当前请求是否附加了分析标记"""
+    return request.headers.get(PROFILE_HEADER) == '1' or request.args.get(PROFILE_QUERY_PARAM) == '1'
+
+
+def key_timings(stats):
+    """
+    汇总关键调用的次数和累计耗时
+
+    各项之间可能存在嵌套（如命令执行包含创建子进程），不能相加。
+    Python 3.12起统计中包含分析期间其他线程的调用（见PROFILE_ALL_THREADS），
+    例如采集器线程的命令执行和写入器线程的SQL查询，可能超过请求本身的耗时。
+
+    Args:
+        stats: pstats.Stats对象
+
+    Returns:
+        list: [{'label': 名称, 'calls': 调用次数, 'seconds': 累计耗时}]
+    """
+    timings = []
+    for label, module_name, func_name in KEY_FUNCTIONS:
+        module = sys.modules.get(module_name)
+        filename = getattr(module, '__file__', None)
+        calls, seconds = 0, 0.0
+        if filename:
+            for (path, _, func), (_, nc, _, ct, _) in stats.stats.items():
+                if path == filename and (func == func_name or func.endswith('.' + func_name)):
+                    calls += nc
+                    seconds += ct
+        timings.append({'label': label, 'calls': calls, 'seconds': round(seconds, 6)})
+    return timings
+
+
+class ProfileStore:
+    """
+    分析结果存储
+
+    每条记录保存为两个文件：{ID}.prof（pstats格式，可用snakeviz等工具打开）
+    和{ID}.json（请求信息和耗时汇总）。超过数量上限时删除最早的记录。
+
+    Args:
+        profiles_dir: 保存分析结果的目录
+        max_count: 保留的记录数
+    """
+
+    def __init__(self, profiles_dir, max_count=50):
+        self.profiles_dir = profiles_dir
+        self.max_count = max_count
+        os.makedirs(profiles_dir, exist_ok=True)
+
+    def path(self, profile_id, ext='prof'):
+        return os.path.join(self.profiles_dir, f'{profile_id}.{ext}')
+
+    def save(self, profiler, info):
+        """
+        保存一次分析结果
+
+        Args:
+            profiler: 已停止的cProfile.Profile对象
+            info: 请求信息
+
+        Returns:
+            str: 记录ID
+        """
+        profile_id = uuid.uuid4().hex
+        stats = pstats.Stats(profiler)
+        meta = {
+            'id': profile_id,
+            **info,
+            'total_calls': stats.total_calls,
+            'key_timings': key_timings(stats)
+        }
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.profiles_dir, prefix='.profile-')
+        os.close(fd)
+        stats.dump_stats(tmp_path)
+        os.replace(tmp_path, self.path(profile_id))
+
+        fd, tmp_path = tempfile.mkstemp(dir=self.profiles_dir, prefix='.profile-')
+        with os.fdopen(fd, 'w') as f:
+            json.dump(meta, f, ensure_ascii=False)
+        os.replace(tmp_path, self.path(profile_id, 'json'))
+
+        self.cleanup()
+        return profile_id
+
+    def get(self, profile_id):
+        """
+        读取记录的请求信息
+
+        Returns:
+            dict: 请求信息，记录不存在时返回None
+        """
+        if not PROFILE_ID_PATTERN.match(profile_id or ''):
+            return None
+        try:
+            with open(self.path(profile_id, 'json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def list(self):
+        """
+        Returns:
+            list: 所有记录的请求信息（按时间倒序）
+        """
+        try:
+            filenames = os.listdir(self.profiles_dir)
+        except OSError:
+            return []
+        profiles = []
+        for filename in filenames:
+            profile_id, ext = os.path.splitext(filename)
+            if ext == '.json':
+                meta = self.get(profile_id)
+                if meta is not None:
+                    profiles.append(meta)
+        profiles.sort(key=lambda meta: meta['created_at'], reverse=True)
+        return profiles
+
+    def delete(self, profile_id):
+        for ext in ('prof', 'json'):
+            try:
+                os.remove(self.path(profile_id, ext))
+            except OSError:
+                pass
+
+    def cleanup(self):
+        """删除超过数量上限的最早记录"""
+        for meta in self.list()[self.max_count:]:
+            self.delete(meta['id'])
+
+    def render(self, profile_id, sort='cumulative', limit=80):
+        """
+        以文本形式输出分析结果
+
+        Args:
+            profile_id: 记录ID
+            sort: 排序方式（SORT_KEYS中的一项）
+            limit: 输出的函数数
+
+        Returns:
+            str: pstats输出的文本（路径中的site-packages、标准库和项目目录前缀已去除）
+        """
+        stream = io.StringIO()
+        stats = pstats.Stats(self.path(profile_id), stream=stream)
+        stats.sort_stats(sort if sort in SORT_KEYS else 'cumulative').print_stats(limit)
+        text = stream.getvalue()
+        prefixes = site.getsitepackages() + [
+            sysconfig.get_paths()['stdlib'],
+            os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+        ]
+        for prefix in prefixes:
+            text = text.replace(prefix + os.sep, '')
+        return text
+
+
+def init_profiling(app):
+    """
+    为应用注册性能分析钩子
+
+    Args:
+        app: Flask应用实例
+
+    Returns:
+        ProfileStore: 分析结果存储（未启用时返回None）
+    """
+    if not app.config.get('PROFILING_ENABLED'):
+        return None
+
+    store = ProfileStore(
+        profiles_dir=app.config.get('PROFILES_DIR') or os.path.join(tempfile.gettempdir(), 'tiny_panel_profiles'),
+        max_count=app.config.get('PROFILES_MAX_COUNT', 50)
+    )
+    app.extensions['profile_store'] = store
+
+    @app.before_request
+    def start_profiler():
+        if not profiling_requested() or not is_admin():
+            return
+        if not _profile_lock.acquire(blocking=False):
+            g.profile_busy = True
+            return
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # 其他分析工具（如调试器）正在运行
+            _profile_lock.release()
+            g.profile_busy = True
+            return
+        g.profiler = profiler
+        g.profile_started = time.perf_counter()
+
+    @app.after_request
+    def save_profile(response):
+        profiler = g.pop('profiler', None)
+        if profiler is None:
+            if g.pop('profile_busy', False):
+                response.headers['X-Profile-Status'] = 'busy'
+            return response
+
+        profiler.disable()
+        _profile_lock.release()
+        try:
+            profile_id = store.save(profiler, {
+                'method': request.method,
+                'path': request.full_path.rstrip('?'),
+                'endpoint': request.endpoint,
+                'status': response.status_code,
+                'duration_ms': round((time.perf_counter() - g.profile_started) * 1000, 2),
+                'user': current_user.username,
+                'created_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+                'all_threads': PROFILE_ALL_THREADS
+            })
+        except Exception as e:
+            print(f'保存性能分析结果失败: {e}')
+            return response
+
+        response.headers['X-Profile-Id'] = profile_id
+        response.headers['X-Profile-URL'] = url_for('profiling.view', profile_id=profile_id)
+        return response
+
+    @app.teardown_request
+    def stop_profiler(exc):
+        # 未经过after_request的请求（如处理过程中连接断开）在这里停止分析
+        profiler = g.pop('profiler', None)
+        if profiler is not None:
+            profiler.disable()
+            _profile_lock.release()
+
+    return store
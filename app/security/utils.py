@@ -8,54 +8,10 @@ Tiny Panel - Linux服务器管理面板
 本模块提供安全管理相关的工具函数，包括防火墙管理、SSH配置、安全审计等功能。
 """
 
-import subprocess
 import re
 from datetime import datetime, timedelta
 
-
-def execute_remote_command(server, command, timeout=300):
-    """
-    在远程服务器上执行命令
-    
-    Args:
-        server: 服务器对象
-        command: 要执行的命令
-        timeout: 超时时间（秒）
-    
-    Returns:
-        dict: 包含返回码、标准输出和标准错误的字典
-    """
-    try:
-        # 如果是本地服务器（用于开发测试）
-        if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True,
-                timeout=timeout
-            )
-            return {
-                'returncode': result.returncode,
-                'stdout': result.stdout,
-                'stderr': result.stderr
-            }
-        
-        # 否则通过SSH连接到远程服务器
-        # 这里应该使用paramiko或其他SSH库
-        # 为了演示，我们返回模拟数据
-        return {
-            'returncode': 0,
-            'stdout': f'[模拟] 在服务器 {server.hostname} 上执行命令: {command}',
-            'stderr': ''
-        }
-        
-    except Exception as e:
-        return {
-            'returncode': -1,
-            'stdout': '',
-            'stderr': str(e)
-        }
+from app.executor import execute_remote_command
 
 
 def get_firewall_status(server):
@@ -8,13 +8,15 @@ Tiny Panel - Linux服务器管理面板
 本模块提供软件管理相关的路由和视图函数。
 """
 
-from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify
+from flask import Blueprint, render_template, redirect, url_for, flash, request, jsonify, current_app
 from flask_login import login_required
 from app import db
+from app.executor import execute_remote_command
+from app.jobs import get_job_registry
+from app.monitoring.collector import server_snapshot
 from app.models import Server, Software
 from app.software.forms import SoftwareInstallForm, SoftwareSearchForm, SoftwareUninstallForm
 from app.software.utils import (
-    execute_remote_command,
     check_software_installed,
     get_software_version,
     load_software_config,
@@ -24,13 +26,9 @@ from app.software.utils import (
 )
 import time
 import threading
-from datetime import datetime
 
 software = Blueprint('software', __name__, template_folder='templates')
 
-# 全局变量用于存储安装状态
-installation_status = {}
-
 
 @software.route('/')
 def list():
@@ -91,33 +89,19 @@ def install():
             flash('软件不存在', 'danger')
             return redirect(url_for('software.list'))
         
-        # 设置安装状态
-        installation_status[software_name] = {
-            'status': 'installing',
-            'progress': 0,
-            'message': '开始安装...',
-            'log': '',
-            'start_time': datetime.now().isoformat()
-        }
-        
-        # 执行安装命令（模拟）
-        # 实际项目中应该在后台线程中执行安装
-        result = execute_remote_command(server, software_info['install_command'])
+        # 在后台执行安装命令，安装输出通过get-installation-status增量读取
+        job = get_job_registry().submit(
+            software_name,
+            server_snapshot(server),
+            software_info['install_command'],
+            timeout=current_app.config.get('SOFTWARE_INSTALL_TIMEOUT', 1800)
+        )
         
-        if result['returncode'] == 0:
-            flash(f'软件 {software_name} 安装成功', 'success')
-            return jsonify({
-                'success': True,
-                'message': f'软件 {software_name} 安装成功'
-            })
-        else:
-            error_message = f'软件 {software_name} 安装失败'
-            flash(error_message, 'danger')
-            return jsonify({
-                'success': False,
-                'message': error_message,
-                'log': f"标准输出: {result['stdout']}\n错误输出: {result['stderr']}"
-            })
+        return jsonify({
+            'success': True,
+            'job_id': job.id,
+            'message': f'开始安装 {software_name}...'
+        })
     
     return jsonify({
         'success': False,
@@ -166,14 +150,32 @@ def uninstall():
 def get_installation_status(software_name):
     """
     获取软件安装状态
+    
+    查询参数job_id指定安装任务（默认为该软件最近一次安装），
+    offset为已读取的日志行数，响应只包含offset之后的日志行和下一次读取的offset。
     """
-    status = installation_status.get(software_name, {
-        'status': 'not_started',
-        'progress': 0,
-        'message': '安装未开始',
-        'log': ''
-    })
+    registry = get_job_registry()
+    job_id = request.args.get('job_id') or registry.latest(software_name)
+    offset = request.args.get('offset', 0, type=int)
+    
+    status = registry.read(job_id, offset) if job_id else None
+    if status is None or status['name'] != software_name:
+        return jsonify({
+            'status': 'not_started',
+            'progress': 0,
+            'message': '安装未开始',
+            'lines': [],
+            'offset': 0
+        })
     
+    messages = {
+        'running': '正在安装...',
+        'success': '安装成功',
+        'failed': f"安装失败（返回码 {status['returncode']}）",
+        'cancelled': '安装已取消'
+    }
+    status['progress'] = 0 if status['status'] == 'running' else 100
+    status['message'] = messages[status['status']] + (f": {status['message']}" if status['message'] else '')
     return jsonify(status)
 
 
@@ -8,57 +8,13 @@ Tiny Panel - Linux服务器管理面板
 本模块提供软件管理相关的工具函数，用于软件安装、卸载等操作的辅助功能。
 """
 
-import subprocess
 import json
 import os
 import platform
 import re
 from datetime import datetime
 
-
-def execute_remote_command(server, command, timeout=300):
-    """
-    在远程服务器上执行命令
-    
-    Args:
-        server: 服务器对象
-        command: 要执行的命令
-        timeout: 超时时间（秒）
-    
-    Returns:
-        dict: 包含返回码、标准输出和标准错误的字典
-    """
-    try:
-        # 如果是本地服务器（用于开发测试）
-        if server.hostname == 'localhost' or server.hostname == '127.0.0.1':
-            result = subprocess.run(
-                command, 
-                shell=True, 
-                capture_output=True, 
-                text=True,
-                timeout=timeout
-            )
-            return {
-                'returncode': result.returncode,
-                'stdout': result.stdout,
-                'stderr': result.stderr
-            }
-        
-        # 否则通过SSH连接到远程服务器
-        # 这里应该使用paramiko或其他SSH库
-        # 为了演示，我们返回模拟数据
-        return {
-            'returncode': 0,
-            'stdout': f'[模拟] 在服务器 {server.hostname} 上执行命令: {command}',
-            'stderr': ''
-        }
-        
-    except Exception as e:
-        return {
-            'returncode': -1,
-            'stdout': '',
-            'stderr': str(e)
-        }
+from app.executor import run_local_command
 
 
 def check_software_installed(software_name):
@@ -75,21 +31,11 @@ def check_software_installed(software_name):
         # 根据操作系统类型使用不同的命令
         if platform.system() == 'Linux':
             # 尝试使用which命令检查
-            result = subprocess.run(
-                f'which {software_name}', 
-                shell=True, 
-                capture_output=True, 
-                text=True
-            )
+            result = run_local_command(f'which {software_name}')
             return result.returncode == 0
         elif platform.system() == 'Windows':
             # Windows系统使用where命令
-            result = subprocess.run(
-                f'where {software_name}', 
-                shell=True, 
-                capture_output=True, 
-                text=True
-            )
+            result = run_local_command(f'where {software_name}')
             return result.returncode == 0
         else:
             return False
@@ -117,13 +63,7 @@ def get_software_version(software_name):
         ]
         
         for cmd in version_commands:
-            result = subprocess.run(
-                cmd, 
-                shell=True, 
-                capture_output=True, 
-                text=True,
-                timeout=10
-            )
+            result = run_local_command(cmd, timeout=10)
             
             if result.returncode == 0 and result.stdout:
                 # 尝试从输出中提取版本号
@@ -0,0 +1,447 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+SSH连接池
+
+本模块为每台服务器维护一个已认证的paramiko Transport，每条命令在其上打开独立的
+会话通道执行，重复向同一主机发送命令时无需重新建立TCP连接和密钥交换。
+连接定期发送keepalive，空闲超过SSH_IDLE_TIMEOUT后由后台线程关闭。
+
+主机密钥保存在OpenSSH格式的known_hosts文件（SSH_KNOWN_HOSTS_FILE）中，所有工作进程共用，
+重启后仍然有效：首次连接时记录主机密钥，之后密钥不一致则在发送密码之前拒绝连接。
+服务器重装等原因导致密钥变化时，需要从该文件中删除对应的行。
+
+建立TCP连接的方式可以通过socket_factory替换，便于对接进程内的SSH服务端进行测试（见tests/ssh_server.py）。
+paramiko在首次建立连接时才导入，不使用远程服务器的工作进程不承担其导入开销。
+"""
+
+import codecs
+import fcntl
+import io
+import os
+import select
+import socket
+import threading
+import time
+
+
+# 尝试解析私钥时依次使用的密钥类型（paramiko中的类名）
+KEY_CLASSES = ('Ed25519Key', 'ECDSAKey', 'RSAKey')
+
+# 默认的known_hosts文件路径
+DEFAULT_KNOWN_HOSTS = os.path.join(os.getcwd(), 'instance', 'ssh_known_hosts')
+
+
+def default_socket_factory(server, timeout):
+    """
+    建立到服务器SSH端口的TCP连接
+
+    Args:
+        server: 服务器对象
+        timeout: 连接超时（秒）
+
+    Returns:
+        socket.socket: 已连接的套接字
+    """
+    sock = socket.create_connection((server.hostname, server.port or 22), timeout=timeout)
+    sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+    return sock
+
+
+def load_private_key(text, passphrase=None):
+    """
+    解析文本格式的私钥
+
+    Args:
+        text: 私钥内容（PEM/OpenSSH格式）
+        passphrase: 私钥口令
+
+    Returns:
+        paramiko.PKey: 私钥对象
+
+    Raises:
+        paramiko.SSHException: 无法识别私钥格式，或私钥已加密但未提供口令
+    """
+    import paramiko
+
+    for name in KEY_CLASSES:
+        try:
+            return getattr(paramiko, name).from_private_key(io.StringIO(text), password=passphrase)
+        except paramiko.PasswordRequiredException:
+            raise paramiko.SSHException('私钥已加密，请使用不带口令的私钥')
+        except (paramiko.SSHException, ValueError):
+            continue
+    raise paramiko.SSHException('无法识别的私钥格式')
+
+
+class KnownHosts:
+    """
+    持久化的主机密钥记录（OpenSSH known_hosts格式）
+
+    每次校验时在文件锁内重新读取文件，多个工作进程同时首次连接同一台服务器时只记录一个密钥。
+
+    Args:
+        path: known_hosts文件路径
+    """
+
+    def __init__(self, path):
+        self.path = path
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def host_entry(hostname, port):
+        """known_hosts中的主机名：非22端口写作[主机]:端口"""
+        return hostname if port == 22 else f'[{hostname}]:{port}'
+
+    def verify(self, hostname, port, key):
+        """
+        校验主机密钥，主机没有记录时记录该密钥
+
+        Args:
+            hostname: 主机名或IP
+            port: SSH端口
+            key: 服务器提供的主机密钥（paramiko.PKey）
+
+        Raises:
+            paramiko.SSHException: 与已记录的密钥不一致
+        """
+        import paramiko
+
+        entry = self.host_entry(hostname, port)
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+
+        with self._lock:
+            fd = os.open(self.path, os.O_RDWR | os.O_CREAT, 0o600)
+            try:
+                fcntl.flock(fd, fcntl.LOCK_EX)
+                host_keys = paramiko.HostKeys()
+                host_keys.load(self.path)
+                known = host_keys.lookup(entry)
+                if known:
+                    # 已记录其他类型的密钥时，服务器改用新类型的密钥同样视为密钥变化
+                    if known.get(key.get_name()) != key:
+                        raise paramiko.SSHException(
+                            f'服务器 {entry} 的主机密钥与已记录的不一致，如确认服务器已重装，'
+                            f'请从 {self.path} 中删除该主机的记录')
+                    return
+
+                line = f'{entry} {key.get_name()} {key.get_base64()}\n'
+                os.lseek(fd, 0, os.SEEK_END)
+                os.write(fd, line.encode())
+            finally:
+                os.close(fd)
+
+
+class _Connection:
+    """连接池中的一个连接：Transport及其使用状态"""
+
+    def __init__(self, transport, max_channels):
+        self.transport = transport
+        self.channels = threading.BoundedSemaphore(max_channels)
+        self.active = 0
+        self.last_used = time.monotonic()
+        self.commands = 0
+
+    def is_alive(self):
+        return self.transport.is_active()
+
+
+class SSHConnectionPool:
+    """
+    按服务器复用SSH连接的连接池
+
+    Args:
+        connect_timeout: 建立连接和认证的超时（秒）
+        keepalive: keepalive间隔（秒），0表示不发送
+        idle_timeout: 连接空闲超过该时长后关闭（秒）
+        max_channels: 每个连接同时执行的命令数上限
+        socket_factory: 建立TCP连接的函数 socket_factory(server, timeout)
+        known_hosts: 保存主机密钥的known_hosts文件路径
+    """
+
+    def __init__(self, connect_timeout=10, keepalive=30, idle_timeout=300, max_channels=8,
+                 socket_factory=None, known_hosts=None):
+        self.connect_timeout = connect_timeout
+        self.keepalive = keepalive
+        self.idle_timeout = idle_timeout
+        self.max_channels = max_channels
+        self.socket_factory = socket_factory or default_socket_factory
+        self.known_hosts = KnownHosts(known_hosts or DEFAULT_KNOWN_HOSTS)
+
+        self._connections = {}
+        self._connect_locks = {}
+        self._lock = threading.Lock()
+        self._reaper = None
+        self._stopped = threading.Event()
+
+        # 统计信息
+        self.handshakes = 0
+        self.reused = 0
+        self.evicted = 0
+        self.failures = 0
+
+    @staticmethod
+    def _key(server):
+        """连接池的键：服务器ID及影响连接的字段，服务器信息修改后自动使用新连接"""
+        return (server.id, server.hostname, server.port or 22, server.username)
+
+    def _connect(self, server):
+        """建立并认证一个新的Transport"""
+        import paramiko
+
+        sock = self.socket_factory(server, self.connect_timeout)
+        transport = paramiko.Transport(sock)
+        try:
+            transport.banner_timeout = self.connect_timeout
+            transport.auth_timeout = self.connect_timeout
+            transport.start_client(timeout=self.connect_timeout)
+
+            # 认证之前校验主机密钥，密钥变化时不发送密码
+            self.known_hosts.verify(server.hostname, server.port or 22, transport.get_remote_server_key())
+
+            # 服务器密码只用于密码认证，不作为私钥口令
+            if server.private_key:
+                pkey = load_private_key(server.private_key)
+                transport.auth_publickey(server.username, pkey)
+            else:
+                transport.auth_password(server.username, server.password or '')
+
+            if self.keepalive:
+                transport.set_keepalive(self.keepalive)
+            return transport
+        except Exception:
+            transport.close()
+            raise
+
+    def _acquire(self, server):
+        """获取服务器的可用连接（不存在或已断开时新建）"""
+        key = self._key(server)
+        with self._lock:
+            connection = self._connections.get(key)
+            if connection is not None and connection.is_alive():
+                self.reused += 1
+                return connection
+            connect_lock = self._connect_locks.setdefault(key, threading.Lock())
+
+        # 同一台服务器同时只建立一个连接，其余线程等待后复用
+        with connect_lock:
+            with self._lock:
+                connection = self._connections.get(key)
+                if connection is not None and connection.is_alive():
+                    self.reused += 1
+                    return connection
+
+            try:
+                transport = self._connect(server)
+            except Exception:
+                self.failures += 1
+                raise
+
+            connection = _Connection(transport, self.max_channels)
+            with self._lock:
+                stale = self._connections.get(key)
+                self._connections[key] = connection
+                self.handshakes += 1
+            if stale is not None:
+                stale.transport.close()
+            self._start_reaper()
+            return connection
+
+    def _discard(self, server, connection):
+        """从连接池中移除并关闭一个连接"""
+        key = self._key(server)
+        with self._lock:
+            if self._connections.get(key) is connection:
+                del self._connections[key]
+        connection.transport.close()
+
+    def execute(self, server, command, timeout=300, cancel=None, on_output=None):
+        """
+        在服务器上执行命令
+
+        连接在通道打开前已断开时会重新连接并重试一次。
+
+        Args:
+            server: 服务器对象
+            command: 要执行的命令
+            timeout: 超时时间（秒）
+            cancel: 取消事件（threading.Event），被设置时关闭通道并停止等待
+            on_output: 输出回调 on_output(流名称, 文本)，指定时输出随读随交给回调，
+                       不在内存中累积，返回结果中的stdout/stderr为空
+
+        Returns:
+            dict: 包含返回码、标准输出和标准错误的字典
+
+        Raises:
+            paramiko.SSHException: 连接或认证失败
+            socket.timeout: 命令执行超时
+            InterruptedError: 命令被取消
+        """
+        import paramiko
+
+        deadline = time.monotonic() + timeout
+        for attempt in range(2):
+            connection = self._acquire(server)
+            if not connection.channels.acquire(timeout=max(0, deadline - time.monotonic())):
+                raise socket.timeout(f'等待服务器 {server.hostname} 的空闲通道超时')
+            try:
+                with self._lock:
+                    connection.active += 1
+                try:
+                    channel = connection.transport.open_session(
+                        timeout=min(self.connect_timeout, max(0.1, deadline - time.monotonic())))
+                except (paramiko.SSHException, EOFError, OSError):
+                    # 连接已失效（如服务器重启），丢弃后重试
+                    self._discard(server, connection)
+                    if attempt:
+                        raise
+                    continue
+                return self._run(channel, command, deadline, cancel, on_output)
+            finally:
+                with self._lock:
+                    connection.active -= 1
+                    connection.commands += 1
+                    connection.last_used = time.monotonic()
+                connection.channels.release()
+
+    def _run(self, channel, command, deadline, cancel=None, on_output=None):
+        """在通道上执行命令并读取输出"""
+        chunks = {'stdout': [], 'stderr': []}
+        decoders = {name: codecs.getincrementaldecoder('utf-8')(errors='replace') for name in chunks}
+
+        def emit(name, data, final=False):
+            if on_output is None:
+                chunks[name].append(data)
+                return
+            text = decoders[name].decode(data, final)
+            if text:
+                on_output(name, text)
+
+        try:
+            channel.exec_command(command)
+            while True:
+                while channel.recv_ready():
+                    emit('stdout', channel.recv(32768))
+                while channel.recv_stderr_ready():
+                    emit('stderr', channel.recv_stderr(32768))
+                if channel.exit_status_ready() and channel.eof_received \
+                        and not channel.recv_ready() and not channel.recv_stderr_ready():
+                    break
+
+                if cancel is not None and cancel.is_set():
+                    raise InterruptedError('命令已取消')
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise socket.timeout('命令执行超时')
+                select.select([channel], [], [], min(remaining, 0.2 if cancel is not None else 1))
+
+            for name in chunks:
+                emit(name, b'', final=True)
+            return {
+                'returncode': channel.recv_exit_status(),
+                'stdout': b''.join(chunks['stdout']).decode('utf-8', errors='replace'),
+                'stderr': b''.join(chunks['stderr']).decode('utf-8', errors='replace')
+            }
+        finally:
+            channel.close()
+
+    def evict_idle(self, now=None):
+        """
+        关闭空闲超时或已断开的连接
+
+        Args:
+            now: 当前时间（单调时钟秒）
+
+        Returns:
+            int: 关闭的连接数
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            expired = [
+                key for key, connection in self._connections.items()
+                if not connection.is_alive()
+                or (connection.active == 0 and now - connection.last_used > self.idle_timeout)
+            ]
+            connections = [self._connections.pop(key) for key in expired]
+            self.evicted += len(connections)
+
+        for connection in connections:
+            connection.transport.close()
+        return len(connections)
+
+    def _start_reaper(self):
+        """启动清理空闲连接的后台线程"""
+        if self._reaper is not None and self._reaper.is_alive():
+            return
+        self._stopped.clear()
+        self._reaper = threading.Thread(target=self._reap, name='ssh-pool-reaper', daemon=True)
+        self._reaper.start()
+
+    def _reap(self):
+        interval = max(1, min(self.idle_timeout / 2, 60))
+        while not self._stopped.wait(interval):
+            self.evict_idle()
+
+    def close(self):
+        """关闭全部连接并停止后台线程"""
+        self._stopped.set()
+        with self._lock:
+            connections = list(self._connections.values())
+            self._connections.clear()
+        for connection in connections:
+            connection.transport.close()
+
+    def stats(self):
+        """
+        获取连接池统计信息
+
+        Returns:
+            dict: 连接数、握手次数、复用次数等
+        """
+        with self._lock:
+            return {
+                'connections': len(self._connections),
+                'active_channels': sum(c.active for c in self._connections.values()),
+                'handshakes': self.handshakes,
+                'reused': self.reused,
+                'evicted': self.evicted,
+                'failures': self.failures
+            }
+
+
+_pool = None
+_pool_pid = None
+_pool_lock = threading.Lock()
+
+
+def get_ssh_pool():
+    """
+    获取当前进程共享的SSH连接池（首次调用时按应用配置创建）
+
+    连接不能跨进程共享，fork出的子进程会创建自己的连接池。
+
+    Returns:
+        SSHConnectionPool: 连接池实例
+    """
+    global _pool, _pool_pid
+    if _pool is not None and _pool_pid == os.getpid():
+        return _pool
+
+    from flask import current_app, has_app_context
+    config = current_app.config if has_app_context() else {}
+
+    with _pool_lock:
+        if _pool is None or _pool_pid != os.getpid():
+            _pool = SSHConnectionPool(
+                connect_timeout=config.get('SSH_CONNECT_TIMEOUT', 10),
+                keepalive=config.get('SSH_KEEPALIVE_INTERVAL', 30),
+                idle_timeout=config.get('SSH_IDLE_TIMEOUT', 300),
+                max_channels=config.get('SSH_MAX_CHANNELS', 8),
+                known_hosts=config.get('SSH_KNOWN_HOSTS_FILE')
+            )
+            _pool_pid = os.getpid()
+    return _pool
@@ -14,7 +14,6 @@ from app.users.forms import RegistrationForm, LoginForm, UpdateAccountForm
 import secrets
 import os
 from datetime import datetime
-from PIL import Image
 
 users = Blueprint('users', __name__)
 
@@ -89,7 +88,8 @@ def save_picture(form_picture):
     picture_fn = random_hex + f_ext
     picture_path = os.path.join(current_app.root_path, 'static/profile_pics', picture_fn)
     
-    # 调整图片大小
+    # 调整图片大小（Pillow只在上传头像时导入）
+    from PIL import Image
     output_size = (125, 125)
     i = Image.open(form_picture)
     i.thumbnail(output_size)
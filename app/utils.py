@@ -29,3 +29,13 @@ def admin_required(f):
             return redirect(url_for('dashboard.home'))
         return f(*args, **kwargs)
     return decorated_function
+
+
+def is_admin(user=None):
+    """判断用户（默认为当前用户）是否为已登录的管理员
+    
+    用于不能重定向的场景（如请求钩子和API），视图函数应使用admin_required。
+    """
+    if user is None:
+        user = current_user
+    return user.is_authenticated and user.role == 'admin'
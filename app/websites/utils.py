@@ -16,8 +16,9 @@ import json
 import re
 import ssl
 import socket
-from cryptography import x509
-from cryptography.hazmat.backends import default_backend
+import shlex
+
+from app.executor import run_local_command
 
 
 # 默认网站目录
@@ -31,6 +32,9 @@ APACHE_ENABLED_DIR = '/etc/apache2/sites-enabled'
 NGINX_VHOST_DIR = '/etc/nginx/sites-available'
 NGINX_ENABLED_DIR = '/etc/nginx/sites-enabled'
 
+# 安装软件和申请证书等耗时命令的超时时间（秒）
+LONG_COMMAND_TIMEOUT = 1800
+
 # SSL 证书目录
 SSL_CERT_DIR = '/etc/ssl/certs'
 SSL_KEY_DIR = '/etc/ssl/private'
@@ -51,7 +55,7 @@ def ensure_directory(path):
         if not os.path.exists(path):
             os.makedirs(path, exist_ok=True)
             # 设置权限
-            subprocess.run(['chmod', '755', path], check=True)
+            run_local_command(['chmod', '755', path], check=True)
         return True
     except (OSError, subprocess.SubprocessError) as e:
         print(f'创建目录失败: {e}')
@@ -70,18 +74,18 @@ def get_web_servers():
     
     # 检查Apache
     try:
-        result = subprocess.run(['apache2', '-v'], capture_output=True, text=True)
+        result = run_local_command(['apache2', '-v'])
         if result.returncode == 0 and 'Apache' in result.stdout:
             web_servers.append('Apache')
-    except (FileNotFoundError, subprocess.SubprocessError):
+    except subprocess.SubprocessError:
         pass
     
     # 检查Nginx
     try:
-        result = subprocess.run(['nginx', '-v'], capture_output=True, text=True)
+        result = run_local_command(['nginx', '-v'])
         if result.returncode == 0 and 'nginx' in result.stdout:
             web_servers.append('Nginx')
-    except (FileNotFoundError, subprocess.SubprocessError):
+    except subprocess.SubprocessError:
         pass
     
     return web_servers
@@ -211,8 +215,8 @@ def create_website_directory(domain):
 ''')
         
         # 设置正确的权限
-        subprocess.run(['chown', '-R', 'www-data:www-data', website_dir], check=True)
-        subprocess.run(['chmod', '755', doc_root], check=True)
+        run_local_command(['chown', '-R', 'www-data:www-data', website_dir], check=True)
+        run_local_command(['chmod', '755', doc_root], check=True)
         
         return doc_root
     except Exception as e:
@@ -237,7 +241,7 @@ def delete_website_directory(doc_root):
         
         if os.path.exists(website_dir):
             # 删除整个网站目录
-            subprocess.run(['rm', '-rf', website_dir], check=True)
+            run_local_command(['rm', '-rf', website_dir], check=True)
         
         return True
     except Exception as e:
@@ -263,7 +267,7 @@ def create_apache_vhost(website):
         logs_dir = os.path.join(os.path.dirname(doc_root), 'logs')
         
         # 检查Apache是否安装
-        result = subprocess.run(['apache2', '-v'], capture_output=True, text=True)
+        result = run_local_command(['apache2', '-v'])
         if result.returncode != 0:
             return False
         
@@ -352,7 +356,7 @@ def create_apache_vhost(website):
             f.write(config_content)
         
         # 启用虚拟主机
-        subprocess.run(['a2ensite', f'{domain}.conf'], check=True)
+        run_local_command(['a2ensite', f'{domain}.conf'], check=True)
         
         return True
     except Exception as e:
@@ -376,7 +380,7 @@ def delete_apache_vhost(website):
         config_path = os.path.join(APACHE_VHOST_DIR, f'{domain}.conf')
         
         # 禁用虚拟主机
-        subprocess.run(['a2dissite', f'{domain}.conf'], check=True)
+        run_local_command(['a2dissite', f'{domain}.conf'], check=True)
         
         # 删除配置文件
         if os.path.exists(config_path):
@@ -406,7 +410,7 @@ def create_nginx_vhost(website):
         logs_dir = os.path.join(os.path.dirname(doc_root), 'logs')
         
         # 检查Nginx是否安装
-        result = subprocess.run(['nginx', '-v'], capture_output=True, text=True)
+        result = run_local_command(['nginx', '-v'])
         if result.returncode != 0:
             return False
         
@@ -547,9 +551,9 @@ def reload_web_server(web_server):
     """
     try:
         if web_server == 'Apache':
-            subprocess.run(['systemctl', 'reload', 'apache2'], check=True)
+            run_local_command(['systemctl', 'reload', 'apache2'], check=True)
         elif web_server == 'Nginx':
-            subprocess.run(['systemctl', 'reload', 'nginx'], check=True)
+            run_local_command(['systemctl', 'reload', 'nginx'], check=True)
         else:
             return False
         
@@ -572,17 +576,17 @@ def install_ssl_cert(domain):
     """
     try:
         # 检查certbot是否安装
-        result = subprocess.run(['certbot', '--version'], capture_output=True, text=True)
+        result = run_local_command(['certbot', '--version'])
         if result.returncode != 0:
             # 尝试安装certbot
-            subprocess.run(['apt-get', 'update'], check=True)
-            subprocess.run(['apt-get', 'install', '-y', 'certbot'], check=True)
+            run_local_command(['apt-get', 'update'], check=True, timeout=LONG_COMMAND_TIMEOUT)
+            run_local_command(['apt-get', 'install', '-y', 'certbot'], check=True, timeout=LONG_COMMAND_TIMEOUT)
         
         # 获取SSL证书
         # 注意：这里使用--standalone模式，需要确保80端口未被占用
         # 在实际生产环境中，可能需要使用webroot模式
         cmd = ['certbot', 'certonly', '--standalone', '--agree-tos', '--email', 'admin@example.com', '-d', domain, '-d', f'www.{domain}']
-        subprocess.run(cmd, check=True)
+        run_local_command(cmd, check=True, timeout=LONG_COMMAND_TIMEOUT)
         
         # 复制证书到指定位置
         cert_path = f'/etc/letsencrypt/live/{domain}/fullchain.pem'
@@ -593,12 +597,12 @@ def install_ssl_cert(domain):
         ensure_directory(SSL_KEY_DIR)
         
         # 复制证书
-        subprocess.run(['cp', cert_path, os.path.join(SSL_CERT_DIR, f'{domain}.pem')], check=True)
-        subprocess.run(['cp', key_path, os.path.join(SSL_KEY_DIR, f'{domain}.key')], check=True)
+        run_local_command(['cp', cert_path, os.path.join(SSL_CERT_DIR, f'{domain}.pem')], check=True)
+        run_local_command(['cp', key_path, os.path.join(SSL_KEY_DIR, f'{domain}.key')], check=True)
         
         # 设置权限
-        subprocess.run(['chmod', '644', os.path.join(SSL_CERT_DIR, f'{domain}.pem')], check=True)
-        subprocess.run(['chmod', '600', os.path.join(SSL_KEY_DIR, f'{domain}.key')], check=True)
+        run_local_command(['chmod', '644', os.path.join(SSL_CERT_DIR, f'{domain}.pem')], check=True)
+        run_local_command(['chmod', '600', os.path.join(SSL_KEY_DIR, f'{domain}.key')], check=True)
         
         return True
     except Exception as e:
@@ -626,7 +630,9 @@ def get_ssl_info(domain):
         with open(cert_path, 'rb') as f:
             cert_data = f.read()
         
-        # 解析证书
+        # 解析证书（cryptography只在读取证书时导入）
+        from cryptography import x509
+        from cryptography.hazmat.backends import default_backend
         cert = x509.load_pem_x509_certificate(cert_data, default_backend())
         
         # 获取证书信息
@@ -700,7 +706,7 @@ def get_website_stats(website):
         
         # 检查网站状态
         try:
-            result = subprocess.run(['curl', '-I', '-m', '5', f'http://{website.domain}'], capture_output=True, text=True)
+            result = run_local_command(['curl', '-I', '-m', '5', f'http://{website.domain}'])
             if result.returncode == 0 and '200 OK' in result.stdout:
                 stats['status'] = 'up'
             else:
@@ -711,7 +717,7 @@ def get_website_stats(website):
         # 获取磁盘使用情况
         try:
             doc_root = website.document_root
-            result = subprocess.run(['du', '-sh', doc_root], capture_output=True, text=True)
+            result = run_local_command(['du', '-sh', doc_root])
             if result.returncode == 0:
                 stats['disk_usage'] = result.stdout.split()[0]
         except Exception:
@@ -719,7 +725,7 @@ def get_website_stats(website):
         
         # 获取文件数量
         try:
-            result = subprocess.run(['find', website.document_root, '-type', 'f', '|', 'wc', '-l'], shell=True, capture_output=True, text=True)
+            result = run_local_command(f'find {shlex.quote(website.document_root)} -type f | wc -l')
             if result.returncode == 0:
                 stats['file_count'] = int(result.stdout.strip())
         except Exception:
@@ -763,7 +769,7 @@ def restart_website_service(website):
         # 如果使用PHP，重启PHP-FPM
         if website.php_version:
             php_module = f'php{website.php_version.replace('.', '')}-fpm'
-            subprocess.run(['systemctl', 'restart', php_module], check=True)
+            run_local_command(['systemctl', 'restart', php_module], check=True)
         
         return True
     except Exception as e:
@@ -792,7 +798,7 @@ def get_website_logs(website, log_type='access', lines=100):
             return []
         
         # 获取日志内容
-        result = subprocess.run(['tail', '-n', str(lines), log_file], capture_output=True, text=True)
+        result = run_local_command(['tail', '-n', str(lines), log_file])
         if result.returncode == 0:
             return result.stdout.strip().split('\n')
         else:
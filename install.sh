@@ -132,7 +132,7 @@ Environment=FLASK_ENV=prod
 Environment=DATABASE_URL=sqlite:///$DATA_DIR/tiny_panel.db
 Environment=SECRET_KEY=$(openssl rand -hex 32)
 Environment=LOG_TO_STDOUT=true
-ExecStart=$INSTALL_DIR/venv/bin/gunicorn -w 4 -b 0.0.0.0:8888 app:create_app('prod')
+ExecStart=$INSTALL_DIR/venv/bin/gunicorn -w 4 --worker-class gthread --threads 16 -b 0.0.0.0:8888 app:create_app('prod')
 Restart=always
 RestartSec=5s
 
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+启动性能基准
+
+在全新的Python子进程中冷启动应用，测量导入app包的耗时、create_app()的耗时、
+进程的峰值内存（RSS）和加载的模块数，并检查重量级依赖是否在启动时被导入。
+结果与startup_budget.json中记录的预算比较，超出预算时以非零状态码退出，
+可以在部署前或持续集成中运行，防止启动变慢的改动被合入。
+
+每个gunicorn工作进程启动或被回收重启时都要付出这些开销；使用--preload时，
+启动时导入的模块会被fork出的所有工作进程共享。
+
+用法：
+    python3 startup_benchmark.py                # 运行5次，报告中位数并检查预算
+    python3 startup_benchmark.py --runs 10 --json
+    python3 startup_benchmark.py --update-budget  # 以本次结果（留出余量）更新预算
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+BUDGET_FILE = os.path.join(BASE_DIR, 'startup_budget.json')
+
+# 只应在首次使用时导入的重量级依赖
+HEAVY_MODULES = (
+    'paramiko',
+    'numpy',
+    'psutil',
+    'PIL',
+    'psycopg2',
+    'mysql.connector',
+    'cryptography.x509',
+)
+
+# 更新预算时在测量值的基础上留出的余量
+BUDGET_HEADROOM = 1.5
+
+# 在子进程中执行的测量代码，结果以JSON写入最后一行输出
+CHILD_CODE = '''
+import json, resource, sys, time
+started = time.perf_counter()
+import app
+imported = time.perf_counter()
+application = app.create_app(sys.argv[1])
+created = time.perf_counter()
+heavy = [name for name in json.loads(sys.argv[2]) if name in sys.modules]
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'total_ms': (created - started) * 1000,
+    'max_rss_kb': resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+    'modules': len(sys.modules),
+    'heavy_modules': heavy
+}))
+'''
+
+
+def run_once(config_name):
+    """
+    在新的子进程中冷启动一次应用
+
+    Args:
+        config_name: 传给create_app的配置名称
+
+    Returns:
+        dict: 本次的测量结果
+    """
+    with tempfile.TemporaryDirectory(prefix='tiny_panel_bench_') as tmp_dir:
+        env = dict(os.environ)
+        env.update({
+            'MONITORING_COLLECTOR_ENABLED': '0',
+            'DATABASE_URL': f'sqlite:///{os.path.join(tmp_dir, "bench.db")}',
+            'PYTHONDONTWRITEBYTECODE': '1',
+        })
+        result = subprocess.run(
+            [sys.executable, '-c', CHILD_CODE, config_name, json.dumps(HEAVY_MODULES)],
+            cwd=BASE_DIR, env=env, capture_output=True, text=True
+        )
+    if result.returncode != 0:
+        raise RuntimeError(result.stderr.strip() or f'子进程退出码 {result.returncode}')
+    return json.loads(result.stdout.strip().splitlines()[-1])
+
+
+def summarize(samples):
+    """
+    汇总多次测量的结果（数值取中位数，重量级模块取并集）
+
+    Args:
+        samples: run_once返回的结果列表
+
+    Returns:
+        dict: 汇总结果
+    """
+    summary = {
+        key: round(statistics.median(sample[key] for sample in samples), 1)
+        for key in ('import_ms', 'create_app_ms', 'total_ms', 'max_rss_kb', 'modules')
+    }
+    summary['heavy_modules'] = sorted({name for sample in samples for name in sample['heavy_modules']})
+    summary['runs'] = len(samples)
+    return summary
+
+
+def load_budget(path=BUDGET_FILE):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def check_budget(summary, budget):
+    """
+    检查汇总结果是否超出预算
+
+    Args:
+        summary: 汇总结果
+        budget: 预算（数值上限和允许在启动时导入的重量级模块）
+
+    Returns:
+        list: 超出预算的项目说明，全部满足时返回空列表
+    """
+    violations = []
+    for key in ('total_ms', 'max_rss_kb', 'modules'):
+        limit = budget.get(key)
+        if limit is not None and summary[key] > limit:
+            violations.append(f'{key} = {summary[key]}，超出预算 {limit}')
+    allowed = set(budget.get('allowed_heavy_modules', []))
+    for name in summary['heavy_modules']:
+        if name not in allowed:
+            violations.append(f'启动时导入了重量级依赖 {name}')
+    return violations
+
+
+def update_budget(summary, path=BUDGET_FILE):
+    """以本次结果乘以余量作为新的预算"""
+    budget = {
+        'total_ms': round(summary['total_ms'] * BUDGET_HEADROOM),
+        'max_rss_kb': round(summary['max_rss_kb'] * BUDGET_HEADROOM),
+        'modules': round(summary['modules'] * BUDGET_HEADROOM),
+        'allowed_heavy_modules': summary['heavy_modules']
+    }
+    with open(path, 'w') as f:
+        json.dump(budget, f, indent=4)
+        f.write('\n')
+    return budget
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiny Panel启动性能基准')
+    parser.add_argument('--runs', type=int, default=5, help='冷启动次数（默认5）')
+    parser.add_argument('--config', default='prod', help='传给create_app的配置名称（默认prod）')
+    parser.add_argument('--budget', default=BUDGET_FILE, help='预算文件路径')
+    parser.add_argument('--update-budget', action='store_true', help='以本次结果更新预算文件')
+    parser.add_argument('--json', action='store_true', help='以JSON格式输出结果')
+    args = parser.parse_args()
+
+    try:
+        samples = [run_once(args.config) for _ in range(max(1, args.runs))]
+    except RuntimeError as e:
+        print(f'启动应用失败: {e}', file=sys.stderr)
+        return 2
+    summary = summarize(samples)
+
+    if args.update_budget:
+        budget = update_budget(summary, args.budget)
+    else:
+        budget = load_budget(args.budget)
+    violations = check_budget(summary, budget) if budget else []
+
+    if args.json:
+        print(json.dumps({'result': summary, 'budget': budget, 'violations': violations}, ensure_ascii=False, indent=4))
+    else:
+        print(f'运行次数:        {summary["runs"]}')
+        print(f'导入app包:       {summary["import_ms"]} ms')
+        print(f'create_app():    {summary["create_app_ms"]} ms')
+        print(f'合计:            {summary["total_ms"]} ms')
+        print(f'峰值内存(RSS):   {summary["max_rss_kb"] / 1024:.1f} MB')
+        print(f'已加载模块数:    {summary["modules"]}')
+        print(f'重量级依赖:      {", ".join(summary["heavy_modules"]) or "无"}')
+        if budget is None:
+            print('未找到预算文件，使用 --update-budget 生成')
+        for violation in violations:
+            print(f'超出预算: {violation}')
+
+    return 1 if violations else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
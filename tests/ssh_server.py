@@ -0,0 +1,101 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+进程内SSH服务端
+
+基于paramiko的服务端模式实现的SSH服务端替身，通过socketpair与SSHConnectionPool直接对接
+（作为连接池的socket_factory），不监听端口、不执行真实命令，用于测试连接池的连接复用、
+主机密钥校验和认证流程。
+"""
+
+import socket
+import threading
+
+import paramiko
+
+
+class _ServerInterface(paramiko.ServerInterface):
+    """认证和通道请求的处理"""
+
+    def __init__(self, stand_in):
+        self.stand_in = stand_in
+
+    def get_allowed_auths(self, username):
+        return 'password,publickey'
+
+    def check_auth_password(self, username, password):
+        self.stand_in.auth_attempts.append(('password', username, password))
+        if (username, password) == (self.stand_in.username, self.stand_in.password):
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_auth_publickey(self, username, key):
+        self.stand_in.auth_attempts.append(('publickey', username, key.get_base64()))
+        if username == self.stand_in.username and key in self.stand_in.authorized_keys:
+            return paramiko.AUTH_SUCCESSFUL
+        return paramiko.AUTH_FAILED
+
+    def check_channel_request(self, kind, chanid):
+        if kind == 'session':
+            return paramiko.OPEN_SUCCEEDED
+        return paramiko.OPEN_FAILED_ADMINISTRATIVELY_PROHIBITED_OPEN_REQUEST
+
+    def check_channel_exec_request(self, channel, command):
+        threading.Thread(target=self.stand_in._exec, args=(channel, command.decode()), daemon=True).start()
+        return True
+
+
+class InProcessSSHServer:
+    """
+    进程内SSH服务端
+
+    Args:
+        username: 允许登录的用户名
+        password: 允许登录的密码
+        host_key: 主机密钥，默认生成新的RSA密钥
+        handler: 命令处理函数 handler(command)，返回(返回码, 标准输出, 标准错误)，
+                 默认将命令原样作为标准输出返回
+    """
+
+    def __init__(self, username='root', password='secret', host_key=None, handler=None):
+        self.username = username
+        self.password = password
+        self.host_key = host_key or paramiko.RSAKey.generate(2048)
+        self.handler = handler or (lambda command: (0, command, ''))
+        self.authorized_keys = []
+        self.auth_attempts = []
+        self.commands = []
+        self.connections = 0
+        self._transports = []
+
+    def socket_factory(self, server, timeout):
+        """供SSHConnectionPool使用的socket_factory：返回已连接到本服务端的套接字"""
+        client_sock, server_sock = socket.socketpair()
+        transport = paramiko.Transport(server_sock)
+        transport.add_server_key(self.host_key)
+        # 传入event时start_server立即返回，协商在Transport线程中进行
+        transport.start_server(event=threading.Event(), server=_ServerInterface(self))
+        self._transports.append(transport)
+        self.connections += 1
+        return client_sock
+
+    def _exec(self, channel, command):
+        self.commands.append(command)
+        try:
+            status, stdout, stderr = self.handler(command)
+            if stdout:
+                channel.sendall(stdout.encode())
+            if stderr:
+                channel.sendall_stderr(stderr.encode())
+            channel.send_exit_status(status)
+        finally:
+            # 只发送EOF，由客户端关闭通道：此时exec请求的应答可能尚未发出，提前关闭会使客户端认为请求失败
+            channel.shutdown_write()
+
+    def close(self):
+        """关闭所有服务端连接"""
+        for transport in self._transports:
+            transport.close()
+        self._transports.clear()
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+LTTB降采样测试（与逐桶计算的参考实现对比）
+"""
+
+import math
+import random
+import unittest
+
+from app.monitoring.downsample import lttb_indices
+
+
+def reference_lttb(x, y, threshold):
+    """按原始论文逐桶计算的单序列LTTB，返回保留的下标"""
+    length = len(x)
+    if threshold >= length or threshold < 3:
+        return list(range(length))
+
+    every = (length - 2) / (threshold - 2)
+    selected = [0]
+    previous = 0
+    for i in range(threshold - 2):
+        # 下一个桶的平均点（最后一个桶的下一个桶只有终点）
+        avg_start = int(math.floor((i + 1) * every)) + 1
+        avg_end = min(int(math.floor((i + 2) * every)) + 1, length)
+        avg_x = sum(x[avg_start:avg_end]) / (avg_end - avg_start)
+        avg_y = sum(y[avg_start:avg_end]) / (avg_end - avg_start)
+
+        start = int(math.floor(i * every)) + 1
+        end = int(math.floor((i + 1) * every)) + 1
+        best, best_area = start, -1
+        for j in range(start, end):
+            area = abs((x[previous] - avg_x) * (y[j] - y[previous])
+                       - (x[previous] - x[j]) * (avg_y - y[previous]))
+            if area > best_area:
+                best, best_area = j, area
+        selected.append(best)
+        previous = best
+    selected.append(length - 1)
+    return selected
+
+
+class LTTBTest(unittest.TestCase):
+
+    def test_matches_reference(self):
+        rng = random.Random(42)
+        for length, threshold in ((10, 4), (100, 10), (1000, 37), (8640, 500), (257, 256)):
+            x = sorted(rng.uniform(0, 86400) for _ in range(length))
+            y = [rng.gauss(50, 20) for _ in range(length)]
+            with self.subTest(length=length, threshold=threshold):
+                self.assertEqual(lttb_indices(x, y, threshold).tolist(), reference_lttb(x, y, threshold))
+
+    def test_last_bucket_average_excludes_end_point(self):
+        # 最后一个桶的平均点若计入终点，倒数第二个桶会选中[0, 4, 7, 9]
+        x = list(range(10))
+        y = [5, 8, 6, 8, 3, 4, 4, 9, 7, 8]
+        self.assertEqual(lttb_indices(x, y, 4).tolist(), [0, 1, 5, 9])
+
+    def test_keeps_all_points_below_threshold(self):
+        self.assertEqual(lttb_indices([0, 1, 2], [1, 2, 3], 5).tolist(), [0, 1, 2])
+
+
+if __name__ == '__main__':
+    unittest.main()
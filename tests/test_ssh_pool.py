@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+SSH连接池测试（使用进程内SSH服务端）
+"""
+
+import io
+import os
+import tempfile
+import unittest
+from types import SimpleNamespace
+
+import paramiko
+
+from app.ssh_pool import SSHConnectionPool
+from tests.ssh_server import InProcessSSHServer
+
+
+def make_server(**fields):
+    values = {'id': 1, 'hostname': '192.0.2.10', 'port': 22, 'username': 'root',
+              'password': 'secret', 'private_key': None}
+    values.update(fields)
+    return SimpleNamespace(**values)
+
+
+class SSHConnectionPoolTest(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.TemporaryDirectory()
+        self.known_hosts = os.path.join(self.tmpdir.name, 'known_hosts')
+        self.ssh_server = InProcessSSHServer()
+        self.pools = []
+
+    def tearDown(self):
+        for pool in self.pools:
+            pool.close()
+        self.ssh_server.close()
+        self.tmpdir.cleanup()
+
+    def make_pool(self, ssh_server=None):
+        pool = SSHConnectionPool(connect_timeout=5, keepalive=0,
+                                 socket_factory=(ssh_server or self.ssh_server).socket_factory,
+                                 known_hosts=self.known_hosts)
+        self.pools.append(pool)
+        return pool
+
+    def test_reuses_connection(self):
+        pool = self.make_pool()
+        server = make_server()
+
+        first = pool.execute(server, 'echo one', timeout=5)
+        second = pool.execute(server, 'echo two', timeout=5)
+
+        self.assertEqual(first, {'returncode': 0, 'stdout': 'echo one', 'stderr': ''})
+        self.assertEqual(second['stdout'], 'echo two')
+        self.assertEqual(self.ssh_server.connections, 1)
+        self.assertEqual(pool.stats()['handshakes'], 1)
+        self.assertEqual(pool.stats()['reused'], 1)
+
+    def test_returns_exit_status_and_stderr(self):
+        self.ssh_server.handler = lambda command: (3, '', 'failed\n')
+        result = self.make_pool().execute(make_server(), 'false', timeout=5)
+
+        self.assertEqual(result['returncode'], 3)
+        self.assertEqual(result['stderr'], 'failed\n')
+
+    def test_host_key_persisted_across_pools(self):
+        self.make_pool().execute(make_server(port=2222), 'true', timeout=5)
+
+        with open(self.known_hosts) as f:
+            self.assertIn('[192.0.2.10]:2222 ssh-rsa', f.read())
+
+        # 新的连接池（如重启后或另一个工作进程）使用同一文件，密钥一致时正常连接
+        result = self.make_pool().execute(make_server(port=2222), 'true', timeout=5)
+        self.assertEqual(result['returncode'], 0)
+
+    def test_changed_host_key_rejected_before_password(self):
+        self.make_pool().execute(make_server(), 'true', timeout=5)
+
+        impostor = InProcessSSHServer()
+        try:
+            with self.assertRaises(paramiko.SSHException):
+                self.make_pool(impostor).execute(make_server(), 'true', timeout=5)
+            self.assertEqual(impostor.auth_attempts, [])
+            self.assertEqual(impostor.commands, [])
+        finally:
+            impostor.close()
+
+    def test_public_key_auth_does_not_use_password_as_passphrase(self):
+        key = paramiko.RSAKey.generate(2048)
+        self.ssh_server.authorized_keys.append(key)
+
+        text = io.StringIO()
+        key.write_private_key(text)
+        result = self.make_pool().execute(make_server(private_key=text.getvalue()), 'true', timeout=5)
+        self.assertEqual(result['returncode'], 0)
+        self.assertEqual([attempt[0] for attempt in self.ssh_server.auth_attempts], ['publickey'])
+
+        # 加密的私钥不会用服务器密码尝试解密
+        encrypted = io.StringIO()
+        key.write_private_key(encrypted, password='secret')
+        with self.assertRaises(paramiko.SSHException):
+            self.make_pool().execute(make_server(id=2, hostname='192.0.2.11',
+                                                 private_key=encrypted.getvalue()), 'true', timeout=5)
+
+
+if __name__ == '__main__':
+    unittest.main()
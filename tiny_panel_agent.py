@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+# -*- coding: utf-8 -*-
+
+"""
+Tiny Panel - Linux服务器管理面板
+监控代理
+
+在被监控的服务器上运行，本地读取/proc采集监控数据，按批压缩后推送到面板的
+/monitoring/api/ingest接口。面板不再需要通过SSH逐台采集，服务器位于NAT之后时也能上报数据。
+只依赖Python标准库（Python 3.6+），可单独复制到服务器上运行。
+
+用法：
+    python3 tiny_panel_agent.py --url https://panel.example.com/monitoring/api/ingest \\
+        --server-id 3 --token <代理令牌>
+
+代理令牌由管理员在面板中通过 /monitoring/api/agent_token/<服务器ID> 获取。
+参数也可以通过环境变量TINY_PANEL_URL、TINY_PANEL_SERVER_ID、TINY_PANEL_TOKEN提供。
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+import urllib.error
+import urllib.request
+from collections import deque
+
+
+AGENT_VERSION = '1.0'
+
+# 推送失败时最多缓存的样本数（10秒周期下约24小时）
+MAX_PENDING = 8640
+
+
+def read_file(path):
+    with open(path) as f:
+        return f.read()
+
+
+def read_cpu_times():
+    """读取/proc/stat中的CPU时间，返回(总时间, 空闲时间)"""
+    values = [float(v) for v in read_file('/proc/stat').splitlines()[0].split()[1:9]]
+    # user nice system idle iowait irq softirq steal
+    return sum(values), values[3] + values[4]
+
+
+def read_memory_usage():
+    """根据/proc/meminfo计算内存使用率"""
+    values = {}
+    for line in read_file('/proc/meminfo').splitlines():
+        name, _, rest = line.partition(':')
+        parts = rest.split()
+        if parts:
+            values[name] = int(parts[0])
+    total = values.get('MemTotal', 0)
+    if not total:
+        return 0.0
+    available = values.get('MemAvailable')
+    if available is None:
+        available = values.get('MemFree', 0) + values.get('Buffers', 0) + values.get('Cached', 0)
+    return round((total - available) / total * 100, 1)
+
+
+def read_disk_usage(path):
+    """计算挂载点的磁盘使用率（与df算法一致）"""
+    st = os.statvfs(path)
+    used = (st.f_blocks - st.f_bfree) * st.f_frsize
+    available = st.f_bavail * st.f_frsize
+    if used + available <= 0:
+        return 0.0
+    return round(used / (used + available) * 100, 1)
+
+
+def read_net_bytes():
+    """汇总/proc/net/dev中除回环接口外的收发字节数"""
+    recv = sent = 0
+    for line in read_file('/proc/net/dev').splitlines():
+        if ':' not in line:
+            continue
+        name, data = line.split(':', 1)
+        if name.strip() == 'lo':
+            continue
+        parts = data.split()
+        if len(parts) >= 9:
+            recv += int(parts[0])
+            sent += int(parts[8])
+    return recv, sent
+
+
+def read_uptime():
+    return int(float(read_file('/proc/uptime').split()[0]))
+
+
+class Sampler:
+    """基于与上次读数差值计算CPU使用率和网络速率的采样器"""
+
+    def __init__(self, disk_path='/'):
+        self.disk_path = disk_path
+        self.previous = None
+
+    def sample(self):
+        now = time.monotonic()
+        cpu_total, cpu_idle = read_cpu_times()
+        recv, sent = read_net_bytes()
+
+        cpu_usage = 0.0
+        network_rx = network_tx = 0.0
+        if self.previous is not None:
+            last_time, last_total, last_idle, last_recv, last_sent = self.previous
+            total = cpu_total - last_total
+            if total > 0:
+                cpu_usage = round(max(0.0, min(100.0, (1 - (cpu_idle - last_idle) / total) * 100)), 1)
+            elapsed = now - last_time
+            if elapsed > 0 and recv >= last_recv and sent >= last_sent:
+                network_rx = (recv - last_recv) / elapsed
+                network_tx = (sent - last_sent) / elapsed
+        self.previous = (now, cpu_total, cpu_idle, recv, sent)
+
+        return {
+            'timestamp': time.time(),
+            'cpu_usage': cpu_usage,
+            'memory_usage': read_memory_usage(),
+            'disk_usage': read_disk_usage(self.disk_path),
+            'network_rx': network_rx,
+            'network_tx': network_tx,
+            'uptime': read_uptime()
+        }
+
+
+def push(url, server_id, token, samples, push_interval, timeout=15):
+    """
+    压缩并推送一批样本
+
+    Returns:
+        bool: 是否推送成功（认证失败或数据被拒绝时也返回True，避免无限重试）
+    """
+    body = gzip.compress(json.dumps({
+        'agent_version': AGENT_VERSION,
+        'interval': push_interval,
+        'samples': samples
+    }).encode())
+    request = urllib.request.Request(url, data=body, method='POST', headers={
+        'Content-Type': 'application/json',
+        'Content-Encoding': 'gzip',
+        'Authorization': f'Bearer {token}',
+        'X-Server-Id': str(server_id),
+        'User-Agent': f'tiny-panel-agent/{AGENT_VERSION}'
+    })
+    try:
+        with urllib.request.urlopen(request, timeout=timeout) as response:
+            response.read()
+        return True
+    except urllib.error.HTTPError as e:
+        print(f'推送监控数据失败: HTTP {e.code} {e.read()[:200]!r}', file=sys.stderr)
+        # 4xx表示请求本身有问题，重试也不会成功
+        return 400 <= e.code < 500
+    except (urllib.error.URLError, OSError) as e:
+        print(f'推送监控数据失败: {e}', file=sys.stderr)
+        return False
+
+
+def run(args):
+    sampler = Sampler(args.disk_path)
+    pending = deque(maxlen=MAX_PENDING)
+    push_interval = args.interval * args.batch
+    next_sample = time.monotonic()
+    next_push = next_sample + push_interval
+    backoff = push_interval
+
+    # 第一次读数只用于建立CPU和网络的基准
+    sampler.sample()
+    next_sample += args.interval
+
+    while True:
+        time.sleep(max(0, next_sample - time.monotonic()))
+        try:
+            pending.append(sampler.sample())
+        except (OSError, ValueError, IndexError) as e:
+            print(f'采集监控数据失败: {e}', file=sys.stderr)
+        next_sample += args.interval
+
+        if time.monotonic() >= next_push and pending:
+            batch = list(pending)[:args.max_batch]
+            if push(args.url, args.server_id, args.token, batch, push_interval):
+                for _ in range(len(batch)):
+                    pending.popleft()
+                backoff = push_interval
+                # 仍有积压时下一个采样周期继续推送
+                next_push = time.monotonic() + (0 if pending else push_interval)
+            else:
+                # 推送失败时指数退避，样本保留在队列中下次重试
+                backoff = min(backoff * 2, 600)
+                next_push = time.monotonic() + backoff
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Tiny Panel 监控代理')
+    parser.add_argument('--url', default=os.environ.get('TINY_PANEL_URL'),
+                        help='面板的数据接收地址，如 https://panel/monitoring/api/ingest')
+    parser.add_argument('--server-id', type=int, default=os.environ.get('TINY_PANEL_SERVER_ID'),
+                        help='本服务器在面板中的ID')
+    parser.add_argument('--token', default=os.environ.get('TINY_PANEL_TOKEN'), help='代理令牌')
+    parser.add_argument('--interval', type=int, default=10, help='采样周期（秒），默认10')
+    parser.add_argument('--batch', type=int, default=6, help='每次推送的样本数，默认6（即每分钟推送一次）')
+    parser.add_argument('--max-batch', type=int, default=1000, help='积压时单次推送的样本数上限，默认1000')
+    parser.add_argument('--disk-path', default='/', help='统计磁盘使用率的挂载点，默认/')
+    args = parser.parse_args()
+
+    if not args.url or not args.server_id or not args.token:
+        parser.error('必须指定--url、--server-id和--token')
+
+    try:
+        run(args)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()